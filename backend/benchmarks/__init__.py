@@ -0,0 +1,23 @@
+"""
+ローカル計測用のベンチマーク群。
+
+backend/ ディレクトリから `python -m benchmarks.<name>` で実行する。
+"""
+
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    """manage.py と同じ設定で Django を初期化する"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "src.core.settings")
+    src = str(BACKEND_DIR / "src")
+    if src not in sys.path:
+        sys.path.append(src)
+
+    import django
+
+    django.setup()
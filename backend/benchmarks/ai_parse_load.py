@@ -0,0 +1,51 @@
+"""
+AI 解析エンドポイントのスループット計測。
+
+    # 1) スタブと ASGI サーバーを起動
+    python -m benchmarks.fake_openai --latency 1.0 &
+    OPENAI_BASE_URL=http://127.0.0.1:8010/v1 OPENAI_API_KEY=dummy \\
+        uvicorn core.asgi:application --app-dir src --port 8000 &
+
+    # 2) 同期版と非同期版を比べる
+    python -m benchmarks.ai_parse_load --path /api/ai/parse-meal --concurrency 50
+    python -m benchmarks.ai_parse_load --path /api/ai/parse-meal-async --concurrency 50
+
+テキストは毎回変えるので AI 解析キャッシュには当たらない（--same-text で当てる）。
+--concurrency 本の keep-alive 接続で、合わせて --requests 回送る。
+"""
+
+import argparse
+import itertools
+import json
+
+from benchmarks.http_driver import Client, print_summary, run, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/api/ai/parse-meal-async")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--same-text", action="store_true")
+    args = parser.parse_args(argv)
+
+    numbers = itertools.count()
+
+    def next_request(client, rng):
+        text = "ラーメン" if args.same_text else f"ラーメン {next(numbers)}"
+        body = json.dumps({"text": text}).encode()
+        return "POST", args.path, body, "application/json"
+
+    clients = [Client(args.base_url, args.timeout) for _ in range(args.concurrency)]
+    results, elapsed = run(clients, next_request, requests=args.requests)
+    for client in clients:
+        client.close()
+    print_summary(
+        args.base_url.rstrip("/") + args.path, summarize(results, elapsed), args.concurrency
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+ダッシュボード（GET /api/dashboard/）のキャッシュなし（cold）とあり（warm）の比較。
+
+    python -m benchmarks.dashboard --meals 5000 --iterations 200
+
+トランザクション内でダミーの食事を投入し、毎回キャッシュを消して呼ぶ場合と
+キャッシュが効いている場合のレイテンシ（p50 / p95）とクエリ数を表示する。
+最後にロールバックするので DB には何も残らない（キャッシュも最後に消す）。
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _report(label, timings, queries):
+    print(f"== {label}")
+    print(f"  requests:  {len(timings)}")
+    print(f"  p50:       {_percentile(timings, 50) * 1000:.2f} ms")
+    print(f"  p95:       {_percentile(timings, 95) * 1000:.2f} ms")
+    print(f"  mean:      {statistics.fmean(timings) * 1000:.2f} ms")
+    print(f"  queries:   {queries} / request")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--meals", type=int, default=5_000, help="投入する食事の数（直近30日に散らす）"
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from api import dashboard
+    from api.models import Meal
+    from api.views import DashboardView
+
+    User = get_user_model()
+    view = DashboardView.as_view()
+    cache = dashboard.get_cache()
+
+    def call(user):
+        request = APIRequestFactory().get("/api/dashboard/")
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as captured:
+            t0 = time.perf_counter()
+            response = view(request)
+            response.render()
+            elapsed = time.perf_counter() - t0
+        assert response.status_code == 200, response.status_code
+        return elapsed, len(captured.captured_queries)
+
+    try:
+        with transaction.atomic():
+            user = User.objects.create(username="bench-dashboard")
+            now = timezone.now()
+            rng = random.Random(0)
+            # bulk_create はシグナルが飛ばないので日次集計（DailyCalorieTotal）は Meal.save で作る
+            for i in range(args.meals):
+                Meal.objects.create(
+                    user=user,
+                    name=f"ベンチ {i}",
+                    eaten_at=now - timedelta(minutes=rng.randrange(30 * 24 * 60)),
+                    calorie=rng.randrange(100, 1200),
+                    tag="自炊",
+                )
+
+            cold, cold_queries = [], 0
+            for _ in range(args.iterations):
+                cache.delete(dashboard.cache_key(user))
+                elapsed, cold_queries = call(user)
+                cold.append(elapsed)
+
+            call(user)
+            warm, warm_queries = [], 0
+            for _ in range(args.iterations):
+                elapsed, warm_queries = call(user)
+                warm.append(elapsed)
+
+            _report("cold (cache miss)", cold, cold_queries)
+            _report("warm (cache hit)", warm, warm_queries)
+            print(f"  speedup:   x{statistics.median(cold) / statistics.median(warm):.1f} (p50)")
+
+            cache.delete(dashboard.cache_key(user))
+            raise _Rollback
+    except _Rollback:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+オフラインでベンチマークするための OpenAI Responses API のスタブサーバー。
+
+    python -m benchmarks.fake_openai --port 8010 --latency 1.5
+
+バックエンド側は以下の環境変数で向き先を切り替える（SDK が自動で読む）:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8010/v1
+    OPENAI_API_KEY=dummy
+
+POST /v1/responses に対し、指定した遅延のあとで食事 JSON を output_text として返す。
+text.format が meals_parse（/api/ai/parse-meals）のときは、入力を区切り文字で分けて
+{"items": [...]} を返す。
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _user_text(payload) -> str:
+    items = payload.get("input")
+    if isinstance(items, str):
+        return items
+    for item in reversed(items or []):
+        if item.get("role") == "user":
+            content = item.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def fake_meal(text: str) -> dict:
+    return {
+        "name": text[:50] or "不明",
+        "calorie": random.randrange(200, 900),
+        "tag": random.choice(["外食", "自炊", "和食", "洋食", "間食"]),
+        "eatenAt": time.strftime("%Y-%m-%dT%H:%M:%S+09:00"),
+        "confidence": 0.5,
+    }
+
+
+def fake_response(model: str, output_text: str) -> dict:
+    return {
+        "id": f"resp_{uuid.uuid4().hex}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": "completed",
+        "model": model,
+        "output": [
+            {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": output_text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": 120,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": 40,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": 160,
+        },
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    latency = 1.0
+    jitter = 0.0
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/responses"):
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        with Handler.lock:
+            Handler.requests += 1
+
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        output_text = self.output_text(payload)
+        self._send(200, fake_response(payload.get("model", "fake"), output_text))
+
+    def output_text(self, payload) -> str:
+        text = _user_text(payload)
+        fmt = (payload.get("text") or {}).get("format") or {}
+        if fmt.get("name") == "meals_parse":
+            parts = [p.strip() for p in re.split(r"[,、。\n]", text) if p.strip()]
+            return json.dumps({"items": [fake_meal(p) for p in parts]}, ensure_ascii=False)
+        return json.dumps(fake_meal(text), ensure_ascii=False)
+
+    def _send(self, code, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str, port: int, latency: float, jitter: float = 0.0, handler=Handler):
+    handler.latency = latency
+    handler.jitter = jitter
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, args.latency, args.jitter)
+    print(f"fake OpenAI listening on http://{args.host}:{args.port}/v1 (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"served {Handler.requests} requests")
+
+
+if __name__ == "__main__":
+    main()
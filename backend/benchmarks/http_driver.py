@@ -0,0 +1,143 @@
+"""
+HTTP 負荷テストの共通部分（load / http_load / ai_parse_load から使う）。
+
+- Client: keep-alive の接続を1本持つクライアント（1スレッドに1つ）
+- run(): クライアントごとにスレッドを立て、next_request(client, rng) が返すリクエストを
+  duration 秒のあいだ、または合計 requests 回送る
+- summarize() / print_summary(): req/s・ステータスごとの件数・レイテンシの分位点
+"""
+
+import http.client
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class Client:
+    """keep-alive の接続を1本持つ HTTP クライアント（1スレッドで使う）"""
+
+    def __init__(self, base_url: str, timeout: float, token: str | None = None):
+        self.base = urlsplit(base_url)
+        self.timeout = timeout
+        self.conn = None
+        self.headers = {"Accept": "application/json"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        # シナリオが使う置き場（load.py の画像アップロード先など）
+        self.meal_id = None
+        self.images = []
+
+    def request(self, method, path, body=None, content_type=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(
+                self.base.hostname, self.base.port or 80, timeout=self.timeout
+            )
+        headers = dict(self.headers)
+        if content_type:
+            headers["Content-Type"] = content_type
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+            data = resp.read()
+            if resp.will_close:
+                self.close()
+            return resp.status, data
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return 0, b""
+
+    def post_json(self, path, payload):
+        return self.request("POST", path, json.dumps(payload).encode(), "application/json")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def login(self, username: str, password: str) -> None:
+        code, data = self.post_json("/api/token/", {"username": username, "password": password})
+        if code != 200:
+            raise SystemExit(
+                f"login failed for {username} ({code}); run `manage.py seed_meals` first"
+            )
+        self.headers["Authorization"] = f"Bearer {json.loads(data)['access']}"
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def run(clients, next_request, *, duration=None, requests=None, seed: int = 0):
+    """
+    clients を1つずつスレッドで回す。next_request(client, rng) は
+    (method, path, body, content_type) を返す。duration 秒たつか、
+    全スレッド合わせて requests 回送ったら止める。({"latencies", "codes"}, 経過秒) を返す。
+    2xx 以外（接続エラーは 0）のレイテンシは数えない。
+    """
+    deadline = time.perf_counter() + duration if duration is not None else None
+    tickets = itertools.count()
+    results = {"latencies": [], "codes": {}}
+    lock = threading.Lock()
+
+    def worker(i, client):
+        rng = random.Random(seed + i)
+        latencies, codes = [], {}
+        while deadline is None or time.perf_counter() < deadline:
+            if requests is not None and next(tickets) >= requests:
+                break
+            method, path, body, content_type = next_request(client, rng)
+            t0 = time.perf_counter()
+            code, _ = client.request(method, path, body, content_type)
+            elapsed = time.perf_counter() - t0
+            codes[code] = codes.get(code, 0) + 1
+            if 200 <= code < 300:
+                latencies.append(elapsed)
+        with lock:
+            results["latencies"].extend(latencies)
+            for code, n in codes.items():
+                results["codes"][code] = results["codes"].get(code, 0) + n
+
+    threads = [threading.Thread(target=worker, args=(i, c)) for i, c in enumerate(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - t0
+
+
+def summarize(results, elapsed: float) -> dict:
+    latencies = results["latencies"]
+    total = sum(results["codes"].values())
+    ms = lambda seconds: round(seconds * 1000, 2)  # noqa: E731
+    return {
+        "requests": total,
+        "errors": total - len(latencies),
+        "status": {str(code): n for code, n in sorted(results["codes"].items())},
+        "rps": round(total / elapsed, 1),
+        "latencyMs": {
+            "mean": ms(statistics.mean(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)) if latencies else None,
+            "p95": ms(percentile(latencies, 95)) if latencies else None,
+            "p99": ms(percentile(latencies, 99)) if latencies else None,
+            "max": ms(max(latencies)) if latencies else None,
+        },
+    }
+
+
+def print_summary(label: str, summary: dict, concurrency: int) -> None:
+    print(f"{label}: {summary['requests']} requests, concurrency {concurrency}")
+    print(f"  status:  {summary['status']}")
+    print(f"  req/s:   {summary['rps']:.1f}")
+    for key in ("mean", "p50", "p95"):
+        value = summary["latencyMs"][key]
+        if value is not None:
+            print(f"  {key + ':':<8} {value:.1f} ms")
@@ -0,0 +1,40 @@
+"""
+GET エンドポイントの req/s 計測（サーバー構成の比較用）。
+
+    # 1) 開発構成: runserver（リクエストごとに DB 接続を張り直す）
+    python manage.py runserver 8000 --noreload &
+    python -m benchmarks.http_load --path /api/meals/weekly-summary/ --duration 20
+
+    # 2) 本番構成: gunicorn + 接続プール + statement_timeout
+    DJANGO_ENV=production DEBUG=False GUNICORN_WORKERS=4 gunicorn &
+    python -m benchmarks.http_load --path /api/meals/weekly-summary/ --duration 20
+
+各スレッドは keep-alive の接続を1本持ち、--duration 秒のあいだ同じパスを叩き続ける。
+--token を付けると Authorization: Bearer で送る。
+"""
+
+import argparse
+
+from benchmarks.http_driver import Client, print_summary, run, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/api/meals/weekly-summary/")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--token", help="JWT アクセストークン")
+    args = parser.parse_args(argv)
+
+    clients = [Client(args.base_url, 30, args.token) for _ in range(args.concurrency)]
+    results, elapsed = run(
+        clients, lambda client, rng: ("GET", args.path, None, None), duration=args.duration
+    )
+    for client in clients:
+        client.close()
+    print_summary(f"{args.base_url}{args.path}", summarize(results, elapsed), args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+起動時の import 時間の計測（コールドスタートの確認用）。
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 5 --max-ms 1500
+
+`python -X importtime` で django.setup() と URLconf の読み込み（= 全ビューの import）までを
+別プロセスで実行し、import の合計時間・プロセスの実行時間とパッケージごとの内訳を表示する。
+--forbid のパッケージ（既定は openai と httpx。AI を呼ぶまで読まないはず）が読み込まれていたり、
+--max-ms を超えたりしたら終了コード 1 で終わる。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import BACKEND_DIR
+
+STARTUP_CODE = """
+import os, sys
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "src.core.settings")
+sys.path.append({src!r})
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+"""
+
+
+def parse_importtime(stderr: str):
+    """-X importtime の出力から [(モジュール名, self 秒, cumulative 秒, 深さ)] を作る"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return rows
+
+
+def run_once():
+    code = STARTUP_CODE.format(src=str(BACKEND_DIR / "src"))
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"startup failed with exit code {proc.returncode}")
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3, help="中央値を取る回数")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument(
+        "--forbid", default="openai,httpx", help="起動時に読まれてはいけないパッケージ"
+    )
+    parser.add_argument("--max-ms", type=float, help="import の合計時間の上限")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.repeat)]
+    walls = [wall for wall, _ in runs]
+    totals = [sum(cumulative for _, _, cumulative, depth in rows if depth == 0) for _, rows in runs]
+    median_index = totals.index(sorted(totals)[len(totals) // 2])
+    rows = runs[median_index][1]
+
+    # self 時間をトップレベルのパッケージごとに足す（cumulative は入れ子で二重に数えるので使わない）
+    packages = {}
+    for name, self_seconds, _, _ in rows:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + self_seconds
+
+    print(f"startup (django.setup + URLconf), {args.repeat} runs")
+    print(f"  imports:  {statistics.median(totals) * 1000:.0f} ms ({len(rows)} modules)")
+    print(f"  process:  {statistics.median(walls) * 1000:.0f} ms")
+    print("  slowest packages (self time):")
+    for root, seconds in sorted(packages.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"    {root:24} {seconds * 1000:8.1f} ms")
+
+    ok = True
+    forbidden = [name.strip() for name in args.forbid.split(",") if name.strip()]
+    loaded = sorted(root for root in packages if root in forbidden)
+    if loaded:
+        ok = False
+        print(f"!! imported at startup: {', '.join(loaded)}", file=sys.stderr)
+        for name, _, cumulative, depth in rows:
+            if name in loaded:
+                print(f"   {name}: {cumulative * 1000:.0f} ms cumulative", file=sys.stderr)
+    if args.max_ms is not None and statistics.median(totals) * 1000 > args.max_ms:
+        ok = False
+        print(f"!! imports took longer than {args.max_ms:.0f} ms", file=sys.stderr)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+食事 API の負荷テスト。エンドポイントごとの req/s と p50 / p95 / p99 を表示し、JSON に保存する。
+
+    # 1) データを入れる（100人 × 90日 × 3食）
+    python manage.py seed_meals --users 100 --days 90 --meals-per-day 3 --clear
+
+    # 2) スタブの OpenAI に向けてサーバーを起動
+    python -m benchmarks.fake_openai --latency 0.5 &
+    OPENAI_BASE_URL=http://127.0.0.1:8010/v1 OPENAI_API_KEY=dummy DJANGO_ENV=production gunicorn &
+
+    # 3) 計測して保存し、別のコミットの結果と比べる
+    python -m benchmarks.load --output results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.load --baseline results/abc1234.json
+
+エンドポイントは1つずつ順に、--warmup 秒の空回しのあと --duration 秒叩く（--endpoints で絞れる）。
+各スレッドは seed_meals のユーザー（--prefix / --password / --users）で1人ずつログインし、
+keep-alive の接続を1本持つ。create と image は食事を増やすので、
+比べる前に seed_meals --clear で入れ直す。
+--fake-openai を付けるとスタブをこのプロセス内で起動する
+（サーバー側の OPENAI_BASE_URL は自分で合わせる）。
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks import BACKEND_DIR
+from benchmarks.http_driver import Client, run, summarize
+
+MEAL_NAMES = ["ラーメン", "カレーライス", "日替わり定食", "パスタ", "親子丼", "サラダ", "おにぎり"]
+TAGS = ["外食", "自炊", "和食", "洋食", "間食"]
+
+
+# --- シナリオ: (client, rng, args) -> (method, path, body, content_type) ---
+
+
+def _by_date(client, rng, args):
+    day = date.today() - timedelta(days=rng.randrange(args.days))
+    return "GET", f"/api/meals/by-date/?date={day.isoformat()}", None, None
+
+
+def _weekly_summary(client, rng, args):
+    return "GET", "/api/meals/weekly-summary/", None, None
+
+
+def _meal_payload(rng):
+    return {
+        "name": rng.choice(MEAL_NAMES),
+        "eatenAt": datetime.now(timezone.utc).isoformat(),
+        "calorie": rng.randrange(100, 900),
+        "tag": rng.choice(TAGS),
+    }
+
+
+def _create(client, rng, args):
+    return "POST", "/api/meals/", json.dumps(_meal_payload(rng)).encode(), "application/json"
+
+
+def _image(client, rng, args):
+    boundary = uuid.uuid4().hex
+    body = b"".join(
+        [
+            f"--{boundary}\r\n".encode(),
+            b'Content-Disposition: form-data; name="image"; filename="meal.jpg"\r\n',
+            b"Content-Type: image/jpeg\r\n\r\n",
+            rng.choice(client.images),
+            f"\r\n--{boundary}--\r\n".encode(),
+        ]
+    )
+    return (
+        "POST",
+        f"/api/meals/{client.meal_id}/image/",
+        body,
+        f"multipart/form-data; boundary={boundary}",
+    )
+
+
+def _ai_parse(client, rng, args):
+    # 毎回テキストを変えて AI 解析キャッシュに当たらないようにする
+    text = f"{rng.choice(MEAL_NAMES)} {uuid.uuid4().hex[:8]}"
+    return "POST", "/api/ai/parse-meal", json.dumps({"text": text}).encode(), "application/json"
+
+
+SCENARIOS = {
+    "by-date": _by_date,
+    "weekly-summary": _weekly_summary,
+    "create": _create,
+    "image": _image,
+    "ai-parse": _ai_parse,
+}
+
+
+def _jpeg_variants(count: int, size: int, seed: int):
+    """内容の違う JPEG を count 枚作る（同じ画像だと保存が重複排除されて軽くなるので）"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    variants = []
+    for _ in range(count):
+        noise = Image.effect_noise((size, size * 3 // 4), 40).convert("RGB")
+        tint = Image.new("RGB", noise.size, tuple(rng.randrange(256) for _ in range(3)))
+        buf = io.BytesIO()
+        Image.blend(noise, tint, 0.6).save(buf, "JPEG", quality=85)
+        variants.append(buf.getvalue())
+    return variants
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _change(current, previous) -> str:
+    if current is None or not previous:
+        return ""
+    return f" ({(current - previous) / previous * 100:+.1f}%)"
+
+
+def _print(name, summary, baseline=None):
+    base = (baseline or {}).get("endpoints", {}).get(name) or {}
+    base_latency = base.get("latencyMs") or {}
+    print(f"== {name}: {summary['requests']} requests, status {summary['status']}")
+    print(f"  req/s:  {summary['rps']:.1f}{_change(summary['rps'], base.get('rps'))}")
+    for key in ("p50", "p95", "p99"):
+        value = summary["latencyMs"][key]
+        if value is not None:
+            print(f"  {key}:    {value:.1f} ms{_change(value, base_latency.get(key))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--endpoints", default=",".join(SCENARIOS), help=f"カンマ区切り（{', '.join(SCENARIOS)}）"
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="エンドポイントごとの計測秒数")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--prefix", default="loadtest", help="seed_meals の --prefix")
+    parser.add_argument("--password", default="loadtest-password", help="seed_meals の --password")
+    parser.add_argument("--users", type=int, default=100, help="seed_meals の --users")
+    parser.add_argument(
+        "--days", type=int, default=90, help="by-date で引く日付の範囲（seed_meals の --days）"
+    )
+    parser.add_argument("--image-size", type=int, default=1024, help="アップロードする画像の幅(px)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--fake-openai", action="store_true", help="スタブの OpenAI をこのプロセスで起動する"
+    )
+    parser.add_argument("--fake-openai-port", type=int, default=8010)
+    parser.add_argument("--ai-latency", type=float, default=0.5, help="スタブの応答にかける秒数")
+    parser.add_argument("--output", help="結果を書く JSON ファイル")
+    parser.add_argument("--baseline", help="比べる前回の JSON ファイル")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+
+    if args.fake_openai:
+        from benchmarks.fake_openai import serve
+
+        stub = serve("127.0.0.1", args.fake_openai_port, args.ai_latency)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    clients = [Client(args.base_url, args.timeout) for _ in range(args.concurrency)]
+    with ThreadPoolExecutor(max_workers=min(16, len(clients))) as pool:
+        list(
+            pool.map(
+                lambda ic: ic[1].login(f"{args.prefix}-{ic[0] % args.users:05d}", args.password),
+                enumerate(clients),
+            )
+        )
+
+    if "image" in names:
+        images = _jpeg_variants(32, args.image_size, args.seed)
+        rng = random.Random(args.seed)
+        for client in clients:
+            code, data = client.post_json("/api/meals/", _meal_payload(rng))
+            if code != 201:
+                raise SystemExit(f"could not create a meal for the image upload ({code})")
+            client.meal_id = json.loads(data)["id"]
+            client.images = images
+
+    report = {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "baseUrl": args.base_url,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "endpoints": {},
+    }
+    print(f"{args.base_url}: concurrency {args.concurrency}, {args.duration:g}s per endpoint")
+    for name in names:
+        scenario = SCENARIOS[name]
+
+        def next_request(client, rng):
+            return scenario(client, rng, args)
+
+        if args.warmup > 0:
+            run(clients, next_request, duration=args.warmup, seed=args.seed)
+        results, elapsed = run(clients, next_request, duration=args.duration, seed=args.seed)
+        report["endpoints"][name] = summarize(results, elapsed)
+        _print(name, report["endpoints"][name], baseline)
+
+    for client in clients:
+        client.close()
+
+    if args.output:
+        path = Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+        print(f"wrote {path}")
+    if any(summary["errors"] for summary in report["endpoints"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+食事エクスポート（GET /api/meals/export/）のスループットとメモリの計測。
+
+    python -m benchmarks.meal_export --rows 200000 --format csv
+    python -m benchmarks.meal_export --rows 200000 --compare-serializer
+
+トランザクション内でダミーの食事を投入してエクスポートを最後まで読み、
+rows/sec とピーク RSS を表示する。最後にロールバックするので DB には何も残らない。
+--compare-serializer を付けると、MealSerializer(many=True) で一括シリアライズした場合も測る。
+"""
+
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _rss_mb() -> float:
+    # Linux の ru_maxrss は KB（プロセス開始からの最大値）
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _report(label, rows, nbytes, elapsed, rss_before):
+    rss_after = _rss_mb()
+    print(f"== {label}")
+    print(f"  rows:      {rows}")
+    print(f"  bytes:     {nbytes / 1024 / 1024:.1f} MB")
+    print(f"  elapsed:   {elapsed:.2f} s")
+    print(f"  rows/sec:  {rows / elapsed:,.0f}")
+    print(f"  peak RSS:  {rss_after:.0f} MB (+{rss_after - rss_before:.0f} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--compare-serializer", action="store_true")
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.utils import timezone
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from api.models import Meal
+    from api.serializers import MealSerializer
+    from api.views import MealExportView
+
+    User = get_user_model()
+
+    try:
+        with transaction.atomic():
+            user = User.objects.create(username="bench-export")
+            now = timezone.now()
+            rng = random.Random(0)
+            for start in range(0, args.rows, 10_000):
+                Meal.objects.bulk_create(
+                    [
+                        Meal(
+                            user=user,
+                            name=f"ベンチ {i}",
+                            eaten_at=now - timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+                            calorie=rng.randrange(100, 1200),
+                            tag="自炊",
+                        )
+                        for i in range(start, min(start + 10_000, args.rows))
+                    ]
+                )
+
+            request = APIRequestFactory().get("/api/meals/export/", {"format": args.format})
+            force_authenticate(request, user=user)
+
+            rss_before = _rss_mb()
+            t0 = time.perf_counter()
+            response = MealExportView.as_view()(request)
+            nbytes = 0
+            lines = 0
+            for chunk in response.streaming_content:
+                nbytes += len(chunk)
+                lines += chunk.count(b"\n")
+            elapsed = time.perf_counter() - t0
+            rows = lines - 1 if args.format == "csv" else lines
+            _report(f"export ({args.format}, streaming)", rows, nbytes, elapsed, rss_before)
+
+            if args.compare_serializer:
+                rss_before = _rss_mb()
+                t0 = time.perf_counter()
+                data = MealSerializer(Meal.objects.filter(user=user), many=True).data
+                body = json.dumps(data, ensure_ascii=False).encode()
+                elapsed = time.perf_counter() - t0
+                _report("MealSerializer(many=True)", len(data), len(body), elapsed, rss_before)
+
+            raise _Rollback
+    except _Rollback:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+(user, eaten_at) 複合インデックスと (eaten_at) インデックスの効き具合を確認するベンチマーク。
+
+    python -m benchmarks.meal_index --users 200 --meals-per-user 1000
+
+トランザクション内でダミーの食事を投入し、一覧・週次サマリのクエリを
+旧方式（eaten_at__date）と新方式（半開区間）で EXPLAIN / 計測する。
+未ログイン（meals_for が user で絞らない）の by-date / today も同じように見る。
+最後にロールバックするので DB には何も残らない。
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _timed(qs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        list(qs.all())
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--meals-per-user", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection, transaction
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from api.dates import local_day_bounds, local_range_bounds
+    from api.models import Meal
+
+    User = get_user_model()
+    ok = True
+
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f"bench-index-{i}") for i in range(args.users)]
+            )
+            now = timezone.now()
+            rng = random.Random(0)
+            meals = [
+                Meal(
+                    user=user,
+                    name="bench",
+                    eaten_at=now - timedelta(minutes=rng.randrange(args.days * 24 * 60)),
+                    calorie=rng.randrange(100, 1200),
+                    tag="自炊",
+                )
+                for user in users
+                for _ in range(args.meals_per_user)
+            ]
+            Meal.objects.bulk_create(meals, batch_size=5000)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE api_meal")
+
+            user = users[0]
+            today = timezone.localdate()
+            week_start = today - timedelta(days=6)
+            day_start, day_end = local_day_bounds(today)
+            range_start, range_end = local_range_bounds(week_start, today)
+
+            cases = {
+                "by-date (old)": Meal.objects.filter(user=user, eaten_at__date=today),
+                "by-date (new)": Meal.objects.filter(
+                    user=user, eaten_at__gte=day_start, eaten_at__lt=day_end
+                ),
+                "weekly (old)": Meal.objects.filter(
+                    user=user, eaten_at__date__range=(week_start, today)
+                )
+                .values("eaten_at__date")
+                .annotate(total=Sum("calorie")),
+                "weekly (new)": Meal.objects.filter(
+                    user=user, eaten_at__gte=range_start, eaten_at__lt=range_end
+                )
+                .values("eaten_at__date")
+                .annotate(total=Sum("calorie")),
+                "by-date (anonymous)": Meal.objects.filter(
+                    eaten_at__gte=day_start, eaten_at__lt=day_end
+                ),
+            }
+            # 新方式のクエリごとに使われるはずのインデックス
+            expected_index = {
+                "by-date (new)": "meal_user_eaten_at_idx",
+                "weekly (new)": "meal_user_eaten_at_idx",
+                "by-date (anonymous)": "meal_eaten_at_idx",
+            }
+
+            print(f"rows: {len(meals)}  users: {args.users}")
+            for label, qs in cases.items():
+                plan = qs.explain()
+                print(f"\n== {label}: {_timed(qs, args.repeat):.2f} ms (best of {args.repeat})")
+                print(plan)
+                index = expected_index.get(label)
+                if index and f" {index} " not in plan:
+                    ok = False
+                    print(f"!! {index} が使われていません")
+
+            raise _Rollback
+    except _Rollback:
+        pass
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+食事一覧のシリアライズとレンダリングの比較
+（MealSerializer + JSONRenderer と meal_list_data + FastJSONRenderer）。
+
+    python -m benchmarks.meal_serialize --meals 1000 --iterations 50
+
+トランザクション内でダミーの食事（--image-ratio の割合で画像つき）を投入し、
+取得・シリアライズ・JSON 化をそれぞれ計って中央値を表示する。両方の出力が同じことも確かめる。
+最後にロールバックするので DB には何も残らない。
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks import setup_django
+
+
+class _Rollback(Exception):
+    pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meals", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--image-ratio", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.utils import timezone
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from api import renderers
+    from api.models import Meal
+    from api.renderers import FastJSONRenderer
+    from api.serializers import MealSerializer, meal_list_data, meal_rows
+
+    User = get_user_model()
+    request = Request(APIRequestFactory().get("/api/meals/", HTTP_HOST="bench.example.com"))
+
+    def current(meals):
+        t0 = time.perf_counter()
+        rows = list(meals.all())
+        t1 = time.perf_counter()
+        data = MealSerializer(rows, many=True, context={"request": request}).data
+        t2 = time.perf_counter()
+        body = JSONRenderer().render(data)
+        return (t1 - t0, t2 - t1, time.perf_counter() - t2), body
+
+    def lean(meals):
+        t0 = time.perf_counter()
+        rows = list(meal_rows(meals))
+        t1 = time.perf_counter()
+        data = meal_list_data(rows, request)
+        t2 = time.perf_counter()
+        body = FastJSONRenderer().render(data)
+        return (t1 - t0, t2 - t1, time.perf_counter() - t2), body
+
+    ok = True
+    try:
+        with transaction.atomic():
+            user = User.objects.create(username="bench-serialize")
+            now = timezone.now()
+            rng = random.Random(0)
+            meals = []
+            for i in range(args.meals):
+                meal = Meal(
+                    user=user,
+                    name=rng.choice(["ラーメン", "カレーライス", "サラダ", "親子丼"]),
+                    eaten_at=now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+                    calorie=rng.randrange(100, 900),
+                    tag=rng.choice(["外食", "自炊", "間食"]),
+                )
+                if rng.random() < args.image_ratio:
+                    digest = f"{i:064x}"
+                    path = f"{digest[:2]}/{digest[2:4]}/{digest}"
+                    meal.image = f"meals/{path}.jpg"
+                    meal.image_medium = f"meals/medium/{path}.webp"
+                    meal.image_thumb = f"meals/thumb/{path}.webp"
+                meals.append(meal)
+            Meal.objects.bulk_create(meals, batch_size=5000)
+            queryset = Meal.objects.filter(user=user).order_by("-eaten_at", "-id")
+
+            _, expected = current(queryset)
+            _, actual = lean(queryset)
+            if expected != actual:
+                print("!! outputs differ", file=sys.stderr)
+                ok = False
+
+            print(
+                f"{args.meals} meals, {args.iterations} iterations "
+                f"(orjson: {renderers.orjson is not None})"
+            )
+            print(f"{'':28}{'fetch':>9}{'serialize':>11}{'render':>9}{'total':>9}")
+            totals = {}
+            for label, fn in (
+                ("MealSerializer + json", current),
+                ("meal_list_data + orjson", lean),
+            ):
+                timings = [fn(queryset)[0] for _ in range(args.iterations)]
+                phases = [statistics.median(t[i] for t in timings) * 1000 for i in range(3)]
+                totals[label] = statistics.median(sum(t) for t in timings) * 1000
+                print(
+                    f"  {label:26}{phases[0]:>7.2f}ms{phases[1]:>9.2f}ms"
+                    f"{phases[2]:>7.2f}ms{totals[label]:>7.2f}ms"
+                )
+            before, after = totals.values()
+            print(f"  speedup: {before / after:.1f}x")
+            raise _Rollback
+    except _Rollback:
+        pass
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+本番用の gunicorn 設定（backend/ で `gunicorn` を実行すると読まれる）。
+
+    # WSGI（同期ワーカー + スレッド）
+    DJANGO_ENV=production gunicorn
+
+    # ASGI（/api/ai/parse-meal-async などの非同期ビューを活かす）
+    DJANGO_ENV=production GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn
+
+ワーカー数・スレッド数は環境変数で変える。DB のプール（settings.DB_POOL）はプロセスごとなので、
+DB への最大接続数はおおよそ workers × DB_POOL_MAX_SIZE になる。
+"""
+
+import multiprocessing
+import os
+
+_ASGI = os.environ.get("GUNICORN_WORKER_CLASS", "gthread").startswith("uvicorn")
+
+pythonpath = "src"
+wsgi_app = "core.asgi:application" if _ASGI else "core.wsgi:application"
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# gthread のときのワーカーあたりのスレッド数（DB_POOL_MAX_SIZE 以下にする）
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# リクエストがこの秒数以上かかったらワーカーを再起動する（statement_timeout より長く）
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# メモリの増え方を抑えるため、一定数のリクエストごとにワーカーを入れ替える
+# （一斉に入れ替わらないよう jitter でばらす）
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 500))
+
+# 空にするとアクセスログを出さない
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
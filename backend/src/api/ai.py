@@ -0,0 +1,180 @@
+"""
+OpenAI での食事テキスト解析（プロンプト・スキーマ・出力の取り出し・同期版クライアント）。
+
+openai SDK は読み込みが重いので、モジュールの import 時には読まない。クライアントは
+get_openai_client() を最初に呼んだときに作り、プロセス内のスレッドで使い回す。
+manage.py のコマンドやテスト、autoreload のたびに SDK を読み込まずに済み、
+OPENAI_API_KEY がなくても起動はできる（AI の呼び出し時にエラーになる）。
+非同期版のクライアントは api/ai_async.py。
+"""
+
+import os
+import re
+import threading
+import time
+from json import JSONDecoder
+
+from django.utils import timezone
+
+from . import metrics
+from .ai_cache import get_meal_parse_cache
+
+MEAL_SCHEMA = {
+    "name": "meal_parse",
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "name": {"type": "string"},
+            "calorie": {"type": "integer", "minimum": 0, "maximum": 5000},
+            "tag": {"type": "string"},
+            "eatenAt": {"type": "string", "description": "ISO 8601 datetime"},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+        },
+        "required": ["name", "calorie", "tag", "eatenAt", "confidence"],
+    },
+    "strict": True,
+}
+
+# 複数の食事をまとめて解析する用（POST /api/ai/parse-meals）
+MEALS_SCHEMA = {
+    "name": "meals_parse",
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "properties": {
+            "items": {"type": "array", "items": MEAL_SCHEMA["schema"]},
+        },
+        "required": ["items"],
+    },
+    "strict": True,
+}
+
+MAX_BATCH_ITEMS = 30
+
+
+# プロンプトを変えたら上げる（AI 解析キャッシュのキーに含まれる）
+MEAL_PROMPT_VERSION = "1"
+
+MEAL_PARSE_PROMPT = (
+    "Return ONLY one JSON object. Do not include any other text. "
+    "Schema: {"
+    "\"name\": string, "
+    "\"calorie\": integer, "
+    "\"tag\": string, "
+    "\"eatenAt\": string ISO8601, "
+    "\"confidence\": number 0-1"
+    "}. "
+    "tag should be one of: 外食, 自炊, 和食, 洋食, 間食. "
+    "If unclear, make a reasonable estimate."
+)
+
+
+def meal_parse_input(text: str):
+    return [
+        {"role": "system", "content": MEAL_PARSE_PROMPT},
+        {"role": "user", "content": text},
+    ]
+
+
+class AiOutputError(Exception):
+    """AI の出力から JSON を取り出せなかった"""
+
+    def __init__(self, message: str, raw: str):
+        super().__init__(message)
+        self.raw = raw
+
+    def as_dict(self):
+        # raw の最初 300 字を返して定位する
+        return {"error": str(self), "raw": self.raw[:300]}
+
+
+def extract_json_object(raw: str):
+    """✅ 強健：括号配对で最初の完全な JSON オブジェクトを抽出"""
+    raw = (raw or "").strip()
+    decoder = JSONDecoder()
+
+    # 1) 先に ``` コード块 wrapper を削除
+    if raw.startswith("```"):
+        raw = re.sub(r"^```[a-zA-Z]*\n", "", raw)
+        raw = re.sub(r"\n```$", "", raw).strip()
+
+    # 2) 最初の '{' を見つけ、そこから decode
+    start = raw.find("{")
+    if start == -1:
+        raise AiOutputError("AI returned no JSON object", raw)
+
+    try:
+        obj, idx = decoder.raw_decode(raw[start:])
+    except Exception:
+        # 3) なお失敗
+        raise AiOutputError("Failed to parse JSON from AI output", raw) from None
+    return obj
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """
+    プロセスで共有する同期版の OpenAI クライアント。最初に使うときに作る。
+    OpenAI クライアントはスレッドセーフ（中の httpx のコネクションプールも共有される）。
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+
+                # api_key / base_url は OPENAI_API_KEY / OPENAI_BASE_URL 環境変数から読まれる
+                _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _client
+
+
+def create_response(**kwargs):
+    """get_openai_client().responses.create に時間とトークン数の計測（api/metrics.py）を足す"""
+    started = time.perf_counter()
+    try:
+        resp = get_openai_client().responses.create(**kwargs)
+    except Exception:
+        metrics.observe_openai(kwargs.get("model", ""), time.perf_counter() - started, error=True)
+        raise
+    metrics.observe_openai(kwargs.get("model", ""), time.perf_counter() - started, resp)
+    return resp
+
+
+def fetch_meal_parse(text: str, model: str):
+    """
+    OpenAI で1食分を解析して結果をキャッシュに入れる（キャッシュは見ない）。
+    同期版のビューとワーカー（api/tasks.py）の両方から使う。
+    """
+    resp = create_response(
+        model=model,
+        input=meal_parse_input(text),
+        store=False,
+    )
+    data = extract_json_object(resp.output_text)
+    if isinstance(data, dict):
+        get_meal_parse_cache().set(text, model, MEAL_PROMPT_VERSION, data)
+    return data
+
+
+def meals_parse_input(text: str):
+    now = timezone.localtime()
+    return [
+        {
+            "role": "system",
+            "content": (
+                "Split the user's text into individual meals and return them as "
+                "{\"items\": [...]} where each item has "
+                "\"name\": string, \"calorie\": integer, \"tag\": string, "
+                "\"eatenAt\": string ISO8601, \"confidence\": number 0-1. "
+                "tag should be one of: 外食, 自炊, 和食, 洋食, 間食. "
+                f"The current local time is {now.isoformat()}; resolve words like "
+                "朝 / 昼 / 夜 / 昨日 relative to it. "
+                "If unclear, make a reasonable estimate."
+            ),
+        },
+        {"role": "user", "content": text},
+    ]
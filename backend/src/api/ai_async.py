@@ -0,0 +1,84 @@
+"""
+ASGI 用の非同期 OpenAI クライアント。
+
+- AsyncOpenAI + コネクションプール付きの httpx.AsyncClient をイベントループごとに1つ共有する
+  （uvicorn などの ASGI サーバーではワーカーあたり1ループなので実質プロセス共有）
+- 同時に OpenAI へ投げるリクエスト数はセマフォで上限をかける
+- タイムアウト・上限値は settings の OPENAI_* / AI_PARSE_* で調整する
+- openai SDK はクライアントを作るときに読み込む（import 時には読まない）
+"""
+
+import asyncio
+import time
+import weakref
+
+from django.conf import settings
+
+from . import metrics
+
+_clients = weakref.WeakKeyDictionary()
+
+
+class AiBusyError(Exception):
+    """同時実行数の上限に達していて、待ち時間内に枠が空かなかった"""
+
+
+def _build_client():
+    # openai / httpx は読み込みが重いので、最初にクライアントを作るときに読む（api/ai.py と同じ）
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    timeout = httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT)
+    http_client = DefaultAsyncHttpxClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+        ),
+    )
+    return AsyncOpenAI(
+        # api_key / base_url は OPENAI_API_KEY / OPENAI_BASE_URL 環境変数から読まれる
+        timeout=timeout,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=http_client,
+    )
+
+
+def _state():
+    loop = asyncio.get_running_loop()
+    state = _clients.get(loop)
+    if state is None:
+        state = (_build_client(), asyncio.Semaphore(settings.AI_PARSE_MAX_CONCURRENCY))
+        _clients[loop] = state
+    return state
+
+
+def get_async_openai_client():
+    return _state()[0]
+
+
+async def create_response(**kwargs):
+    """
+    セマフォで同時実行数を絞りつつ responses.create を呼ぶ。
+
+    枠が AI_PARSE_QUEUE_TIMEOUT 秒以内に空かなければ AiBusyError。
+    クライアントが切断してタスクがキャンセルされた場合は、
+    CancelledError がそのまま伝わり、HTTP リクエストも中断される。
+    """
+    client, semaphore = _state()
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=settings.AI_PARSE_QUEUE_TIMEOUT)
+    except TimeoutError:
+        raise AiBusyError from None
+
+    started = time.perf_counter()
+    model = kwargs.get("model", "")
+    try:
+        resp = await client.responses.create(**kwargs)
+    except Exception:
+        metrics.observe_openai(model, time.perf_counter() - started, error=True)
+        raise
+    finally:
+        semaphore.release()
+    metrics.observe_openai(model, time.perf_counter() - started, resp)
+    return resp
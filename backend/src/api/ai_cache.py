@@ -0,0 +1,183 @@
+"""
+AI 食事解析（POST /api/ai/parse-meal）の結果キャッシュ。
+
+同じ短いフレーズ（「コンビニおにぎり」「ラーメン」など）が何度も送られるので、
+正規化したテキスト + モデル名 + プロンプトのバージョンをキーに結果を使い回す。
+
+- 1段目: プロセス内の LRU（TTL 付き）
+- 2段目: Django のキャッシュ（AI_PARSE_CACHE_ALIAS を設定したときだけ。プロセス間で共有）
+
+eatenAt は「解析した時刻からのずれ」で保存しておき、ヒット時に現在時刻から計算し直す。
+"""
+
+import functools
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def normalize_text(text: str) -> str:
+    """NFKC 正規化 → 空白をまとめる → 小文字化"""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split()).lower()
+
+
+class TTLLRUCache:
+    """スレッドセーフな TTL 付き LRU"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def shared_instance(factory):
+    """
+    factory() の戻り値をプロセス内で1つだけ作って共有する関数にするデコレーター。
+    最初に呼ばれたときに作るので、settings はそのときの値が使われる
+    """
+    instance = None
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get():
+        nonlocal instance
+        if instance is None:
+            with lock:
+                if instance is None:
+                    instance = factory()
+        return instance
+
+    return get
+
+
+class MealParseCache:
+    def __init__(self, max_entries: int, ttl: int, shared_alias: str | None = None):
+        self.ttl = ttl
+        self.local = TTLLRUCache(max_entries, ttl)
+        self.shared_alias = shared_alias
+        self._counts = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str, model: str, prompt_version: str) -> str:
+        digest = hashlib.sha256(
+            "\0".join([model, prompt_version, normalize_text(text)]).encode()
+        ).hexdigest()
+        return f"ai-parse-meal:{digest}"
+
+    def _shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, text: str, model: str, prompt_version: str):
+        """ヒットしたら eatenAt を現在時刻基準で解決し直した dict を返す。ミスなら None"""
+        key = self.make_key(text, model, prompt_version)
+
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count("local_hits")
+            return _restore(entry)
+
+        shared = self._shared()
+        if shared is not None:
+            entry = shared.get(key)
+            if entry is not None:
+                self._count("shared_hits")
+                self.local.set(key, entry)
+                return _restore(entry)
+
+        self._count("misses")
+        return None
+
+    def set(self, text: str, model: str, prompt_version: str, data: dict) -> None:
+        key = self.make_key(text, model, prompt_version)
+        entry = _freeze(data)
+        self.local.set(key, entry)
+
+        shared = self._shared()
+        if shared is not None:
+            shared.set(key, entry, timeout=self.ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = sum(counts.values())
+        hits = counts["local_hits"] + counts["shared_hits"]
+        return {
+            **counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "local_entries": len(self.local),
+            "shared_alias": self.shared_alias,
+        }
+
+    def clear(self) -> None:
+        self.local.clear()
+        with self._lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+
+
+def _freeze(data: dict) -> dict:
+    """eatenAt を「今からのずれ（秒）」に置き換えて保存用にする"""
+    data = dict(data)
+    eaten_at = parse_datetime(str(data.pop("eatenAt", "") or ""))
+    offset = None
+    if eaten_at is not None:
+        if timezone.is_naive(eaten_at):
+            eaten_at = timezone.make_aware(eaten_at)
+        offset = (eaten_at - timezone.now()).total_seconds()
+    return {"data": data, "eaten_at_offset": offset}
+
+
+def _restore(entry: dict) -> dict:
+    data = dict(entry["data"])
+    eaten_at = timezone.localtime() + timedelta(seconds=entry["eaten_at_offset"] or 0)
+    data["eatenAt"] = eaten_at.isoformat()
+    return data
+
+
+@shared_instance
+def get_meal_parse_cache() -> MealParseCache:
+    return MealParseCache(
+        max_entries=settings.AI_PARSE_CACHE_MAX_ENTRIES,
+        ttl=settings.AI_PARSE_CACHE_TTL,
+        shared_alias=settings.AI_PARSE_CACHE_ALIAS,
+    )
@@ -7,3 +7,9 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.models  # noqa
+        import api.rollups  # noqa
+        import api.media  # noqa
+        import api.uploads  # noqa
+        import api.revisions  # noqa
+        import api.auth_cache  # noqa
+        import api.tasks  # noqa
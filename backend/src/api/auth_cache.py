@@ -0,0 +1,164 @@
+"""
+JWT 認証（api/authentication.py）のプロセス内キャッシュと計測。
+
+- 検証済みアクセストークン → ユーザー: トークン文字列のハッシュをキーにした TTL 付き LRU。
+  ヒットすれば署名検証と api_user の SELECT を省く。トークンの exp は毎回確かめる
+- リフレッシュの合流: 同じリフレッシュトークンで同時に来たリクエストは1つだけが
+  TokenRefreshSerializer を実行し、残りはその結果を待って使う。
+  直後に来たリクエストも AUTH_REFRESH_REUSE_SECONDS の間は同じ結果を使う
+  （ROTATE_REFRESH_TOKENS + ブラックリストでも、並んだリクエストが失敗しない）
+- 計測: 認証にかかった時間とヒット / ミス数（GET /api/auth/stats）
+
+キャッシュはプロセスごとなので、ユーザーの無効化やパスワード変更が他のプロセスに
+反映されるのは最大 AUTH_TOKEN_CACHE_TTL 秒後になる（同じプロセスなら User の保存で全部消す）。
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .ai_cache import TTLLRUCache, shared_instance
+
+
+def token_key(raw_token) -> str:
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode()
+    return hashlib.sha256(raw_token).hexdigest()
+
+
+def _snapshot(user):
+    """
+    キャッシュに置く用のコピー。profile などの関連は持たせない（古い値を返さないように）。
+    そのためヒットしたリクエストでは request.user.profile が Profile を1クエリで取り直す
+    （CalorieGoalView・ダッシュボード）。目標カロリーは別のプロセスで変わることがあり、
+    ここに持たせると最大 AUTH_TOKEN_CACHE_TTL 秒古い値を返してしまう
+    """
+    snapshot = copy.copy(user)
+    snapshot._state.fields_cache.clear()
+    return snapshot
+
+
+class AuthCache:
+    def __init__(self, max_entries: int, ttl: float, refresh_reuse: float, refresh_wait: float):
+        self.tokens = TTLLRUCache(max_entries, ttl)
+        self.refreshed = TTLLRUCache(max_entries, refresh_reuse)
+        self.refresh_wait = refresh_wait
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._counts = {
+            "requests": 0,
+            "token_hits": 0,
+            "token_misses": 0,
+            "refreshes": 0,
+            "refresh_coalesced": 0,
+        }
+        self._auth_seconds = 0.0
+        self._auth_max_seconds = 0.0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    # --- アクセストークン ---
+
+    def get_user(self, raw_token):
+        """(user, validated_token)。ミスか期限切れなら None。user はリクエストごとのコピー"""
+        entry = self.tokens.get(token_key(raw_token))
+        if entry is None or entry[0] <= time.time():
+            self._count("token_misses")
+            return None
+        self._count("token_hits")
+        _, user, validated_token = entry
+        return copy.copy(user), validated_token
+
+    def set_user(self, raw_token, user, validated_token) -> None:
+        self.tokens.set(
+            token_key(raw_token), (validated_token["exp"], _snapshot(user), validated_token)
+        )
+
+    # --- リフレッシュ ---
+
+    def refresh(self, refresh_token, do_refresh):
+        """
+        do_refresh() の結果（新しいトークンの dict）を返す。
+        同じトークンで実行中のものがあればそれを待ち、例外もそのまま受け取る
+        """
+        key = token_key(refresh_token)
+        with self._lock:
+            tokens = self.refreshed.get(key)
+            future = self._inflight.get(key)
+            leader = tokens is None and future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if tokens is not None:
+            self._count("refresh_coalesced")
+            return tokens
+        if not leader:
+            self._count("refresh_coalesced")
+            return future.result(timeout=self.refresh_wait)
+
+        self._count("refreshes")
+        try:
+            tokens = do_refresh()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            self.refreshed.set(key, tokens)
+            future.set_result(tokens)
+            return tokens
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # --- 計測 ---
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._counts["requests"] += 1
+            self._auth_seconds += seconds
+            self._auth_max_seconds = max(self._auth_max_seconds, seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            total, worst = self._auth_seconds, self._auth_max_seconds
+        lookups = counts["token_hits"] + counts["token_misses"]
+        return {
+            **counts,
+            "token_hit_rate": counts["token_hits"] / lookups if lookups else 0.0,
+            "token_entries": len(self.tokens),
+            "auth_ms_avg": total / counts["requests"] * 1000 if counts["requests"] else 0.0,
+            "auth_ms_max": worst * 1000,
+        }
+
+    def clear(self) -> None:
+        self.tokens.clear()
+        self.refreshed.clear()
+        with self._lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+            self._auth_seconds = self._auth_max_seconds = 0.0
+
+
+@shared_instance
+def get_auth_cache() -> AuthCache:
+    return AuthCache(
+        max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+        ttl=settings.AUTH_TOKEN_CACHE_TTL,
+        refresh_reuse=settings.AUTH_REFRESH_REUSE_SECONDS,
+        refresh_wait=settings.AUTH_REFRESH_WAIT_TIMEOUT,
+    )
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def clear_on_user_change(sender, **kwargs):
+    # ユーザーの保存はまれなので、誰の分かを探さずに全部消す（is_active・パスワード変更を即反映）
+    get_auth_cache().tokens.clear()
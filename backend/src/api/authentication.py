@@ -1,11 +1,86 @@
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
 from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .auth_cache import get_auth_cache
+
 
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Authorization: Bearer <token> の JWT 認証に、検証済みトークン → ユーザーの
+    キャッシュ（api/auth_cache.py）と認証時間の計測を足したもの。
+    キャッシュにないときはユーザーを Profile と一緒に1クエリで取る。
+    """
 
-class JWTCookieAuthentication(JWTAuthentication):
     def authenticate(self, request):
+        started = time.perf_counter()
+        try:
+            return self.authenticate_request(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            # リクエストごとの認証時間（ミドルウェアなどから参照できるように残す）
+            request._request.auth_time = elapsed
+            get_auth_cache().record(elapsed)
+
+    def authenticate_request(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return self.authenticate_token(raw_token)
+
+    def authenticate_token(self, raw_token):
+        """生のトークンから (user, validated_token)。不正なら InvalidToken"""
+        cache = get_auth_cache()
+        cached = cache.get_user(raw_token)
+        if cached is not None:
+            return cached
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        cache.set_user(raw_token, user, validated_token)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        # 親クラスと同じチェック。profile を select_related して
+        # CalorieGoalView などの追加クエリをなくす（キャッシュにヒットしたときは
+        # profile は持っていないので取り直す。api/auth_cache.py の _snapshot を参照）
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = self.user_model.objects.select_related("profile").get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            revoke_claim = validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+            if revoke_claim != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
+
+
+class JWTCookieAuthentication(CachedJWTAuthentication):
+    def authenticate_request(self, request):
         cookie_name = settings.SIMPLE_JWT.get("AUTH_COOKIE")
         raw_token = request.COOKIES.get(cookie_name)
 
@@ -13,8 +88,7 @@ class JWTCookieAuthentication(JWTAuthentication):
             return None
 
         try:
-            validated_token = self.get_validated_token(raw_token)
-            return self.get_user(validated_token), validated_token
+            return self.authenticate_token(raw_token)
         except InvalidToken:
             refresh_cookie_name = settings.SIMPLE_JWT.get("AUTH_COOKIE_REFRESH")
             refresh_token = request.COOKIES.get(refresh_cookie_name)
@@ -22,21 +96,24 @@ class JWTCookieAuthentication(JWTAuthentication):
             if not refresh_token:
                 return None
 
-            serializer = TokenRefreshSerializer(data={"refresh": refresh_token})
-
+            # 同じブラウザから並んで来たリクエストは、1回のリフレッシュ結果を使い回す
             try:
-                serializer.is_valid(raise_exception=True)
-            except TokenError:
+                new_tokens = get_auth_cache().refresh(
+                    refresh_token, lambda: self.refresh(refresh_token)
+                )
+            except (TokenError, FutureTimeoutError):
                 return None
 
-            new_tokens = serializer.validated_data
-
             request._request.new_tokens = new_tokens
 
             new_access_token = new_tokens["access"]
 
             try:
-                validated_token = self.get_validated_token(new_access_token)
-                return self.get_user(validated_token), validated_token
+                return self.authenticate_token(new_access_token)
             except InvalidToken:
                 return None
+
+    def refresh(self, refresh_token):
+        serializer = TokenRefreshSerializer(data={"refresh": refresh_token})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
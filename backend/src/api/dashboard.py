@@ -0,0 +1,54 @@
+"""
+ダッシュボード（GET /api/dashboard/）のユーザー別キャッシュ。
+
+今日の食事・直近7日のカロリー・1日の目標カロリーをまとめた payload を
+DASHBOARD_CACHE_ALIAS のキャッシュに入れる。キーには payload の元になるものを全部入れる:
+
+- 食事の版数（MealRevision。Meal の書き込みと同じトランザクションで +1 される。api/revisions.py）
+- 目標カロリー（Profile.daily_calorie_goal）
+- 今日の日付
+
+版数と目標は1クエリで読み、そのあとで payload を作る。書き込みが途中でコミットされても
+payload の方が新しくなるだけで、古い payload が新しい版数のキーに入ることはない。
+消しに行く必要はなく、使われなくなった古いキーは TTL で消える。
+locmem はプロセスごとのキャッシュなので、複数プロセスで動かすときは
+CACHE_BACKEND=file / db（settings.py）にする。
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.utils import timezone
+
+from . import revisions
+from .models import MealRevision, Profile
+
+
+def get_cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def version_for(user) -> str:
+    """user（None は未ログイン）のダッシュボードの中身が変わると変わる文字列"""
+    if user is None:
+        return revisions.revision_for_user(None)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                (SELECT revision FROM {MealRevision._meta.db_table} WHERE user_id = %s),
+                (SELECT daily_calorie_goal FROM {Profile._meta.db_table} WHERE user_id = %s)
+            """,
+            [user.pk, user.pk],
+        )
+        revision, goal = cursor.fetchone()
+    return f"u{user.pk}:{revision or 0}:g{goal}"
+
+
+def cache_key(user) -> str:
+    # 日付が変わると「今日」も変わるので、キーに日付も入れる
+    return f"dashboard:{version_for(user)}:{timezone.localdate().isoformat()}"
+
+
+def key_for(request) -> str:
+    return cache_key(request.user if request.user.is_authenticated else None)
@@ -0,0 +1,23 @@
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+
+def local_day_start(d: date) -> datetime:
+    """ローカルタイムゾーン（Asia/Tokyo）での d の 0:00 を aware datetime で返す"""
+    return timezone.make_aware(datetime.combine(d, time.min))
+
+
+def local_day_bounds(d: date) -> tuple[datetime, datetime]:
+    """
+    d の1日分を半開区間 [当日0:00, 翌日0:00) で返す。
+
+    eaten_at__date=... は行ごとに AT TIME ZONE 変換が入りインデックスが使えないので、
+    eaten_at__gte / eaten_at__lt で絞り込むためにこちらを使う。
+    """
+    return local_day_start(d), local_day_start(d + timedelta(days=1))
+
+
+def local_range_bounds(start: date, end: date) -> tuple[datetime, datetime]:
+    """start〜end（両端含む）を半開区間 [start 0:00, end 翌日0:00) で返す"""
+    return local_day_start(start), local_day_start(end + timedelta(days=1))
@@ -0,0 +1,79 @@
+"""
+食事履歴のエクスポート（CSV / NDJSON）。
+
+モデルインスタンスや DRF のシリアライザは通さず、values_list をサーバーサイドカーソル
+（.iterator(chunk_size=...)）で流しながら1行ずつ書き出す。
+メモリ使用量は件数によらず chunk_size 分で一定。
+"""
+
+import csv
+import json
+
+from django.utils import timezone
+
+# 出力する列（API の MealSerializer と同じ名前にそろえる）
+EXPORT_COLUMNS = ["id", "name", "eatenAt", "calorie", "tag", "created_at", "image"]
+_DB_FIELDS = ["id", "name", "eaten_at", "calorie", "tag", "created_at", "image"]
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+
+def export_rows(qs, chunk_size: int = 2000):
+    """(id, name, eatenAt, calorie, tag, created_at, image) のタプルを順に返す"""
+    tz = timezone.get_current_timezone()
+    rows = qs.order_by("eaten_at", "id").values_list(*_DB_FIELDS)
+    for pk, name, eaten_at, calorie, tag, created_at, image in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        yield (
+            pk,
+            name,
+            eaten_at.astimezone(tz).isoformat(),
+            calorie,
+            tag,
+            created_at.astimezone(tz).isoformat(),
+            image or "",
+        )
+
+
+class _Echo:
+    """csv.writer の書き込み先。書いた文字列をそのまま返す"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+
+
+def _buffered(lines, size: int = 64 * 1024):
+    """1行ずつ yield すると WSGI サーバーの書き込み回数が増えるので、ある程度まとめて流す"""
+    buf = []
+    length = 0
+    for line in lines:
+        buf.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buf)
+            buf = []
+            length = 0
+    if buf:
+        yield "".join(buf)
+
+
+def stream(qs, fmt: str, chunk_size: int = 2000):
+    rows = export_rows(qs, chunk_size)
+    lines = csv_lines(rows) if fmt == "csv" else ndjson_lines(rows)
+    return _buffered(lines)
@@ -0,0 +1,152 @@
+"""
+食事画像の加工。
+
+スマホの写真は 3〜8 MB あるので、アップロード時に
+- EXIF の向き（Orientation）を画素に反映してから EXIF を捨てる（位置情報なども消える）
+- 一覧用の thumb / 詳細用の medium を WebP で作る
+- 元画像も EXIF なしで保存し直す（長辺は ORIGINAL_MAX_EDGE まで）
+を行い、Meal.image / image_medium / image_thumb に保存する。
+同じ入力からは同じバイト列ができるので、同じ写真の再アップロードは同じファイルにまとまる。
+"""
+
+import io
+import uuid
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import media
+from .storage import meal_image_storage
+
+# 名前: 長辺の最大ピクセル数
+VARIANTS = {
+    "thumb": 320,
+    "medium": 1280,
+}
+ORIGINAL_MAX_EDGE = 4096
+WEBP_QUALITY = 80
+JPEG_QUALITY = 90
+
+# 元画像の保存形式（それ以外の形式は PNG にする）
+_ORIGINAL_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def _open(file) -> Image.Image:
+    try:
+        img = Image.open(file)
+        img.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImageError(str(e)) from e
+    return img
+
+
+def _normalize_mode(img: Image.Image) -> Image.Image:
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    target = "RGBA" if has_alpha else "RGB"
+    return img if img.mode == target else img.convert(target)
+
+
+def _encode(img: Image.Image, fmt: str, icc_profile) -> bytes:
+    buf = io.BytesIO()
+    # exif は渡さない = EXIF なしで書き出す。色がずれないよう ICC プロファイルだけ残す
+    options = {"icc_profile": icc_profile} if icc_profile else {}
+    if fmt == "JPEG":
+        if img.mode == "RGBA":
+            img = img.convert("RGB")
+        img.save(buf, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True, **options)
+    elif fmt == "WEBP":
+        img.save(buf, "WEBP", quality=WEBP_QUALITY, method=4, **options)
+    else:
+        img.save(buf, "PNG", optimize=True, **options)
+    return buf.getvalue()
+
+
+def process_image(file) -> dict[str, ContentFile]:
+    """
+    アップロードされた画像から {"original", "medium", "thumb"} の ContentFile を作る。
+    画像として読めなければ InvalidImageError。
+    """
+    img = _open(file)
+    source_format = img.format
+    icc_profile = img.info.get("icc_profile")
+
+    img = _normalize_mode(ImageOps.exif_transpose(img))
+    if max(img.size) > ORIGINAL_MAX_EDGE:
+        img.thumbnail((ORIGINAL_MAX_EDGE, ORIGINAL_MAX_EDGE), Image.Resampling.LANCZOS)
+
+    base = uuid.uuid4().hex
+    fmt = source_format if source_format in _ORIGINAL_FORMATS else "PNG"
+    ext = _ORIGINAL_FORMATS[fmt]
+    files = {"original": ContentFile(_encode(img, fmt, icc_profile), name=f"{base}.{ext}")}
+
+    # 大きい順に縮めていき、次のサイズは直前の縮小結果から作る（元画像から毎回縮めるより速い）
+    current = img
+    for name, edge in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+        if max(current.size) > edge:
+            current = current.copy()
+            current.thumbnail((edge, edge), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        files[name] = ContentFile(_encode(current, "WEBP", icc_profile), name=f"{base}.webp")
+    return files
+
+
+def save_images(meal, file) -> None:
+    """
+    file を加工して meal の画像を差し替える。
+    ファイルは中身のハッシュ名で保存され（api/storage.py）、古いファイルは
+    ほかの Meal から使われていなければコミット後に消える（api/media.py）。
+    """
+    files = process_image(file)
+    old_names = meal.image_names()
+    targets = [
+        (meal.image, files["original"]),
+        (meal.image_medium, files["medium"]),
+        (meal.image_thumb, files["thumb"]),
+    ]
+    with transaction.atomic():
+        # 同じファイルを消しに来ている release() の後始末と入れ違わないよう、保存より先にロックする
+        media.lock(
+            field_file.storage.hashed_name(
+                field_file.field.generate_filename(meal, content.name), content
+            )
+            for field_file, content in targets
+        )
+        for field_file, content in targets:
+            field_file.save(content.name, content, save=False)
+        meal.save(update_fields=["image", "image_medium", "image_thumb"])
+        media.acquire(meal.image_names())
+        media.release(old_names)
+
+
+def media_url_prefix(request=None) -> str:
+    """
+    画像 URL の共通部分（http://host/media/）。storage.url(name) は MEDIA_URL + name なので、
+    一覧ではこれをリクエストにつき1回だけ作り、行ごとに media_url() で名前を足す。
+    """
+    base_url = meal_image_storage.base_url
+    return request.build_absolute_uri(base_url) if request else base_url
+
+
+def media_url(prefix: str, name: str) -> str:
+    return prefix + filepath_to_uri(name).lstrip("/")
+
+
+def image_urls(meal, request=None) -> dict | None:
+    """{"thumb", "medium", "original"} の URL。縮小版がまだない画像は元画像の URL で埋める"""
+    if not meal.image:
+        return None
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request else url
+
+    original = absolute(meal.image.url)
+    return {
+        "thumb": absolute(meal.image_thumb.url) if meal.image_thumb else original,
+        "medium": absolute(meal.image_medium.url) if meal.image_medium else original,
+        "original": original,
+    }
@@ -0,0 +1,226 @@
+"""
+食事履歴のインポート（CSV / NDJSON）。
+
+- ファイルは1行ずつ読み、chunk_size 行ごとに検証して書き込む（メモリは chunk 分で一定）
+- 書き込みは PostgreSQL の COPY（psycopg 3）。method="bulk" なら bulk_create
+- 不正な行はスキップして行番号つきで報告する
+- COPY / bulk_create はシグナルが飛ばないので、日次集計は (user, 日付) ごとに
+  差分をためておき、最後に rollups.apply_deltas() でまとめて反映する
+
+列はエクスポート（api/exports.py）と同じ名前。name / eatenAt / calorie / tag を使い、
+それ以外（id, created_at, image など）は無視する。eaten_at も eatenAt として受け付ける。
+"""
+
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from . import revisions, rollups
+from .models import Meal
+from .serializers import MealSerializer
+
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 100
+
+# 1行ごとに MealSerializer を作ると重いので、フィールドだけ一度作って使い回す
+_FIELDS = MealSerializer().fields
+
+
+@dataclass
+class ImportResult:
+    """
+    1行ずつ検証して書き込む一括処理の結果（ユーザーの一括作成 api/provisioning.py でも使う）。
+    as_dict() では書き込んだ件数を label の名前で返す。
+    """
+
+    imported: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+    aborted: bool = False
+    label: str = "imported"
+
+    def add_error(self, line: int, errors) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        return {
+            self.label: self.imported,
+            "errorCount": self.error_count,
+            "errors": self.errors,
+            "aborted": self.aborted,
+        }
+
+
+def guess_format(filename: str) -> str | None:
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def iter_records(binary_file, fmt: str):
+    """(行番号, dict) を順に返す。binary_file はバイナリモードのファイル"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None
+            continue
+        yield line_no, record
+
+
+def _validate(errors: dict, key: str, value):
+    try:
+        return _FIELDS[key].run_validation(value)
+    except serializers.ValidationError as e:
+        errors[key] = [str(message) for message in e.detail]
+        return None
+
+
+def clean_record(record) -> tuple[str, datetime, int, str]:
+    """
+    1行分を検証して (name, eaten_at, calorie, tag) を返す。
+    ダメなら {フィールド: [メッセージ]} を ValueError の引数にして投げる。
+    API と食い違わないよう、name / tag / calorie は MealSerializer のフィールド定義そのもので
+    検証する（calorie の 12.5 や true も API と同じく弾く）。
+    """
+    if not isinstance(record, dict):
+        raise ValueError({"non_field_errors": ["invalid record"]})
+
+    errors = {}
+    name = _validate(errors, "name", record.get("name", empty))
+    tag = _validate(errors, "tag", record.get("tag", empty))
+    calorie = _validate(errors, "calorie", record.get("calorie", empty))
+
+    # eatenAt だけは DateTimeField を通さない（同じ ISO 8601 の解釈だが、1行あたり10倍ほど遅い）
+    raw_eaten_at = record.get("eatenAt") or record.get("eaten_at")
+    eaten_at = None
+    try:
+        eaten_at = parse_datetime(str(raw_eaten_at or ""))
+    except ValueError:
+        pass
+    if eaten_at is None:
+        errors["eatenAt"] = ["Datetime has wrong format."]
+    elif timezone.is_naive(eaten_at):
+        eaten_at = timezone.make_aware(eaten_at)
+
+    if errors:
+        raise ValueError(errors)
+    return name, eaten_at, calorie, tag
+
+
+def _write_copy(rows) -> None:
+    table = Meal._meta.db_table
+    columns = "user_id, name, eaten_at, calorie, tag, created_at"
+    with connection.cursor() as cursor:
+        # Django のカーソルラッパーの中身（psycopg 3 のカーソル）で COPY する
+        with cursor.cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def _write_bulk(rows, batch_size: int) -> None:
+    Meal.objects.bulk_create(
+        [
+            Meal(user_id=user_id, name=name, eaten_at=eaten_at, calorie=calorie, tag=tag)
+            for user_id, name, eaten_at, calorie, tag, _ in rows
+        ],
+        batch_size=batch_size,
+    )
+
+
+def import_meals(
+    binary_file,
+    fmt: str,
+    user=None,
+    *,
+    chunk_size: int = 5000,
+    method: str = "copy",
+    max_errors: int | None = None,
+    progress=None,
+) -> ImportResult:
+    """
+    binary_file から食事を取り込む。全体で1トランザクション。
+    max_errors を超えたら中断してロールバックする（aborted=True）。
+    progress(処理済み行数, ImportResult) をチャンクごとに呼ぶ。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}")
+
+    user_id = user.pk if user is not None else None
+    now = timezone.now()
+    result = ImportResult()
+    deltas = {}
+    seen = 0
+
+    def flush(rows):
+        if not rows:
+            return
+        if method == "copy":
+            _write_copy(rows)
+        else:
+            _write_bulk(rows, chunk_size)
+        result.imported += len(rows)
+
+    try:
+        with transaction.atomic():
+            rows = []
+            for line_no, record in iter_records(binary_file, fmt):
+                seen += 1
+                try:
+                    name, eaten_at, calorie, tag = clean_record(record)
+                except ValueError as e:
+                    result.add_error(line_no, e.args[0])
+                    if max_errors is not None and result.error_count > max_errors:
+                        result.aborted = True
+                        raise _Abort from None
+                    continue
+
+                rows.append((user_id, name, eaten_at, calorie, tag, now))
+                key = (user_id, timezone.localdate(eaten_at))
+                total, count = deltas.get(key, (0, 0))
+                deltas[key] = (total + calorie, count + 1)
+
+                if len(rows) >= chunk_size:
+                    flush(rows)
+                    rows = []
+                    if progress:
+                        progress(seen, result)
+
+            flush(rows)
+            rollups.apply_deltas(deltas)
+            if result.imported:
+                revisions.bump([user_id])
+            if progress:
+                progress(seen, result)
+    except _Abort:
+        result.imported = 0
+
+    return result
+
+
+class _Abort(Exception):
+    pass
@@ -0,0 +1,156 @@
+"""
+PostgreSQL だけで動くジョブキュー。
+
+- enqueue(kind, payload) で Job を1行 INSERT する
+- ワーカー（manage.py run_worker）が claim() で1件取り出す。
+  SELECT ... FOR UPDATE SKIP LOCKED なので、ワーカーを何台並べても同じジョブを取り合わない
+- 失敗したら指数バックオフ（+ ゆらぎ）で run_after を先に延ばして再実行、
+  max_attempts 回失敗したら failed
+- ワーカーが落ちて running のまま残ったジョブは requeue_stale() で待機中に戻す
+
+処理の中身は @handler("種類") で登録する（api/tasks.py）。
+on_failure を渡すと、ジョブが failed で終わったときに呼ばれる（一時ファイルの後始末など）。
+"""
+
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+FAILURE_HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """再実行しても結果が変わらない失敗（入力が不正など）。すぐ failed にする"""
+
+
+def handler(kind: str, *, on_failure=None):
+    def register(func):
+        HANDLERS[kind] = func
+        if on_failure is not None:
+            FAILURE_HANDLERS[kind] = on_failure
+        return func
+
+    return register
+
+
+def enqueue(kind: str, payload: dict, *, user=None, max_attempts: int | None = None) -> Job:
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        user=user if user is not None and user.is_authenticated else None,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def backoff(attempts: int) -> timedelta:
+    """attempts 回目の失敗のあと、次に実行するまでの待ち時間"""
+    delay = min(settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    # 同時に失敗したジョブが同じ時刻に一斉に再実行されないよう、少しずらす
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim(worker_id: str) -> Job | None:
+    """実行可能なジョブを1件取り出して running にする。なければ None"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.QUEUED, run_after__lte=now)
+            .order_by("run_after")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = Job.Status.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.save(update_fields=["status", "attempts", "locked_by", "locked_at"])
+    return job
+
+
+def _finish(job: Job, **fields) -> bool:
+    # 実行中に requeue_stale() で別のワーカーに渡っていたら上書きしない
+    return bool(
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=Job.Status.RUNNING).update(
+            locked_by="", locked_at=None, **fields
+        )
+    )
+
+
+def _on_failure(job: Job) -> None:
+    func = FAILURE_HANDLERS.get(job.kind)
+    if func is None:
+        return
+    try:
+        func(job)
+    except Exception:
+        logger.exception("on_failure for job %s (%s) failed", job.pk, job.kind)
+
+
+def run_job(job: Job) -> None:
+    """claim() したジョブを実行して、結果（成功 / 再実行待ち / 失敗）を書き込む"""
+    func = HANDLERS.get(job.kind)
+    try:
+        if func is None:
+            raise PermanentJobError(f"unknown job kind: {job.kind}")
+        result = func(job)
+    except Exception as e:
+        # 状態確認の API で返すので、トレースバックはログにだけ出す
+        error = f"{type(e).__name__}: {e}"
+        now = timezone.now()
+        if isinstance(e, PermanentJobError) or job.attempts >= job.max_attempts:
+            logger.warning("job %s (%s) failed: %s", job.pk, job.kind, e, exc_info=True)
+            if _finish(job, status=Job.Status.FAILED, error=error, finished_at=now):
+                _on_failure(job)
+        else:
+            logger.info("job %s (%s) attempt %d failed, will retry: %s",
+                        job.pk, job.kind, job.attempts, e, exc_info=True)
+            _finish(job, status=Job.Status.QUEUED, error=error,
+                    run_after=now + backoff(job.attempts))
+        return
+
+    _finish(job, status=Job.Status.SUCCEEDED, result=result, error="",
+            finished_at=timezone.now())
+
+
+def run_next(worker_id: str) -> bool:
+    """1件実行する。実行するジョブがなければ False"""
+    job = claim(worker_id)
+    if job is None:
+        return False
+    run_job(job)
+    return True
+
+
+def requeue_stale(timeout: float | None = None) -> int:
+    """locked_at から timeout 秒以上 running のままのジョブを待機中に戻す"""
+    timeout = settings.JOB_STALE_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING, locked_at__lt=now - timedelta(seconds=timeout)
+    )
+    # 毎回ワーカーごと落とすようなジョブは、回数を使い切ったら戻さずに failed にする
+    with transaction.atomic():
+        exhausted = list(
+            stale.filter(attempts__gte=F("max_attempts")).select_for_update(skip_locked=True)
+        )
+        Job.objects.filter(pk__in=[job.pk for job in exhausted]).update(
+            status=Job.Status.FAILED, locked_by="", locked_at=None, finished_at=now,
+            error="worker did not finish the job",
+        )
+    for job in exhausted:
+        _on_failure(job)
+    return stale.update(status=Job.Status.QUEUED, locked_by="", locked_at=None, run_after=now)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import uploads
+
+
+class Command(BaseCommand):
+    help = "Deletes chunked image uploads that were never finalized."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=settings.UPLOAD_EXPIRE_HOURS)
+
+    def handle(self, *args, **options):
+        count = uploads.purge_expired(options["hours"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} expired uploads."))
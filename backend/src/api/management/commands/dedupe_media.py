@@ -0,0 +1,68 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from api import media, revisions
+from api.models import Meal
+from api.storage import content_hash, is_hashed_name, meal_image_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves meal images saved before content-addressed storage to hashed names, "
+        "merging duplicate files, and rebuilds the MediaFile reference counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = meal_image_storage
+        dry_run = options["dry_run"]
+        moved = {}  # 古い名前 -> ハッシュ名（--dry-run ならハッシュ値）
+        sizes = {}
+        touched_users = set()
+
+        for meal in Meal.objects.order_by("id").iterator(chunk_size=500):
+            changes = {}
+            for field_name in media.IMAGE_FIELDS:
+                name = getattr(meal, field_name).name
+                if not name or is_hashed_name(name):
+                    continue
+                if name not in moved:
+                    try:
+                        sizes[name] = storage.size(name)
+                        with storage.open(name, "rb") as f:
+                            if dry_run:
+                                moved[name] = content_hash(File(f))
+                            else:
+                                moved[name] = storage.save(name, File(f))
+                    except FileNotFoundError:
+                        self.stderr.write(f"meal {meal.pk}: {name} is missing")
+                        continue
+                changes[field_name] = moved[name]
+
+            if changes and not dry_run:
+                Meal.objects.filter(pk=meal.pk).update(**changes)
+                touched_users.add(meal.user_id)
+
+        # 中身が同じファイルは1つ残して、あとは消える
+        kept = {}
+        for name, target in moved.items():
+            kept.setdefault(target, sizes[name])
+        freed = sum(sizes.values()) - sum(kept.values())
+
+        if not dry_run:
+            media.rebuild()
+            # 画像の URL が変わるので、一覧の ETag も変える
+            revisions.bump(touched_users)
+            for name in moved:
+                if name not in kept:
+                    storage.delete(name)
+
+        verb = "Would merge" if dry_run else "Merged"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {len(moved)} files into {len(kept)} content-addressed files "
+                f"({freed / 1024 / 1024:.1f} MB freed)."
+            )
+        )
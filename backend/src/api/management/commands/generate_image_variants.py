@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.images import InvalidImageError, save_images
+from api.models import Meal
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates thumb/medium variants (and strips EXIF) "
+        "for meal images uploaded before the pipeline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Reprocess images that already have variants."
+        )
+
+    def handle(self, *args, **options):
+        meals = Meal.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["all"]:
+            meals = meals.filter(Q(image_thumb__isnull=True) | Q(image_thumb=""))
+
+        done = failed = 0
+        for meal in meals.order_by("id").iterator(chunk_size=100):
+            try:
+                with meal.image.open("rb") as f:
+                    save_images(meal, f)
+            except (InvalidImageError, FileNotFoundError) as e:
+                failed += 1
+                self.stderr.write(f"meal {meal.pk}: {e}")
+                continue
+            done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} images ({failed} failed)."))
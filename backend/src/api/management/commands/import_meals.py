@@ -0,0 +1,72 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import FORMATS, guess_format, import_meals
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Imports meal history from a CSV or NDJSON file (streamed, COPY-based)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--user", help="username to own the imported meals")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--method", choices=["copy", "bulk"], default="copy")
+        parser.add_argument("--max-errors", type=int, default=None)
+        parser.add_argument("--progress-every", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot guess the format; pass --format csv|ndjson.")
+
+        user = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist.')
+
+        started = time.perf_counter()
+        last = 0
+
+        def progress(seen, result):
+            nonlocal last
+            if seen - last >= options["progress_every"]:
+                last = seen
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{seen} rows read, {result.imported} imported, "
+                    f"{result.error_count} errors ({seen / elapsed:,.0f} rows/s)"
+                )
+
+        with open(options["path"], "rb") as f:
+            result = import_meals(
+                f,
+                fmt,
+                user,
+                chunk_size=options["chunk_size"],
+                method=options["method"],
+                max_errors=options["max_errors"],
+                progress=progress,
+            )
+
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(f"line {error['line']}: {error['errors']}"))
+        if result.error_count > len(result.errors):
+            self.stdout.write(
+                self.style.WARNING(f"... and {result.error_count - len(result.errors)} more")
+            )
+
+        if result.aborted:
+            raise CommandError("Too many errors; nothing was imported.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.imported} meals in {time.perf_counter() - started:.1f}s."
+            )
+        )
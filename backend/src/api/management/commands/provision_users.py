@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import FORMATS, guess_format, iter_records
+from api.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates users and their profiles in bulk from a CSV or NDJSON file "
+        "(columns: username, email, password, daily_calorie_goal). "
+        "Leave password empty for large files: each password is hashed one row at a time, "
+        "so users are meant to be created without one and set it via password reset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot guess the format; pass --format csv|ndjson.")
+
+        started = time.perf_counter()
+
+        def progress(seen, result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{seen} rows read, {result.imported} created, "
+                f"{result.error_count} errors ({seen / elapsed:,.0f} rows/s)"
+            )
+
+        with open(options["path"], "rb") as f:
+            result = provision_users(
+                iter_records(f, fmt), batch_size=options["batch_size"], progress=progress
+            )
+
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(f"line {error['line']}: {error['errors']}"))
+        if result.error_count > len(result.errors):
+            self.stdout.write(
+                self.style.WARNING(f"... and {result.error_count - len(result.errors)} more")
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {result.imported} users in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,46 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs (image processing, AI parsing) from the Job table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when no job is ready.")
+        parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument("--worker-id", default=f"{socket.gethostname()}:{os.getpid()}")
+
+    def handle(self, *args, **options):
+        worker_id = options["worker_id"]
+        poll_interval = options["poll_interval"]
+        self.stopping = False
+
+        def stop(signum, frame):
+            # 実行中のジョブは最後まで終わらせてから止まる
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Worker {worker_id} started.")
+        done = 0
+        while not self.stopping:
+            close_old_connections()
+            if jobs.run_next(worker_id):
+                done += 1
+                continue
+
+            if options["once"]:
+                break
+            jobs.requeue_stale()
+            time.sleep(poll_interval)
+
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker_id} stopped after {done} jobs."))
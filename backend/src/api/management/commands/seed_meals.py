@@ -0,0 +1,160 @@
+import random
+import time
+from datetime import datetime, timedelta
+from datetime import time as dtime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api import revisions, rollups
+from api.models import Meal, Profile
+
+User = get_user_model()
+
+# 時間帯ごとの (時, 分の幅, [(食事名, カロリーの範囲, タグ)])
+SLOTS = [
+    (7, 90, [
+        ("トーストとコーヒー", (250, 450), "自炊"),
+        ("納豆ごはん", (350, 500), "和食"),
+        ("ヨーグルトとバナナ", (150, 300), "自炊"),
+        ("おにぎり", (180, 350), "間食"),
+    ]),
+    (12, 60, [
+        ("ラーメン", (500, 900), "外食"),
+        ("日替わり定食", (650, 950), "外食"),
+        ("パスタ", (550, 850), "洋食"),
+        ("コンビニ弁当", (600, 850), "外食"),
+        ("そば", (350, 550), "和食"),
+    ]),
+    (19, 120, [
+        ("カレーライス", (650, 950), "自炊"),
+        ("焼き魚定食", (500, 750), "和食"),
+        ("ハンバーグ", (600, 900), "洋食"),
+        ("鍋", (400, 700), "自炊"),
+        ("親子丼", (600, 850), "和食"),
+    ]),
+    (15, 180, [
+        ("プロテインバー", (150, 250), "間食"),
+        ("チョコレート", (100, 300), "間食"),
+        ("りんご", (80, 150), "間食"),
+    ]),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-inserts benchmark users and meals (users x days x meals/day). "
+        "Users are named <prefix>-00000, <prefix>-00001, ... and share one password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--days", type=int, default=90, help="今日からさかのぼる日数")
+        parser.add_argument("--meals-per-day", type=int, default=3)
+        parser.add_argument("--prefix", default="loadtest")
+        parser.add_argument("--password", default="loadtest-password")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--seed", type=int, default=0, help="乱数シード（同じ値なら同じデータになる）"
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="同じ prefix の既存ユーザーを食事ごと消してから入れる",
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        n_users = options["users"]
+        days = options["days"]
+        per_day = options["meals_per_day"]
+        batch_size = options["batch_size"]
+        if n_users < 1 or days < 1 or per_day < 1:
+            raise CommandError("--users, --days and --meals-per-day must be positive.")
+
+        existing = User.objects.filter(username__startswith=f"{prefix}-")
+        if options["clear"]:
+            deleted, _ = existing.delete()
+            self.stdout.write(f"Deleted {deleted} rows for {prefix}-* users.")
+        elif existing.exists():
+            raise CommandError(
+                f"Users named {prefix}-* already exist; pass --clear to replace them."
+            )
+
+        started = time.perf_counter()
+        rng = random.Random(options["seed"])
+        tz = timezone.get_current_timezone()
+        today = timezone.localdate()
+        # ハッシュ化は重いので全員同じハッシュを使う
+        password = make_password(options["password"])
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [
+                    User(
+                        username=f"{prefix}-{i:05d}",
+                        email=f"{prefix}-{i:05d}@example.com",
+                        password=password,
+                    )
+                    for i in range(n_users)
+                ],
+                batch_size=batch_size,
+            )
+            # bulk_create は create_profile シグナルを飛ばさないので Profile も自分で作る
+            Profile.objects.bulk_create(
+                [
+                    Profile(user=user, daily_calorie_goal=rng.randrange(1600, 2601, 100))
+                    for user in users
+                ],
+                batch_size=batch_size,
+            )
+
+        total = n_users * days * per_day
+        created = 0
+        batch = []
+        deltas = {}
+
+        def flush():
+            nonlocal created, batch
+            with transaction.atomic():
+                Meal.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{created}/{total} meals ({created / elapsed:,.0f} rows/s)")
+
+        for user in users:
+            for offset in range(days):
+                day = today - timedelta(days=offset)
+                midnight = datetime.combine(day, dtime.min, tzinfo=tz)
+                for slot in range(per_day):
+                    hour, spread, menu = SLOTS[slot % len(SLOTS)]
+                    name, (low, high), tag = rng.choice(menu)
+                    calorie = rng.randrange(low, high + 1)
+                    eaten_at = midnight + timedelta(hours=hour, minutes=rng.randrange(spread))
+                    batch.append(
+                        Meal(user=user, name=name, eaten_at=eaten_at, calorie=calorie, tag=tag)
+                    )
+                    key = (user.pk, day)
+                    day_total, count = deltas.get(key, (0, 0))
+                    deltas[key] = (day_total + calorie, count + 1)
+                    if len(batch) >= batch_size:
+                        flush()
+        if batch:
+            flush()
+
+        # bulk_create はシグナルが飛ばないので、日次集計とリビジョンはまとめて反映する
+        with transaction.atomic():
+            rollups.apply_deltas(deltas)
+            revisions.bump([user.pk for user in users])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {n_users} users and {created} meals "
+                f"in {time.perf_counter() - started:.1f}s "
+                f"(login: {prefix}-00000 .. {prefix}-{n_users - 1:05d} / {options['password']})."
+            )
+        )
@@ -0,0 +1,124 @@
+"""
+食事画像ファイルの参照カウント（MediaFile）。
+
+ContentAddressedStorage（api/storage.py）は同じ画像を1ファイルにまとめるので、
+Meal を消しただけではファイルを消せない。画像を付けたら acquire()、外したら release() し、
+参照が 0 になったファイルだけをコミット後に消す。
+
+「参照が 0 か確かめてファイルを消す」と「ファイルを保存して参照を +1 する」が
+名前ごとに交互に走らないよう、どちらも lock() の advisory lock（トランザクション終了まで）を取る。
+READ COMMITTED では、相手のコミット前の INSERT は見えないので行ロックだけでは足りない。
+
+- 画像の差し替え: api/images.py の save_images()
+- Meal の削除（MealDetailView など）: 下の post_delete シグナル
+- 一括削除（MealBulkView、シグナルが飛ばない）: ビューから release() を呼ぶ
+"""
+
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Meal, MediaFile
+from .storage import meal_image_storage
+
+IMAGE_FIELDS = ("image", "image_medium", "image_thumb")
+
+
+def _counts(names) -> tuple[list[str], list[int]]:
+    counts = Counter(name for name in names if name)
+    return list(counts), list(counts.values())
+
+
+def lock(names) -> None:
+    """
+    names ごとの advisory lock をトランザクションの終わりまで取る（atomic() の中で呼ぶ）。
+    デッドロックしないよう名前順に取る
+    """
+    keys = sorted({name for name in names if name})
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtext(n)) FROM unnest(%s::text[]) AS n ORDER BY n",
+            [keys],
+        )
+
+
+def acquire(names) -> None:
+    """
+    names の参照数を +1 する（同じ名前が複数あればその数だけ）。
+    ファイルの保存も同じトランザクションで lock() のあとにすること（api/images.py の save_images()）
+    """
+    keys, counts = _counts(names)
+    if not keys:
+        return
+    lock(keys)
+    table = MediaFile._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS t (name, refs)
+            SELECT * FROM unnest(%s::varchar[], %s::int[])
+            ON CONFLICT (name) DO UPDATE SET refs = t.refs + EXCLUDED.refs
+            """,
+            [keys, counts],
+        )
+
+
+def release(names) -> None:
+    """names の参照数を -1 して、0 になったファイルをコミット後に消す"""
+    keys, counts = _counts(names)
+    if not keys:
+        return
+    table = MediaFile._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS t SET refs = t.refs - v.n
+            FROM unnest(%s::varchar[], %s::int[]) AS v(name, n)
+            WHERE t.name = v.name
+            """,
+            [keys, counts],
+        )
+        cursor.execute(
+            f"DELETE FROM {table} WHERE name = ANY(%s) AND refs <= 0 RETURNING name",
+            [keys],
+        )
+        orphans = [row[0] for row in cursor.fetchall()]
+
+    # MediaFile にない名前（参照カウント導入前の古いファイル）は消さずに残す
+    if orphans:
+        transaction.on_commit(lambda: _delete_files(orphans))
+
+
+def _delete_files(names) -> None:
+    # コミットまでの間に同じ画像がアップロードされて参照が戻っていたら消さない。
+    # 保存中のアップロードがあれば lock() で待ち、そのコミット後の状態で確かめる。
+    # こちらが先に消した場合は、あとから来たアップロードがファイルを書き直す
+    for name in names:
+        with transaction.atomic():
+            lock([name])
+            if not MediaFile.objects.filter(name=name).exists():
+                meal_image_storage.delete(name)
+
+
+def rebuild() -> int:
+    """Meal の画像列から MediaFile を作り直す。行数を返す"""
+    counts = Counter()
+    for row in Meal.objects.values_list(*IMAGE_FIELDS).iterator(chunk_size=5000):
+        counts.update(name for name in row if name)
+
+    with transaction.atomic():
+        MediaFile.objects.all().delete()
+        MediaFile.objects.bulk_create(
+            [MediaFile(name=name, refs=refs) for name, refs in counts.items()],
+            batch_size=5000,
+        )
+    return len(counts)
+
+
+@receiver(post_delete, sender=Meal)
+def release_images_on_delete(sender, instance, **kwargs):
+    release(instance.image_names())
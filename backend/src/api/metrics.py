@@ -0,0 +1,248 @@
+"""
+リクエスト単位の計測と Prometheus 形式のメトリクス（GET /metrics）。
+
+- http_request_duration_seconds: ルート（URL パターン）× メソッド × ステータスごとのレイテンシ
+- http_request_db_queries / http_request_db_seconds: 1リクエストあたりのクエリ数と DB 時間
+  （MetricsMiddleware が connection.execute_wrapper で数える）
+- serializer_duration_seconds: シリアライザの .data にかかった時間（TimedSerializerMixin）
+- openai_request_duration_seconds / openai_tokens_total: OpenAI 呼び出しの時間とトークン数
+
+値はプロセスごと。gunicorn を複数ワーカーで動かすと、/metrics は応答したワーカーの分だけを返す
+（比べるときは GUNICORN_WORKERS=1 にするか、何度か取って見る）。
+DEBUG（または METRICS_SERVER_TIMING=True）のときは Server-Timing ヘッダーにも内訳を付ける。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+OPENAI_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # ラベル値 -> [バケットごとの件数..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values) -> None:
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = self._values[label_values] = [0] * len(self.buckets) + [0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for label_values, row in items:
+            for bound, count in zip(self.buckets, row):
+                labels = _format_labels(self.labels, label_values, [("le", _format_number(bound))])
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labels, label_values, [("le", "+Inf")])
+            yield f"{self.name}_bucket{labels} {row[-1]}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_number(float(row[-2]))}"
+            yield f"{self.name}_count{labels} {row[-1]}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route.",
+    labels=("route", "method", "status"),
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries per request.",
+    labels=("route", "method"),
+    buckets=QUERY_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in database queries per request.",
+    labels=("route", "method"),
+)
+SERIALIZER_DURATION = Histogram(
+    "serializer_duration_seconds",
+    "Time spent building serializer .data.",
+    labels=("serializer",),
+)
+OPENAI_DURATION = Histogram(
+    "openai_request_duration_seconds",
+    "OpenAI API call latency.",
+    labels=("model", "outcome"),
+    buckets=OPENAI_BUCKETS,
+)
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "OpenAI tokens used.",
+    labels=("model", "type"),
+)
+
+REGISTRY = [
+    REQUEST_DURATION,
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_SECONDS,
+    SERIALIZER_DURATION,
+    OPENAI_DURATION,
+    OPENAI_TOKENS,
+]
+
+
+def expose() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+# --- リクエストごとの内訳（Server-Timing 用） ---
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = {}  # 名前 -> 秒
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+_current = ContextVar("api_metrics_request", default=None)
+
+
+def current() -> RequestStats | None:
+    return _current.get()
+
+
+def start_request() -> tuple[RequestStats, object]:
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token) -> None:
+    _current.reset(token)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper 用。今のリクエストのクエリ数と時間を足す"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def timed(phase: str, histogram: Histogram | None = None, *label_values):
+    """with の中の時間を今のリクエストの phase に足し、histogram があれば記録する"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.add(phase, elapsed)
+        if histogram is not None:
+            histogram.observe(elapsed, *label_values)
+
+
+def observe_openai(model: str, seconds: float, response=None, error: bool = False) -> None:
+    OPENAI_DURATION.observe(seconds, model, "error" if error else "ok")
+    stats = _current.get()
+    if stats is not None:
+        stats.add("openai", seconds)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        OPENAI_TOKENS.inc(model, "input", amount=getattr(usage, "input_tokens", 0) or 0)
+        OPENAI_TOKENS.inc(model, "output", amount=getattr(usage, "output_tokens", 0) or 0)
+
+
+def server_timing(stats: RequestStats, total: float, auth_time: float | None = None) -> str:
+    parts = [f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"']
+    if auth_time is not None:
+        parts.append(f"auth;dur={auth_time * 1000:.1f}")
+    for phase, seconds in stats.phases.items():
+        parts.append(f"{phase};dur={seconds * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def metrics_view(request):
+    """
+    GET /metrics（Prometheus のテキスト形式）
+    METRICS_TOKEN を設定したら Authorization: Bearer <token> が必要。
+    本番（DJANGO_ENV=production）で METRICS_TOKEN がなければ 404 にする
+    （ルートごとのアクセス数・応答時間を誰でも見られないように）
+    """
+    token = settings.METRICS_TOKEN
+    if not token and settings.PRODUCTION:
+        raise Http404
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(expose(), content_type=CONTENT_TYPE)
@@ -1,4 +1,10 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
+from django.db import connection
+
+from . import metrics
 
 
 class TokenRefreshMiddleware:
@@ -32,3 +38,56 @@ class TokenRefreshMiddleware:
                 )
 
         return response
+
+
+class MetricsMiddleware:
+    """
+    ルートごとのレイテンシ・クエリ数・DB 時間を api/metrics.py に記録する。
+    MIDDLEWARE の先頭に置いて、ほかのミドルウェアの時間も含める。
+
+    ASGI の非同期ビューでは同期・非同期を切り替えずにそのまま通す。
+    その場合 DB クエリは別スレッドの接続で走るので、クエリ数・DB 時間は数えない。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        # パスそのままだと ID ごとに系列が増えるので、URL パターンで集計する
+        route = "/" + match.route if match is not None else "<unmatched>"
+        metrics.REQUEST_DURATION.observe(elapsed, route, request.method, response.status_code)
+        metrics.REQUEST_DB_QUERIES.observe(stats.queries, route, request.method)
+        metrics.REQUEST_DB_SECONDS.observe(stats.db_seconds, route, request.method)
+
+        if settings.METRICS_SERVER_TIMING:
+            response["Server-Timing"] = metrics.server_timing(
+                stats, elapsed, getattr(request, "auth_time", None)
+            )
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Meal は行数が多いので CREATE INDEX CONCURRENTLY で張る（書き込みを止めない）。
+    # CONCURRENTLY はトランザクションの中では使えない
+    atomic = False
+
+    dependencies = [
+        ('api', '0006_profile'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='meal',
+            index=models.Index(fields=['user', 'eaten_at'], name='meal_user_eaten_at_idx'),
+        ),
+    ]
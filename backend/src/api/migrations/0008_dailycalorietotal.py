@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def populate_daily_totals(apps, schema_editor):
+    Meal = apps.get_model("api", "Meal")
+    DailyCalorieTotal = apps.get_model("api", "DailyCalorieTotal")
+
+    rows = (
+        Meal.objects.order_by()
+        .annotate(day=TruncDate("eaten_at", tzinfo=timezone.get_current_timezone()))
+        .values("user_id", "day")
+        .annotate(total=Sum("calorie"), count=Count("id"))
+    )
+    DailyCalorieTotal.objects.bulk_create(
+        [
+            DailyCalorieTotal(
+                user_id=row["user_id"],
+                date=row["day"],
+                total_calorie=row["total"],
+                meal_count=row["count"],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('api', '0007_meal_user_eaten_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCalorieTotal',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('date', models.DateField(verbose_name='日付')),
+                (
+                    'total_calorie',
+                    models.IntegerField(default=0, verbose_name='合計カロリー(kcal)'),
+                ),
+                ('meal_count', models.IntegerField(default=0, verbose_name='食事数')),
+                (
+                    'user',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='daily_calorie_totals',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('user', 'date'),
+                        name='daily_calorie_total_user_date_uniq',
+                        nulls_distinct=False,
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_daily_totals, migrations.RunPython.noop),
+    ]
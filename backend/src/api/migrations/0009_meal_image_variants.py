@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('api', '0008_dailycalorietotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='image_medium',
+            field=models.ImageField(
+                blank=True, editable=False, null=True, upload_to='meals/medium/'
+            ),
+        ),
+        migrations.AddField(
+            model_name='meal',
+            name='image_thumb',
+            field=models.ImageField(
+                blank=True, editable=False, null=True, upload_to='meals/thumb/'
+            ),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:13
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('api', '0009_meal_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                (
+                    'id',
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                ('kind', models.CharField(max_length=50, verbose_name='種類')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='入力')),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('queued', '待機中'),
+                            ('running', '実行中'),
+                            ('succeeded', '成功'),
+                            ('failed', '失敗'),
+                        ],
+                        default='queued',
+                        max_length=10,
+                        verbose_name='状態',
+                    ),
+                ),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='実行回数')),
+                (
+                    'max_attempts',
+                    models.PositiveIntegerField(default=5, verbose_name='最大実行回数'),
+                ),
+                (
+                    'run_after',
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name='実行可能になる日時'
+                    ),
+                ),
+                (
+                    'locked_by',
+                    models.CharField(blank=True, max_length=100, verbose_name='実行中のワーカー'),
+                ),
+                (
+                    'locked_at',
+                    models.DateTimeField(blank=True, null=True, verbose_name='実行開始日時'),
+                ),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='結果')),
+                ('error', models.TextField(blank=True, verbose_name='エラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                (
+                    'finished_at',
+                    models.DateTimeField(blank=True, null=True, verbose_name='完了日時'),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='jobs',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [
+                    models.Index(
+                        condition=models.Q(('status', 'queued')),
+                        fields=['run_after'],
+                        name='job_queued_run_after_idx',
+                    )
+                ],
+            },
+        ),
+    ]
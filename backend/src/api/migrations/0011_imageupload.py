@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:16
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('api', '0010_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageUpload',
+            fields=[
+                (
+                    'id',
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    'filename',
+                    models.CharField(blank=True, max_length=255, verbose_name='ファイル名'),
+                ),
+                ('size', models.PositiveBigIntegerField(verbose_name='全体のバイト数')),
+                (
+                    'offset',
+                    models.PositiveBigIntegerField(default=0, verbose_name='受信済みのバイト数'),
+                ),
+                ('sha256', models.CharField(max_length=64, verbose_name='全体の SHA-256（16進）')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                (
+                    'meal',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='image_uploads',
+                        to='api.meal',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='image_uploads',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:17
+
+from collections import Counter
+
+from django.db import migrations, models
+
+import api.storage
+
+
+def populate_media_files(apps, schema_editor):
+    # 既存の画像も参照数を持たせておく（Meal を消したときに、ほかで使われていなければ消える）
+    Meal = apps.get_model("api", "Meal")
+    MediaFile = apps.get_model("api", "MediaFile")
+
+    counts = Counter()
+    for row in Meal.objects.values_list("image", "image_medium", "image_thumb").iterator():
+        counts.update(name for name in row if name)
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, refs=refs) for name, refs in counts.items()],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('api', '0011_imageupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                (
+                    'name',
+                    models.CharField(
+                        max_length=255, primary_key=True, serialize=False, verbose_name='ファイル名'
+                    ),
+                ),
+                ('refs', models.IntegerField(default=0, verbose_name='参照数')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='meal',
+            name='image',
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to='meals/',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='meal',
+            name='image_medium',
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to='meals/medium/',
+            ),
+        ),
+        migrations.AlterField(
+            model_name='meal',
+            name='image_thumb',
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                null=True,
+                storage=api.storage.ContentAddressedStorage(),
+                upload_to='meals/thumb/',
+            ),
+        ),
+        migrations.RunPython(populate_media_files, migrations.RunPython.noop),
+    ]
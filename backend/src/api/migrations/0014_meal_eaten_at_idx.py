@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:57
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 0007 と同じく、食事の書き込みを止めないよう CONCURRENTLY で張る
+    atomic = False
+
+    dependencies = [
+        ('api', '0013_mealrevision'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='meal',
+            index=models.Index(fields=['eaten_at'], name='meal_eaten_at_idx'),
+        ),
+    ]
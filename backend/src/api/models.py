@@ -1,7 +1,13 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator 
+
+from .storage import meal_image_storage
+
 class User(AbstractUser):
     # 追加フィールドがあればここ
     pass
@@ -20,18 +26,208 @@ class Meal(models.Model):
     calorie = models.PositiveIntegerField("カロリー(kcal)")
     tag = models.CharField("タグ", max_length=30)
     created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    # 画像は中身のハッシュ名で保存して重複を持たない（api/storage.py, 参照カウントは api/media.py）
     image = models.ImageField(
         upload_to="meals/",
+        storage=meal_image_storage,
         null=True,
         blank=True
     )
+    # アップロード時に api/images.py で作る縮小版（WebP）
+    image_medium = models.ImageField(
+        upload_to="meals/medium/", storage=meal_image_storage, null=True, blank=True, editable=False
+    )
+    image_thumb = models.ImageField(
+        upload_to="meals/thumb/", storage=meal_image_storage, null=True, blank=True, editable=False
+    )
 
     class Meta:
         ordering = ["-eaten_at"]
+        indexes = [
+            # 一覧・集計は「ユーザー × 期間」で絞るので複合インデックスを張る
+            models.Index(fields=["user", "eaten_at"], name="meal_user_eaten_at_idx"),
+            # 未ログイン（全ユーザー分）の一覧は user で絞らないので、期間だけのインデックスも張る
+            models.Index(fields=["eaten_at"], name="meal_eaten_at_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.name} - {self.calorie} kcal"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 日次集計（DailyCalorieTotal）の差分更新用に、読み込み時点の値を覚えておく
+        if {"user_id", "eaten_at", "calorie"} <= set(field_names):
+            instance._rollup_origin = instance.rollup_key()
+        return instance
+
+    def rollup_key(self):
+        """日次集計上の (user_id, ローカル日付, カロリー)"""
+        return self.user_id, timezone.localdate(self.eaten_at), self.calorie
+
+    def image_names(self) -> list[str]:
+        """保存されている画像ファイル名（元画像と縮小版、空のものは除く）"""
+        return [f.name for f in (self.image, self.image_medium, self.image_thumb) if f]
+
+
+class DailyCalorieTotal(models.Model):
+    """
+    ユーザー × 日付ごとのカロリー合計（Meal から派生する集計テーブル）。
+
+    Meal の保存・削除時に api/rollups.py のシグナルで差分更新される。
+    ずれた場合は `manage.py rebuild_daily_totals` で作り直せる。
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="daily_calorie_totals",
+        null=True,  # Meal.user と同じく未ログイン分は NULL にまとめる
+        blank=True,
+    )
+    date = models.DateField("日付")
+    total_calorie = models.IntegerField("合計カロリー(kcal)", default=0)
+    meal_count = models.IntegerField("食事数", default=0)
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "date"],
+                name="daily_calorie_total_user_date_uniq",
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.date}: {self.total_calorie} kcal"
+
+
+class MealRevision(models.Model):
+    """
+    ユーザーごとの食事データの版数。Meal を書き込むたびに +1 される（api/revisions.py）。
+    一覧・集計 API の ETag に使い、変わっていなければ本体のクエリを実行せずに 304 を返す。
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,  # 未ログインで作った Meal の分
+        blank=True,
+    )
+    revision = models.BigIntegerField("版数", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user"],
+                name="meal_revision_user_uniq",
+                nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id}: r{self.revision}"
+
+
+class Job(models.Model):
+    """
+    バックグラウンドジョブ（画像加工・AI 解析など）。
+
+    外部のブローカーは使わず、PostgreSQL のこのテーブルをキューにする。
+    `manage.py run_worker` が SELECT ... FOR UPDATE SKIP LOCKED で1件ずつ取り出して実行する。
+    処理の中身は api/jobs.py / api/tasks.py。
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "待機中"
+        RUNNING = "running", "実行中"
+        SUCCEEDED = "succeeded", "成功"
+        FAILED = "failed", "失敗"
+
+    # 状態確認の URL に使うので、連番ではなく推測できない ID にする
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="jobs",
+        null=True,
+        blank=True,
+    )
+    kind = models.CharField("種類", max_length=50)
+    payload = models.JSONField("入力", default=dict, blank=True)
+    status = models.CharField(
+        "状態", max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField("実行回数", default=0)
+    max_attempts = models.PositiveIntegerField("最大実行回数", default=5)
+    run_after = models.DateTimeField("実行可能になる日時", default=timezone.now)
+    locked_by = models.CharField("実行中のワーカー", max_length=100, blank=True)
+    locked_at = models.DateTimeField("実行開始日時", null=True, blank=True)
+    result = models.JSONField("結果", null=True, blank=True)
+    error = models.TextField("エラー", blank=True)
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    finished_at = models.DateTimeField("完了日時", null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # ワーカーの取り出しは「待機中 × 実行可能日時順」だけなので部分インデックスにする
+            models.Index(
+                fields=["run_after"],
+                name="job_queued_run_after_idx",
+                condition=models.Q(status="queued"),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+class MediaFile(models.Model):
+    """
+    メディアファイルの参照カウント。
+
+    ContentAddressedStorage は同じ中身を1ファイルにまとめるので、何か所の
+    Meal.image / image_medium / image_thumb から使われているかをここで数え、
+    0 になったらファイルを消す（api/media.py）。
+    """
+
+    name = models.CharField("ファイル名", max_length=255, primary_key=True)
+    refs = models.IntegerField("参照数", default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.refs})"
+
+
+class ImageUpload(models.Model):
+    """
+    再開できる画像アップロード（分割送信）のセッション。
+
+    init で作り、チャンクを offset 順に追記し、finalize でチェックサムを確かめて
+    Meal.image に付ける。途中のデータは UPLOAD_TEMP_DIR の一時ファイルにある（api/uploads.py）。
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="image_uploads",
+        null=True,
+        blank=True,
+    )
+    meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name="image_uploads")
+    filename = models.CharField("ファイル名", max_length=255, blank=True)
+    size = models.PositiveBigIntegerField("全体のバイト数")
+    offset = models.PositiveBigIntegerField("受信済みのバイト数", default=0)
+    sha256 = models.CharField("全体の SHA-256（16進）", max_length=64)
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    updated_at = models.DateTimeField("更新日時", auto_now=True)
+
+    def __str__(self) -> str:
+        return f"upload {self.id} ({self.offset}/{self.size})"
+
 
 class Profile(models.Model):
     user = models.OneToOneField(
@@ -0,0 +1,133 @@
+"""
+食事履歴のキーセット（カーソル）ページネーション。
+
+OFFSET は深いページほど読み飛ばす行が増えて遅くなるので、
+前のページの最後の (eaten_at, id) より後ろを LIMIT で取る。
+(user, eaten_at) の複合インデックスを範囲スキャンするだけなので、何ページ目でも同じ速さ。
+位置を値で持つので、閲覧中に食事が追加されてもページがずれない。
+
+並び順は新しい順（eaten_at DESC, id DESC）。
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class MealKeysetPagination(BasePagination):
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            reverse = False
+            qs = queryset.order_by("-eaten_at", "-id")
+        else:
+            eaten_at, pk, reverse = cursor
+            if reverse:
+                # 前のページ: カーソルより新しい側を古い順に取って、あとで反転する
+                qs = queryset.filter(
+                    Q(eaten_at__gte=eaten_at) & (Q(eaten_at__gt=eaten_at) | Q(id__gt=pk))
+                ).order_by("eaten_at", "id")
+            else:
+                # eaten_at <= t で索引の範囲を絞り、同時刻のものだけ id で切る
+                qs = queryset.filter(
+                    Q(eaten_at__lte=eaten_at) & (Q(eaten_at__lt=eaten_at) | Q(id__lt=pk))
+                ).order_by("-eaten_at", "-id")
+
+        rows = list(qs[: size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded))
+            eaten_at = parse_datetime(data["t"])
+            pk = int(data["i"])
+            reverse = bool(data.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if eaten_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return eaten_at, pk, reverse
+
+    def encode_cursor(self, meal, reverse: bool) -> str:
+        # meal は Meal でも meal_rows() の dict でもよい
+        if isinstance(meal, dict):
+            eaten_at, pk = meal["eaten_at"], meal["id"]
+        else:
+            eaten_at, pk = meal.eaten_at, meal.pk
+        data = {"t": eaten_at.isoformat(), "i": pk}
+        if reverse:
+            data["r"] = 1
+        raw = json.dumps(data, separators=(",", ":")).encode()
+        encoded = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
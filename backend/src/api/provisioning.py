@@ -0,0 +1,141 @@
+"""
+ユーザーの一括作成（法人契約などで数千人分をまとめて登録する用）。
+
+User と Profile をそれぞれ bulk_create で入れる。1人ずつ create_user すると
+User の INSERT + create_profile シグナルの Profile の INSERT で 2N 回かかるが、
+こちらは batch_size 人ごとに 2 回で済む（bulk_create はシグナルを飛ばさない）。
+
+- 入力は {username, email, password, daily_calorie_goal} の dict（username 以外は省略可）
+- 不正な行・既存ユーザー名・入力内の重複はスキップして行番号つきで報告する
+- 既存チェックのあとに同じユーザー名が作られたら、そのバッチの既存ユーザーを取り直して残りを入れ直す
+- password がない行はパスワードログイン不可（set_unusable_password）で作る。
+  password があるとその行だけで make_password（PBKDF2、1件あたり数百 ms ほど）がかかり、
+  数千人分だと DB への書き込みよりずっと遅い。一括作成はパスワードなしで流して、
+  各自にパスワードリセットで設定してもらう前提
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .imports import ImportResult
+from .models import Profile
+
+User = get_user_model()
+
+_USERNAME_FIELD = User._meta.get_field(User.USERNAME_FIELD)
+_GOAL_FIELD = Profile._meta.get_field("daily_calorie_goal")
+
+
+def _clean(record: dict):
+    """(User, 目標カロリー, None) か、(None, None, エラーの dict) を返す"""
+    if not isinstance(record, dict):
+        return None, None, {"non_field_errors": ["invalid record"]}
+
+    errors = {}
+    username = str(record.get("username") or "").strip()
+    try:
+        _USERNAME_FIELD.clean(username, None)
+    except ValidationError as e:
+        errors["username"] = e.messages
+
+    email = str(record.get("email") or "").strip()
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError as e:
+            errors["email"] = e.messages
+
+    goal = record.get("daily_calorie_goal")
+    if goal in (None, ""):
+        goal = _GOAL_FIELD.get_default()
+    else:
+        try:
+            goal = _GOAL_FIELD.clean(goal, None)
+        except ValidationError as e:
+            errors["daily_calorie_goal"] = e.messages
+
+    if errors:
+        return None, None, errors
+
+    user = User(username=username, email=email)
+    password = record.get("password")
+    user.password = make_password(password or None)  # None ならログイン不可のパスワード
+    return user, goal, None
+
+
+def _existing(names) -> set:
+    return set(User.objects.filter(username__in=names).values_list("username", flat=True))
+
+
+def _flush(batch, result: ImportResult) -> None:
+    """batch: [(行番号, User, 目標カロリー)]"""
+    while batch:
+        existing = _existing([user.username for _, user, _ in batch])
+        rows = []
+        for line, user, goal in batch:
+            if user.username in existing:
+                result.add_error(line, {"username": ["A user with that username already exists."]})
+            else:
+                rows.append((line, user, goal))
+        if not rows:
+            return
+
+        try:
+            with transaction.atomic():
+                # PostgreSQL なら bulk_create が RETURNING で pk を埋めるので、
+                # そのまま Profile に使える
+                users = User.objects.bulk_create([user for _, user, _ in rows])
+                Profile.objects.bulk_create(
+                    [
+                        Profile(user=user, daily_calorie_goal=goal)
+                        for user, (_, _, goal) in zip(users, rows)
+                    ]
+                )
+        except IntegrityError:
+            # 既存チェックと INSERT の間に、別のリクエストが同じユーザー名を作った。
+            # バッチごと捨てずに、既存ユーザーを取り直して残りだけ入れ直す
+            if not _existing([user.username for _, user, _ in rows]):
+                raise
+            batch = rows
+            continue
+        result.imported += len(rows)
+        return
+
+
+def provision_users(records, *, batch_size: int = 1000, progress=None) -> ImportResult:
+    """
+    records: (行番号, dict) のイテラブル（imports.iter_records と同じ形）。
+    作った人数は result.imported に入る（as_dict() では "created"）。
+    batch_size 人ごとに書き込むので、途中で失敗してもそれまでのバッチは残る。
+    password つきの行は1件ずつハッシュ化するので遅い（モジュールの docstring を参照）。
+    """
+    result = ImportResult(label="created")
+    batch = []
+    seen = set()
+    count = 0
+
+    for line, record in records:
+        count += 1
+        user, goal, errors = _clean(record)
+        if errors:
+            result.add_error(line, errors)
+        elif user.username in seen:
+            result.add_error(line, {"username": ["Duplicate username in the input."]})
+        else:
+            seen.add(user.username)
+            batch.append((line, user, goal))
+
+        if len(batch) >= batch_size:
+            _flush(batch, result)
+            batch = []
+            if progress:
+                progress(count, result)
+
+    if batch:
+        _flush(batch, result)
+    if progress:
+        progress(count, result)
+    return result
@@ -0,0 +1,40 @@
+"""
+orjson を使う JSON レンダラー（REST_FRAMEWORK の DEFAULT_RENDERER_CLASSES で使う）。
+
+orjson は任意の依存。入っていなければ DRF の JSONRenderer（標準の json）と同じ動きになる。
+出力は JSONRenderer に合わせてある:
+
+- datetime / date / time / Decimal / 遅延評価の文字列などは DRF の JSONEncoder に任せる
+  （datetime のミリ秒への切り詰めや +00:00 -> Z もそのまま）
+- 数値のキーは文字列にする、\\u2028 / \\u2029 はエスケープする
+- indent を求められたとき（?format=json; indent=4 やブラウザブル API）は JSONRenderer で書く
+"""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson なしの環境
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -0,0 +1,109 @@
+"""
+食事データの版数（MealRevision）と ETag。
+
+Meal を書き込むたびにそのユーザーの版数を +1 しておき、一覧・集計 API は
+「パス + クエリ + 版数 + 今日の日付」から ETag を作る。If-None-Match が一致すれば
+django.views.decorators.http.condition が本体のクエリ・シリアライズの前に 304 を返す。
+
+- Meal の save / delete: 下のシグナル
+- bulk_create / 一括 UPDATE / 一括 DELETE / インポート（シグナルが飛ばない）: 各所から bump() を呼ぶ
+"""
+
+import hashlib
+from functools import wraps
+
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .models import Meal, MealRevision
+from .rollups import deleting_owner
+
+
+def bump(user_ids) -> None:
+    """user_ids（None は未ログイン分）の版数を +1 する（ダッシュボードのキャッシュキーにも入る）"""
+    ids = list({user_id for user_id in user_ids})
+    if not ids:
+        return
+    table = MealRevision._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS t (user_id, revision)
+            SELECT u, 1 FROM unnest(%s::bigint[]) AS u
+            ON CONFLICT ON CONSTRAINT meal_revision_user_uniq
+            DO UPDATE SET revision = t.revision + 1
+            """,
+            [ids],
+        )
+
+
+def revision_for(request) -> str:
+    """meals_for(request) が返す範囲の版数（主キー1本の SELECT）"""
+    return revision_for_user(request.user if request.user.is_authenticated else None)
+
+
+def revision_for_user(user) -> str:
+    """user の食事の版数。None（未ログイン）なら全員分"""
+    table = MealRevision._meta.db_table
+    with connection.cursor() as cursor:
+        if user is not None:
+            cursor.execute(f"SELECT revision FROM {table} WHERE user_id = %s", [user.pk])
+            row = cursor.fetchone()
+            return f"u{user.pk}:{row[0] if row else 0}"
+        # 未ログインは全ユーザーの食事が見えるので、全員分の (user_id, 版数) のハッシュを使う。
+        # 合計と行数だと「ユーザーを消して別のユーザーが同じ回数書く」で同じ値に戻ってしまう。
+        # user_id は使い回されず、版数はユーザーごとに増える一方なので、中身が違えば文字列も違う
+        cursor.execute(
+            f"""
+            SELECT md5(coalesce(string_agg(
+                coalesce(user_id::text, '-') || ':' || revision, ',' ORDER BY user_id NULLS FIRST
+            ), ''))
+            FROM {table}
+            """
+        )
+        return f"all:{cursor.fetchone()[0]}"
+
+
+def meals_etag(request, *args, **kwargs) -> str:
+    """condition(etag_func=...) 用。日付が変わると「今日」「直近7日」も変わるので日付も入れる"""
+    key = "|".join(
+        [request.get_full_path(), revision_for(request), timezone.localdate().isoformat()]
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def conditional_get(method):
+    """
+    APIView の get に付ける。If-None-Match が ETag と一致すれば本体を実行せずに 304。
+    ブラウザが毎回 If-None-Match 付きで確認しに来るよう no-cache にする（ユーザー別なので private）
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        @condition(etag_func=meals_etag)
+        def view(request, *args, **kwargs):
+            return method(self, request, *args, **kwargs)
+
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    return wrapper
+
+
+@receiver(post_save, sender=Meal)
+def bump_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump([instance.user_id])
+
+
+@receiver(post_delete, sender=Meal)
+def bump_on_delete(sender, instance, origin=None, **kwargs):
+    if deleting_owner(origin):
+        return
+    bump([instance.user_id])
@@ -0,0 +1,178 @@
+"""
+DailyCalorieTotal（ユーザー × 日付のカロリー集計）の維持。
+
+- Meal の保存・削除はシグナルで差分（±calorie, ±1件）を反映する
+- bulk_create のようにシグナルが飛ばない書き込みは apply_meals() でまとめて反映し、
+  差分が分からないとき（QuerySet.update など）は refresh_days() で該当日だけ再集計する
+- 全体の作り直しは rebuild()（manage.py rebuild_daily_totals）
+"""
+
+from django.db import connection, transaction
+from django.db.models import Count, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .dates import local_day_bounds
+from .models import DailyCalorieTotal, Meal
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def apply_deltas(deltas) -> None:
+    """
+    {(user_id, day): (calorie, count)} を INSERT ... ON CONFLICT DO UPDATE でまとめて加算する。
+    行がなければ作り、あれば足し込む。同時更新でも行ロックで直列化されるので取りこぼさない。
+    """
+    rows = [
+        (user_id, day, total, count)
+        for (user_id, day), (total, count) in deltas.items()
+        if total or count
+    ]
+    if not rows:
+        return
+
+    table = DailyCalorieTotal._meta.db_table
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            values = ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS t (user_id, date, total_calorie, meal_count)
+                VALUES {values}
+                ON CONFLICT ON CONSTRAINT daily_calorie_total_user_date_uniq
+                DO UPDATE SET
+                    total_calorie = t.total_calorie + EXCLUDED.total_calorie,
+                    meal_count = t.meal_count + EXCLUDED.meal_count
+                """,
+                [value for row in batch for value in row],
+            )
+
+
+def apply_delta(user_id, day, calorie: int, count: int) -> None:
+    """(user_id, day) の行に calorie / count を加算する（行がなければ作る）"""
+    apply_deltas({(user_id, day): (calorie, count)})
+
+
+def _add(deltas, user_id, day, calorie: int, count: int) -> None:
+    total, n = deltas.get((user_id, day), (0, 0))
+    deltas[(user_id, day)] = (total + calorie, n + count)
+
+
+def apply_meals(meals, sign: int = 1) -> None:
+    """
+    bulk_create / 一括削除のようにシグナルが飛ばない書き込みをまとめて反映する。
+    (user_id, 日付) ごとに差分を合算して、1000日分ずつ1本の UPSERT で書く。
+    """
+    deltas = {}
+    for meal in meals:
+        user_id, day, calorie = meal.rollup_key()
+        _add(deltas, user_id, day, sign * calorie, sign)
+        if sign > 0:
+            meal._rollup_origin = (user_id, day, calorie)
+    apply_deltas(deltas)
+
+
+def apply_updates(meals) -> None:
+    """bulk_update した食事について、読み込み時の値との差分をまとめて反映する"""
+    deltas = {}
+    stale = []
+    for meal in meals:
+        old = getattr(meal, "_rollup_origin", None)
+        new = meal.rollup_key()
+        if old == new:
+            continue
+        if old is None:
+            stale.append(new[:2])
+        else:
+            _add(deltas, old[0], old[1], -old[2], -1)
+            _add(deltas, new[0], new[1], new[2], 1)
+        meal._rollup_origin = new
+    apply_deltas(deltas)
+    if stale:
+        refresh_days(stale)
+
+
+def refresh_days(keys) -> None:
+    """(user_id, date) の組ごとに Meal から集計し直す"""
+    for user_id, day in set(keys):
+        start, end = local_day_bounds(day)
+        agg = Meal.objects.filter(
+            user_id=user_id, eaten_at__gte=start, eaten_at__lt=end
+        ).aggregate(total=Sum("calorie"), count=Count("id"))
+        DailyCalorieTotal.objects.update_or_create(
+            user_id=user_id,
+            date=day,
+            defaults={"total_calorie": agg["total"] or 0, "meal_count": agg["count"]},
+        )
+
+
+@transaction.atomic
+def rebuild(batch_size: int = 5000) -> int:
+    """集計テーブルを Meal から丸ごと作り直す。作成した行数を返す"""
+    DailyCalorieTotal.objects.all().delete()
+
+    rows = (
+        Meal.objects.order_by()
+        .annotate(day=TruncDate("eaten_at", tzinfo=timezone.get_current_timezone()))
+        .values("user_id", "day")
+        .annotate(total=Sum("calorie"), count=Count("id"))
+        .values_list("user_id", "day", "total", "count")
+    )
+
+    created = 0
+    batch = []
+    for user_id, day, total, count in rows.iterator(chunk_size=batch_size):
+        batch.append(
+            DailyCalorieTotal(user_id=user_id, date=day, total_calorie=total, meal_count=count)
+        )
+        if len(batch) >= batch_size:
+            DailyCalorieTotal.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        DailyCalorieTotal.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+@receiver(post_save, sender=Meal)
+def update_daily_total_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    old = None if created else getattr(instance, "_rollup_origin", None)
+    new = instance.rollup_key()
+    if old == new:
+        return
+
+    if old is None and not created:
+        # 読み込み時の値が分からない（手で組み立てた instance の save など）
+        refresh_days([new[:2]])
+    else:
+        if old is not None:
+            apply_delta(old[0], old[1], -old[2], -1)
+        apply_delta(new[0], new[1], new[2], 1)
+    instance._rollup_origin = new
+
+
+def deleting_owner(origin) -> bool:
+    """
+    post_delete の origin がユーザー（インスタンスか QuerySet）なら True。
+    ユーザーごと消すときは集計・版数の行もカスケードで消えるので、シグナルで書き戻してはいけない
+    （消えたユーザーの行を作り直して外部キー違反になる）。
+    """
+    owner = Meal._meta.get_field("user").related_model
+    if isinstance(origin, QuerySet):
+        return origin.model is owner
+    return isinstance(origin, owner)
+
+
+@receiver(post_delete, sender=Meal)
+def update_daily_total_on_delete(sender, instance, origin=None, **kwargs):
+    if deleting_owner(origin):
+        return
+    user_id, day, calorie = getattr(instance, "_rollup_origin", None) or instance.rollup_key()
+    apply_delta(user_id, day, -calorie, -1)
@@ -1,11 +1,78 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Meal, Profile
+from .models import ImageUpload, Job, Meal, Profile
+from . import metrics, revisions, rollups
+from .bulk import bulk_update_values
+from .images import image_urls, media_url, media_url_prefix
 
 
-class MealSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """.data を作る時間を計測する（api/metrics.py の serializer_duration_seconds）"""
+
+    @property
+    def data(self):
+        with metrics.timed("serializer", metrics.SERIALIZER_DURATION, type(self).__name__):
+            return super().data
+
+
+class MealListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    MealSerializer(many=True) 用。
+    1件ずつ INSERT / UPDATE せず、bulk_create / UPDATE ... FROM (VALUES ...) でまとめて書く。
+    bulk 系はシグナルが飛ばないので、日次集計もここでまとめて反映する。
+
+    更新時の instance は data と同じ順番に並べた Meal のリストを渡すこと。
+    """
+
+    batch_size = 1000
+
+    def run_child_validation(self, data):
+        # 部分更新の検証で、その行の既存 Meal を child に見せる
+        instances = getattr(self, "_instance_map", None)
+        if instances is not None and isinstance(data, dict):
+            self.child.instance = instances.get(data.get("id"))
+        return super().run_child_validation(data)
+
+    def to_internal_value(self, data):
+        if self.instance is not None:
+            self._instance_map = {meal.pk: meal for meal in self.instance}
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.instance = None
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            meals = Meal.objects.bulk_create(
+                [Meal(**attrs) for attrs in validated_data],
+                batch_size=self.batch_size,
+            )
+            rollups.apply_meals(meals)
+            revisions.bump(meal.user_id for meal in meals)
+        return meals
+
+    def update(self, instance, validated_data):
+        fields = set()
+        for meal, attrs in zip(instance, validated_data):
+            for attr, value in attrs.items():
+                setattr(meal, attr, value)
+                fields.add(attr)
+
+        if fields:
+            with transaction.atomic():
+                bulk_update_values(instance, fields, batch_size=self.batch_size)
+                rollups.apply_updates(instance)
+                revisions.bump(meal.user_id for meal in instance)
+        return instance
+
+
+class MealSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # フロントの eatenAt <-> モデルの eaten_at を対応させる
     eatenAt = serializers.DateTimeField(source="eaten_at")
     image_url = serializers.SerializerMethodField()
+    # 一覧では thumb、詳細では medium を使う（original は元サイズ）
+    image_urls = serializers.SerializerMethodField()
 
     class Meta:
         model = Meal
@@ -17,8 +84,10 @@ class MealSerializer(serializers.ModelSerializer):
             "tag",
             "created_at",
             "image_url",
+            "image_urls",
         ]
         read_only_fields = ["id", "created_at"]
+        list_serializer_class = MealListSerializer
 
     def get_image_url(self, obj):
         request = self.context.get("request")
@@ -27,8 +96,95 @@ class MealSerializer(serializers.ModelSerializer):
         url = obj.image.url
         return request.build_absolute_uri(url) if request else url
 
+    def get_image_urls(self, obj):
+        return image_urls(obj, self.context.get("request"))
+
+
+# meal_list_data() が読む列
+MEAL_LIST_VALUES = (
+    "id",
+    "name",
+    "eaten_at",
+    "calorie",
+    "tag",
+    "created_at",
+    "image",
+    "image_medium",
+    "image_thumb",
+)
+
+
+def meal_rows(queryset):
+    """一覧用に必要な列だけを dict で取る QuerySet"""
+    return queryset.values(*MEAL_LIST_VALUES)
 
-class CalorieGoalSerializer(serializers.ModelSerializer):
+
+def meal_list_data(rows, request=None) -> list[dict]:
+    """
+    MealSerializer(many=True).data と同じ形のリストを meal_rows() の dict から作る
+    （読み取り専用の一覧用）。行ごとにモデルインスタンスやフィールドを通さず、
+    画像 URL のホスト部分もリクエストにつき1回だけ作る。
+    """
+    with metrics.timed("serializer", metrics.SERIALIZER_DURATION, "meal_list_data"):
+        tz = timezone.get_current_timezone()
+        prefix = media_url_prefix(request)
+
+        def iso(value):
+            # DRF の DateTimeField と同じ表記（現在のタイムゾーン、UTC なら Z）
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+        data = []
+        for row in rows:
+            image = row["image"]
+            urls = None
+            if image:
+                original = media_url(prefix, image)
+                thumb, medium = row["image_thumb"], row["image_medium"]
+                urls = {
+                    "thumb": media_url(prefix, thumb) if thumb else original,
+                    "medium": media_url(prefix, medium) if medium else original,
+                    "original": original,
+                }
+            data.append(
+                {
+                    "id": row["id"],
+                    "name": row["name"],
+                    "eatenAt": iso(row["eaten_at"]),
+                    "calorie": row["calorie"],
+                    "tag": row["tag"],
+                    "created_at": iso(row["created_at"]),
+                    "image_url": urls["original"] if urls else None,
+                    "image_urls": urls,
+                }
+            )
+        return data
+
+
+class CalorieGoalSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ["daily_calorie_goal"]
+
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "attempts",
+            "result",
+            "error",
+            "created_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class ImageUploadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ImageUpload
+        fields = ["id", "meal", "filename", "size", "offset", "sha256", "created_at"]
+        read_only_fields = fields
@@ -0,0 +1,107 @@
+"""
+メディア（食事画像）の配信。
+
+- ハッシュ名のファイル（api/storage.py）は中身が変わらないので
+  Cache-Control: max-age=31536000, immutable を付け、ETag はハッシュそのものにする
+- ETag / Last-Modified を付け、If-None-Match / If-Modified-Since には 304 を返す
+  （ハッシュ名なら 304 の判定にファイルシステムを見ない）
+- MEDIA_ACCEL_REDIRECT="nginx" なら X-Accel-Redirect、"sendfile" なら X-Sendfile を返して
+  ファイル本体の送信はフロントのサーバーに任せる
+- それ以外は FileResponse で返す。WSGI サーバーが wsgi.file_wrapper を持っていれば
+  （gunicorn など）sendfile でカーネルから直接送られる
+
+nginx の例（MEDIA_ACCEL_PREFIX="/protected-media/" のとき）:
+
+    location /protected-media/ {
+        internal;
+        alias /app/media/;
+    }
+"""
+
+import mimetypes
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import is_hashed_name
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# MEDIA_ROOT の中でも配信しないもの（ジョブに渡すアップロード途中のファイルなど）
+PRIVATE_PREFIXES = ("jobs/",)
+
+
+def _cache_headers(path: str, stat=None) -> tuple[str, str]:
+    """(ETag, Cache-Control)"""
+    if is_hashed_name(path):
+        digest = os.path.splitext(os.path.basename(path))[0]
+        return f'"{digest}"', IMMUTABLE_CACHE_CONTROL
+    return (
+        f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+        f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}",
+    )
+
+
+def _not_modified(request, etag, cache_control, last_modified=None):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        response["ETag"] = etag
+        response["Cache-Control"] = cache_control
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404 from None
+    # ./ や meals/../ で PRIVATE_PREFIXES をすり抜けられないよう、正規化したパスで判定する
+    path = full_path.relative_to(os.path.abspath(settings.MEDIA_ROOT)).as_posix()
+    if path.startswith(PRIVATE_PREFIXES):
+        raise Http404
+
+    hashed = is_hashed_name(path)
+    if hashed:
+        etag, cache_control = _cache_headers(path)
+        response = _not_modified(request, etag, cache_control)
+        if response is not None:
+            return response
+
+    try:
+        stat = full_path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404 from None
+    if not full_path.is_file():
+        raise Http404
+
+    if not hashed:
+        etag, cache_control = _cache_headers(path, stat)
+        response = _not_modified(request, etag, cache_control, int(stat.st_mtime))
+        if response is not None:
+            return response
+
+    content_type = mimetypes.guess_type(full_path.name)[0] or "application/octet-stream"
+    mode = settings.MEDIA_ACCEL_REDIRECT
+    if mode == "nginx":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + quote(path)
+    elif mode == "sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = str(full_path)
+    else:
+        response = FileResponse(full_path.open("rb"), content_type=content_type)
+        response["Content-Length"] = stat.st_size
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = cache_control
+    return response
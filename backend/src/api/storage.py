@@ -0,0 +1,72 @@
+"""
+食事画像用のコンテンツアドレス型ストレージ。
+
+ファイル名を中身の SHA-256 にして `meals/ab/cd/abcd....jpg` のように2階層に振り分ける。
+同じ画像が何度アップロードされても、ディスク上のファイルは1つだけになる
+（既にあれば書き込まずにその名前を返す）。
+同じファイルを複数の Meal が指すので、消してよいかどうかは api/media.py の参照カウントで決める。
+"""
+
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_READ_SIZE = 64 * 1024
+
+
+def content_hash(content) -> str:
+    digest = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks(HASH_READ_SIZE):
+        digest.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name: str) -> bool:
+    """content_addressed_name() で付けた名前か（dedupe_media で未移行のファイルを見分ける）"""
+    parts = name.split("/")
+    stem = os.path.splitext(parts[-1])[0]
+    return (
+        len(parts) >= 3
+        and len(stem) == 64
+        and parts[-3] == stem[:2]
+        and parts[-2] == stem[2:4]
+    )
+
+
+def content_addressed_name(name: str, digest: str) -> str:
+    directory, filename = os.path.split(name)
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join(directory, digest[:2], digest[2:4], digest + ext)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content) -> str:
+        """save(name, content) で保存される名前（保存前に media.lock() を取るのに使う）"""
+        return content_addressed_name(name, content_hash(content))
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+
+        # 一時名で書き切ってから link する。同じ画像を同時に保存しても、
+        # 書きかけのファイルが見えたり、片方が _abc123 付きの別名になったりしない
+        tmp_name = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        try:
+            os.link(self.path(tmp_name), self.path(name))
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(self.path(tmp_name))
+        return name
+
+
+meal_image_storage = ContentAddressedStorage()
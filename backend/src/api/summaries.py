@@ -0,0 +1,92 @@
+"""
+期間サマリ（日 / 週 / 月ごとのカロリー合計）の集計。
+
+バケット分けは Trunc* で DB 側に任せ、空のバケットは generate_series と
+LEFT JOIN で埋める。日数ぶん Python でループしないので、1年分でもクエリ2本で済む。
+"""
+
+from datetime import date, timedelta
+
+from django.db import connection
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .dates import local_range_bounds
+
+BUCKETS = {
+    "day": (TruncDay, "1 day"),
+    "week": (TruncWeek, "1 week"),
+    "month": (TruncMonth, "1 month"),
+}
+
+
+def bucket_start(d: date, bucket: str) -> date:
+    """d を含むバケットの開始日（週は月曜始まり、DATE_TRUNC と同じ）"""
+    if bucket == "week":
+        return d - timedelta(days=d.weekday())
+    if bucket == "month":
+        return d.replace(day=1)
+    return d
+
+
+def calorie_series(totals_qs, start: date, end: date, bucket: str = "day"):
+    """
+    DailyCalorieTotal の QuerySet を start〜end（両端含む）でバケット集計し、
+    0 埋め済みの [{date, totalCalorie, mealCount}] を返す。
+    """
+    trunc, step = BUCKETS[bucket]
+    per_bucket = (
+        totals_qs.filter(date__range=(start, end))
+        .annotate(bucket=trunc("date", output_field=DateField()))
+        .values("bucket")
+        .annotate(total=Sum("total_calorie"), count=Sum("meal_count"))
+        .values("bucket", "total", "count")
+        .order_by()
+    )
+    inner_sql, inner_params = per_bucket.query.sql_with_params()
+
+    sql = f"""
+        SELECT series.bucket, COALESCE(t.total, 0), COALESCE(t.count, 0)
+        FROM (
+            SELECT generate_series(%s::date, %s::date, %s::interval)::date AS bucket
+        ) AS series
+        LEFT JOIN ({inner_sql}) AS t ON t.bucket = series.bucket
+        ORDER BY series.bucket
+    """
+    params = (bucket_start(start, bucket), end, step, *inner_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    return [
+        {"date": d.isoformat(), "totalCalorie": total, "mealCount": count}
+        for d, total, count in rows
+    ]
+
+
+def tag_breakdown(meals_qs, start: date, end: date, bucket: str = "day"):
+    """Meal の QuerySet をバケット × タグで集計し {バケット開始日: [{tag, ...}]} で返す"""
+    trunc, _ = BUCKETS[bucket]
+    range_start, range_end = local_range_bounds(start, end)
+    rows = (
+        meals_qs.filter(eaten_at__gte=range_start, eaten_at__lt=range_end)
+        .annotate(
+            bucket=trunc(
+                "eaten_at",
+                output_field=DateField(),
+                tzinfo=timezone.get_current_timezone(),
+            )
+        )
+        .values("bucket", "tag")
+        .annotate(total=Sum("calorie"), count=Count("id"))
+        .order_by("bucket", "-total", "tag")
+    )
+
+    tags = {}
+    for row in rows:
+        tags.setdefault(row["bucket"].isoformat(), []).append(
+            {"tag": row["tag"], "totalCalorie": row["total"], "mealCount": row["count"]}
+        )
+    return tags
@@ -0,0 +1,54 @@
+"""
+ジョブキュー（api/jobs.py）で実行する処理。
+
+- meal.image: アップロード済みの元ファイルから縮小版を作って Meal に保存する
+- ai.parse_meal: 1食分のテキストを OpenAI で解析する（結果はジョブの result に入る）
+"""
+
+import os
+
+from django.core.files.storage import default_storage
+
+from .ai import MEAL_PROMPT_VERSION, fetch_meal_parse
+from .ai_cache import get_meal_parse_cache
+from .images import InvalidImageError, image_urls, save_images
+from .jobs import PermanentJobError, handler
+from .models import Meal
+
+
+def delete_uploaded_file(job):
+    # 再実行を使い切った・不正な画像だったなど、failed で終わったら元ファイルは要らない
+    default_storage.delete(job.payload["path"])
+
+
+@handler("meal.image", on_failure=delete_uploaded_file)
+def process_meal_image(job):
+    path = job.payload["path"]
+    meal = Meal.objects.filter(pk=job.payload["meal_id"]).first()
+    if meal is None:
+        raise PermanentJobError("meal not found")
+
+    try:
+        with default_storage.open(path, "rb") as f:
+            save_images(meal, f)
+    except InvalidImageError as e:
+        raise PermanentJobError("invalid image") from e
+    except FileNotFoundError as e:
+        raise PermanentJobError("uploaded file is gone") from e
+
+    default_storage.delete(path)
+    return {"meal_id": meal.pk, "image_urls": image_urls(meal)}
+
+
+@handler("ai.parse_meal")
+def parse_meal(job):
+    text = job.payload["text"]
+    model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
+
+    # 待っている間に同じ文が解析済みになっていればそれを使う
+    cached = get_meal_parse_cache().get(text, model, MEAL_PROMPT_VERSION)
+    if cached is not None:
+        return cached
+
+    # OpenAI のエラーや出力の崩れ（AiOutputError）はたまに起きるので、そのまま投げて再実行させる
+    return fetch_meal_parse(text, model)
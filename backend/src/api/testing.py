@@ -0,0 +1,41 @@
+"""
+テスト用のクエリ数チェック。
+
+    with query_budget(3):
+        client.get("/api/meals/")
+
+    @query_budget(3)
+    def test_something(self): ...
+
+ブロック内のクエリが max_queries を超えたら、実行された SQL を並べて AssertionError にする。
+with の戻り値は CaptureQueriesContext なので、len(ctx) で実際の数も取れる。
+"""
+
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class query_budget(ContextDecorator):
+    def __init__(self, max_queries: int, using: str = DEFAULT_DB_ALIAS):
+        self.max_queries = max_queries
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        return self.context.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        executed = len(self.context)
+        if executed > self.max_queries:
+            queries = "\n".join(
+                f"{i}. {query['sql']}" for i, query in enumerate(self.context.captured_queries, 1)
+            )
+            raise AssertionError(
+                f"{executed} queries executed, budget is {self.max_queries}:\n{queries}"
+            )
+        return False
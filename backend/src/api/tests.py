@@ -1 +1,2740 @@
-# Create your tests here.
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+import weakref
+from contextlib import nullcontext
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+# `manage.py test`（ラベルなし）は backend/ から探すので src.api.tests として読まれる。
+# 相対 import だとモデルが二重に読み込まれるので api から import する
+from api import (
+    ai,
+    ai_async,
+    dashboard,
+    exports,
+    images,
+    jobs,
+    metrics,
+    provisioning,
+    revisions,
+    rollups,
+    summaries,
+    uploads,
+)
+from api.ai import MEAL_PROMPT_VERSION
+from api.ai_cache import (
+    MealParseCache,
+    TTLLRUCache,
+    get_meal_parse_cache,
+    normalize_text,
+    shared_instance,
+)
+from api.auth_cache import AuthCache, get_auth_cache
+from api.imports import import_meals
+from api.models import DailyCalorieTotal, ImageUpload, Job, Meal, MediaFile, Profile
+from api.renderers import FastJSONRenderer
+from api.serializers import MealSerializer, meal_list_data, meal_rows
+from api.storage import meal_image_storage
+from api.testing import query_budget
+from benchmarks import fake_openai
+
+User = get_user_model()
+
+# 件数を変えても同じクエリ数で済むことを確かめる
+SIZES = (1, 100, 10_000)
+
+AI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
+
+
+def png_bytes() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 80, 40)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def seed_meals(user, count: int) -> None:
+    """直近60日に散らした count 件（先頭の数件は今日）。集計テーブルもまとめて作る"""
+    now = timezone.now()
+    Meal.objects.bulk_create(
+        [
+            Meal(
+                user=user,
+                name=f"食事 {i}",
+                eaten_at=now - timedelta(minutes=(i * 97) % (60 * 24 * 60)),
+                calorie=100 + i % 900,
+                tag="自炊",
+            )
+            for i in range(count)
+        ],
+        batch_size=5000,
+    )
+
+
+class QueryBudgetTests(TestCase):
+    """
+    api/urls.py の全ルートのクエリ数。
+    1 / 100 / 10,000 件の食事を持つユーザーで同じリクエストを送り、
+    どの件数でもクエリ数が同じ（= N+1 がない）で、かつ予算以内であることを確かめる。
+    認証は JWT（キャッシュを消して毎回ユーザーの SELECT が走る状態）で数える。
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            UPLOAD_TEMP_DIR=f"{cls.media_root}/uploads",
+            METRICS_SERVER_TIMING=False,
+        )
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        cls.tokens = {}
+        cls.meal_ids = {}
+        cls.job_ids = {}
+        for size in SIZES:
+            # 管理者用の API も同じように測れるよう is_staff にしておく
+            user = User.objects.create_user(f"budget-{size}", is_staff=True)
+            seed_meals(user, size)
+            cls.users[size] = user
+            cls.tokens[size] = str(AccessToken.for_user(user))
+            cls.meal_ids[size] = Meal.objects.filter(user=user).values_list("id", flat=True).first()
+            cls.job_ids[size] = Job.objects.create(user=user, kind="meal.image").pk
+        rollups.rebuild()
+
+    def setUp(self):
+        dashboard.get_cache().clear()
+        get_meal_parse_cache().clear()
+
+    def call(self, size, method, url, auth_cache_hit=False, **kwargs):
+        # 認証キャッシュのヒット / ミスで数が揺れないよう、ふだんは毎回ミスの状態にする。
+        # auth_cache_hit=True なら先に同じトークンで認証しておき、ヒットの状態で測る
+        get_auth_cache().clear()
+        if auth_cache_hit:
+            get_auth_cache().set_user(
+                self.tokens[size], self.users[size], AccessToken(self.tokens[size])
+            )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens[size]}")
+        kwargs.setdefault("format", "json")
+        response = getattr(client, method)(url, **kwargs)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def assertQueries(self, budget, method, url, expected_status=200, prepare=None, **kwargs):
+        """
+        各 SIZE で1回ずつリクエストしてクエリ数を比べる。
+        url / kwargs の値が関数なら size を渡して呼ぶ。prepare(size) は計測前の準備
+        """
+        counts = {}
+        for size in SIZES:
+            if prepare is not None:
+                prepare(size)
+            resolved = {k: v(size) if callable(v) else v for k, v in kwargs.items()}
+            target = url(size) if callable(url) else url
+            with query_budget(budget) as ctx:
+                response = self.call(size, method, target, **resolved)
+            self.assertEqual(response.status_code, expected_status, getattr(response, "data", None))
+            counts[size] = len(ctx)
+        self.assertEqual(len(set(counts.values())), 1, f"{method.upper()} {url}: {counts}")
+
+    # --- 食事 ---
+
+    def test_meal_list(self):
+        self.assertQueries(2, "get", "/api/meals/")
+
+    def test_meal_list_auth_cache_hit(self):
+        # 認証がキャッシュから返れば api_user の SELECT がなくなる
+        self.assertQueries(1, "get", "/api/meals/", auth_cache_hit=True)
+
+    def test_meal_list_next_page(self):
+        def url(size):
+            first = self.call(size, "get", "/api/meals/", data={"page_size": 1})
+            return first.data["next"] or "/api/meals/?page_size=1"
+
+        self.assertQueries(2, "get", url)
+
+    def test_meal_create(self):
+        body = {
+            "name": "ラーメン", "eatenAt": timezone.now().isoformat(), "calorie": 700, "tag": "外食"
+        }
+        # 4 + atomic() の SAVEPOINT / RELEASE（テストは外側のトランザクションの中で動く）
+        self.assertQueries(6, "post", "/api/meals/", expected_status=201, data=body)
+
+    def test_meal_bulk_create(self):
+        body = [
+            {
+                "name": f"まとめて {i}",
+                "eatenAt": timezone.now().isoformat(),
+                "calorie": 300,
+                "tag": "自炊",
+            }
+            for i in range(20)
+        ]
+        self.assertQueries(6, "post", "/api/meals/bulk/", expected_status=201, data=body)
+
+    def test_meal_bulk_update(self):
+        def body(size):
+            ids = Meal.objects.filter(user=self.users[size]).values_list("id", flat=True)[:20]
+            return [{"id": pk, "calorie": 500} for pk in ids]
+
+        self.assertQueries(9, "patch", "/api/meals/bulk/", data=body)
+
+    def test_meal_bulk_delete(self):
+        def body(size):
+            ids = Meal.objects.filter(user=self.users[size]).values_list("id", flat=True)[:20]
+            return {"ids": list(ids)}
+
+        # 途中の分割アップロード（ImageUpload）を先に消すための SELECT を含む
+        self.assertQueries(8, "delete", "/api/meals/bulk/", data=body)
+
+    def test_meal_today(self):
+        self.assertQueries(3, "get", "/api/meals/today/")
+
+    def test_meal_today_not_modified(self):
+        def headers(size):
+            etag = self.call(size, "get", "/api/meals/today/")["ETag"]
+            return {"If-None-Match": etag}
+
+        self.assertQueries(2, "get", "/api/meals/today/", expected_status=304, headers=headers)
+
+    def test_meal_by_date(self):
+        day = (timezone.localdate() - timedelta(days=3)).isoformat()
+        self.assertQueries(3, "get", "/api/meals/by-date/", data={"date": day})
+
+    def test_weekly_summary(self):
+        self.assertQueries(3, "get", "/api/meals/weekly-summary/")
+
+    def test_summary(self):
+        start = (timezone.localdate() - timedelta(days=90)).isoformat()
+        end = timezone.localdate().isoformat()
+        self.assertQueries(
+            4, "get", "/api/meals/summary/", data={"from": start, "to": end, "bucket": "week"}
+        )
+
+    def test_export(self):
+        # 件数に比例するのはサーバー側カーソルからの FETCH だけで、クエリとしては増えない
+        self.assertQueries(2, "get", "/api/meals/export/", data={"format": "ndjson"})
+
+    def test_import(self):
+        def data(size):
+            now = timezone.now().isoformat()
+            csv = "name,eatenAt,calorie,tag\n" + "".join(
+                f"インポート {i},{now},400,自炊\n" for i in range(20)
+            )
+            return {"file": SimpleUploadedFile("meals.csv", csv.encode(), "text/csv")}
+
+        self.assertQueries(
+            5, "post", "/api/meals/import/", expected_status=201, data=data, format="multipart"
+        )
+
+    def test_meal_detail(self):
+        self.assertQueries(2, "get", lambda size: f"/api/meals/{self.meal_ids[size]}/")
+
+    def test_meal_update(self):
+        # SELECT ... FOR UPDATE + SAVEPOINT / RELEASE 込み
+        self.assertQueries(
+            8,
+            "patch",
+            lambda size: f"/api/meals/{self.meal_ids[size]}/",
+            data={"calorie": 999},
+        )
+
+    def test_meal_delete(self):
+        self.assertQueries(
+            8,
+            "delete",
+            lambda size: f"/api/meals/{self.meal_ids[size]}/",
+            expected_status=204,
+        )
+
+    # --- 画像 ---
+
+    def test_meal_image(self):
+        # 画像名の advisory lock（保存前と acquire）の2本を含む
+        self.assertQueries(
+            9,
+            "post",
+            lambda size: f"/api/meals/{self.meal_ids[size]}/image/",
+            data=lambda size: {"image": SimpleUploadedFile("a.png", png_bytes(), "image/png")},
+            format="multipart",
+        )
+
+    def test_meal_image_async(self):
+        self.assertQueries(
+            3,
+            "post",
+            lambda size: f"/api/meals/{self.meal_ids[size]}/image/?async=1",
+            expected_status=202,
+            data=lambda size: {"image": SimpleUploadedFile("a.png", png_bytes(), "image/png")},
+            format="multipart",
+        )
+
+    def _start_upload(self, size, data: bytes):
+        response = self.call(
+            size,
+            "post",
+            f"/api/meals/{self.meal_ids[size]}/image/uploads/",
+            data={
+                "filename": "a.png",
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            },
+        )
+        return response.data["id"]
+
+    def test_upload_start(self):
+        data = png_bytes()
+        self.assertQueries(
+            3,
+            "post",
+            lambda size: f"/api/meals/{self.meal_ids[size]}/image/uploads/",
+            expected_status=201,
+            data={
+                "filename": "a.png",
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            },
+        )
+
+    def test_upload_chunk_status_and_finalize(self):
+        data = png_bytes()
+        upload_ids = {}
+
+        def start(size):
+            upload_ids[size] = self._start_upload(size, data)
+
+        self.assertQueries(
+            2, "get", lambda size: f"/api/uploads/{upload_ids[size]}/", prepare=start
+        )
+        # 本文を読む前のロックなしの SELECT と、読んだ後の SELECT ... FOR UPDATE の2本
+        self.assertQueries(
+            6,
+            "put",
+            lambda size: f"/api/uploads/{upload_ids[size]}/",
+            data=data,
+            format=None,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": "0"},
+        )
+        # 画像名の advisory lock（保存前と acquire）の2本を含む
+        self.assertQueries(
+            12, "post", lambda size: f"/api/uploads/{upload_ids[size]}/finalize/"
+        )
+
+    def test_upload_delete(self):
+        data = png_bytes()
+        upload_ids = {}
+
+        def start(size):
+            upload_ids[size] = self._start_upload(size, data)
+
+        self.assertQueries(
+            3,
+            "delete",
+            lambda size: f"/api/uploads/{upload_ids[size]}/",
+            expected_status=204,
+            prepare=start,
+        )
+
+    # --- AI ---
+
+    def test_ai_parse_meal_cached(self):
+        def prepare(size):
+            get_meal_parse_cache().set(
+                "ラーメン", AI_MODEL, MEAL_PROMPT_VERSION, {"name": "ラーメン", "calorie": 700}
+            )
+
+        self.assertQueries(
+            1, "post", "/api/ai/parse-meal", data={"text": "ラーメン"}, prepare=prepare
+        )
+
+    def test_ai_parse_meal_enqueue(self):
+        self.assertQueries(
+            2,
+            "post",
+            "/api/ai/parse-meal?async=1",
+            expected_status=202,
+            data={"text": "カレーライス"},
+        )
+
+    def test_ai_parse_meals_save(self):
+        items = [
+            {
+                "name": f"品目 {i}",
+                "calorie": 300,
+                "tag": "自炊",
+                "eatenAt": timezone.now().isoformat(),
+            }
+            for i in range(5)
+        ]
+        fake = SimpleNamespace(output_text=json.dumps({"items": items}), usage=None)
+        with mock.patch("api.ai.create_response", return_value=fake):
+            self.assertQueries(
+                6,
+                "post",
+                "/api/ai/parse-meals",
+                expected_status=201,
+                data={"text": "朝: トースト", "save": True},
+            )
+
+    def test_ai_parse_meal_async_cached(self):
+        def prepare(size):
+            get_meal_parse_cache().set(
+                "うどん", AI_MODEL, MEAL_PROMPT_VERSION, {"name": "うどん", "calorie": 400}
+            )
+
+        self.assertQueries(
+            0, "post", "/api/ai/parse-meal-async", data={"text": "うどん"}, prepare=prepare
+        )
+
+    def test_ai_cache_stats(self):
+        self.assertQueries(1, "get", "/api/ai/parse-meal/cache-stats")
+
+    # --- ジョブ・ダッシュボード・その他 ---
+
+    def test_job_detail(self):
+        self.assertQueries(2, "get", lambda size: f"/api/jobs/{self.job_ids[size]}/")
+
+    def test_dashboard(self):
+        # 認証 + 版数と目標（キャッシュキー）+ 今日の食事 + 直近7日 + 目標
+        self.assertQueries(5, "get", "/api/dashboard/")
+
+    def test_dashboard_cached(self):
+        self.assertQueries(
+            2,
+            "get",
+            "/api/dashboard/",
+            prepare=lambda size: self.call(size, "get", "/api/dashboard/"),
+        )
+
+    def test_auth_stats(self):
+        self.assertQueries(1, "get", "/api/auth/stats")
+
+    def test_health(self):
+        self.assertQueries(1, "get", "/api/health/")
+
+    def test_user_bulk_provision(self):
+        def body(size):
+            return {"users": [{"username": f"seat-{size}-{i}"} for i in range(50)]}
+
+        self.assertQueries(
+            6, "post", "/api/users/bulk/", expected_status=201, data=body
+        )
+
+    def test_profile_goal(self):
+        # ユーザーと Profile は認証時に1クエリで取る
+        self.assertQueries(1, "get", "/api/profile/goal/")
+
+    def test_profile_goal_auth_cached(self):
+        # 認証キャッシュは profile を持たないので、ユーザーの SELECT の代わりに Profile を取る
+        self.assertQueries(1, "get", "/api/profile/goal/", auth_cache_hit=True)
+
+    def test_profile_goal_update(self):
+        self.assertQueries(2, "patch", "/api/profile/goal/", data={"daily_calorie_goal": 2000})
+
+
+class QueryBudgetHelperTests(TestCase):
+    def test_over_budget_lists_queries(self):
+        with self.assertRaisesMessage(AssertionError, "2 queries executed, budget is 1"):
+            with query_budget(1):
+                list(User.objects.all())
+                list(Meal.objects.all())
+
+    def test_decorator(self):
+        @query_budget(1)
+        def one_query():
+            return User.objects.count()
+
+        self.assertEqual(one_query(), 0)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        dashboard.get_cache().clear()
+        self.user = User.objects.create_user("dash")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_meal(self, calorie):
+        response = self.client.post(
+            "/api/meals/",
+            {
+                "name": "カレー",
+                "eatenAt": timezone.now().isoformat(),
+                "calorie": calorie,
+                "tag": "自炊",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def total(self):
+        response = self.client.get("/api/dashboard/")
+        self.assertEqual(response.status_code, 200)
+        return response.data["todayTotalCalorie"]
+
+    def test_write_after_cached_read_is_reflected(self):
+        pk = self.add_meal(500)
+        self.assertEqual(self.total(), 500)
+        self.assertEqual(self.total(), 500)  # キャッシュから
+
+        self.add_meal(300)
+        self.assertEqual(self.total(), 800)
+        self.client.patch(f"/api/meals/{pk}/", {"calorie": 100}, format="json")
+        self.assertEqual(self.total(), 400)
+        self.client.delete("/api/meals/bulk/", {"ids": [pk]}, format="json")
+        self.assertEqual(self.total(), 300)
+
+    def test_goal_change_is_reflected(self):
+        self.assertEqual(self.client.get("/api/dashboard/").data["dailyCalorieGoal"], 1800)
+        self.client.patch("/api/profile/goal/", {"daily_calorie_goal": 2200}, format="json")
+        self.assertEqual(self.client.get("/api/dashboard/").data["dailyCalorieGoal"], 2200)
+
+    def test_stale_payload_built_before_a_write_is_not_served(self):
+        # 読み手がキーを作る -> 書き込みがコミット -> 読み手が古い payload を set、という競合
+        self.add_meal(500)
+        stale_key = dashboard.cache_key(self.user)
+        self.add_meal(300)
+        dashboard.get_cache().set(stale_key, {"todayTotalCalorie": 500}, 60)
+
+        self.assertEqual(self.total(), 800)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("etag")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_meal(self, client=None):
+        response = (client or self.client).post(
+            "/api/meals/",
+            {"name": "そば", "eatenAt": timezone.now().isoformat(), "calorie": 400, "tag": "和食"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def test_matching_if_none_match_returns_304(self):
+        self.add_meal()
+        first = self.client.get("/api/meals/today/")
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("no-cache", first["Cache-Control"])
+
+        response = self.client.get("/api/meals/today/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+
+    def test_write_changes_the_etag(self):
+        etag = self.client.get("/api/meals/today/")["ETag"]
+        pk = self.add_meal()
+        after_create = self.client.get("/api/meals/today/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_create.status_code, 200)
+        self.assertEqual(len(after_create.data), 1)
+
+        etag = after_create["ETag"]
+        self.client.patch(f"/api/meals/{pk}/", {"calorie": 300}, format="json")
+        after_update = self.client.get("/api/meals/today/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_update.status_code, 200)
+        self.assertEqual(after_update.data[0]["calorie"], 300)
+
+        etag = after_update["ETag"]
+        self.client.delete(f"/api/meals/{pk}/")
+        after_delete = self.client.get("/api/meals/today/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_delete.status_code, 200)
+        self.assertEqual(after_delete.data, [])
+
+    def test_anonymous_etag_changes_on_another_users_write(self):
+        anonymous = APIClient()
+        etag = anonymous.get("/api/meals/today/")["ETag"]
+        self.add_meal()
+        response = anonymous.get("/api/meals/today/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_anonymous_revision_differs_after_delete_and_same_number_of_writes(self):
+        # 合計と行数だと、消したユーザーと同じ回数だけ別のユーザーが書くと元の値に戻っていた
+        other = User.objects.create_user("etag-other")
+        revisions.bump([other.pk, other.pk])
+        revisions.bump([other.pk])
+        seen = {revisions.revision_for_user(None)}
+
+        other.delete()
+        seen.add(revisions.revision_for_user(None))
+        newcomer = User.objects.create_user("etag-new")
+        for _ in range(2):
+            revisions.bump([newcomer.pk])
+            seen.add(revisions.revision_for_user(None))
+
+        self.assertEqual(len(seen), 4)
+
+
+class MediaRefcountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user("media")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.image = png_bytes()
+
+    def meal_with_image(self):
+        meal = Meal.objects.create(
+            user=self.user, name="親子丼", eaten_at=timezone.now(), calorie=700, tag="和食"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/meals/{meal.pk}/image/",
+                {"image": SimpleUploadedFile("a.png", self.image, "image/png")},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        meal.refresh_from_db()
+        return meal
+
+    def refs(self, names):
+        return dict(MediaFile.objects.filter(name__in=names).values_list("name", "refs"))
+
+    def test_duplicate_uploads_share_one_file(self):
+        first = self.meal_with_image()
+        second = self.meal_with_image()
+        names = first.image_names()
+
+        self.assertEqual(len(names), 3)
+        self.assertEqual(second.image_names(), names)
+        self.assertEqual(self.refs(names), {name: 2 for name in names})
+
+    def test_deleting_one_of_two_meals_keeps_the_file(self):
+        first = self.meal_with_image()
+        self.meal_with_image()
+        names = first.image_names()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f"/api/meals/{first.pk}/").status_code, 204)
+
+        self.assertEqual(self.refs(names), {name: 1 for name in names})
+        self.assertTrue(all(meal_image_storage.exists(name) for name in names))
+
+    def test_last_release_deletes_the_file(self):
+        first = self.meal_with_image()
+        second = self.meal_with_image()
+        names = first.image_names()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/meals/{first.pk}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete("/api/meals/bulk/", {"ids": [second.pk]}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self.refs(names), {})
+        self.assertFalse(any(meal_image_storage.exists(name) for name in names))
+
+    def test_upload_after_the_file_was_deleted_writes_it_again(self):
+        first = self.meal_with_image()
+        names = first.image_names()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/meals/{first.pk}/")
+        self.assertFalse(meal_image_storage.exists(names[0]))
+
+        second = self.meal_with_image()
+        self.assertEqual(second.image_names(), names)
+        self.assertTrue(all(meal_image_storage.exists(name) for name in names))
+
+    def test_file_is_kept_if_referenced_again_before_the_delete_runs(self):
+        first = self.meal_with_image()
+        names = first.image_names()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.delete(f"/api/meals/{first.pk}/")
+        # release のコミット後、ファイルを消す前に同じ画像が付けられた
+        self.meal_with_image()
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(self.refs(names), {name: 1 for name in names})
+        self.assertTrue(all(meal_image_storage.exists(name) for name in names))
+
+
+class LocalDayBoundsTests(TestCase):
+    """日付での絞り込みは Asia/Tokyo の [0:00, 翌0:00) の半開区間"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("bounds")
+        tz = timezone.get_current_timezone()
+        self.day = timezone.localdate() - timedelta(days=2)
+        self.late = Meal.objects.create(
+            user=self.user, name="夜食", calorie=300, tag="間食",
+            eaten_at=datetime.combine(self.day, time(23, 59), tzinfo=tz),
+        )
+        self.midnight = Meal.objects.create(
+            user=self.user, name="深夜ラーメン", calorie=800, tag="外食",
+            eaten_at=datetime.combine(self.day + timedelta(days=1), time(0, 0), tzinfo=tz),
+        )
+
+    def by_date(self, client, day):
+        response = client.get("/api/meals/by-date/", {"date": day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return [meal["id"] for meal in response.data]
+
+    def test_by_date_splits_at_jst_midnight(self):
+        authenticated = APIClient()
+        authenticated.force_authenticate(self.user)
+        for client in (authenticated, APIClient()):  # 未ログインは全ユーザー分の経路
+            self.assertEqual(self.by_date(client, self.day), [self.late.pk])
+            self.assertEqual(
+                self.by_date(client, self.day + timedelta(days=1)), [self.midnight.pk]
+            )
+
+    def test_weekly_summary_splits_at_jst_midnight(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/meals/weekly-summary/")
+        self.assertEqual(response.status_code, 200)
+        totals = {row["date"]: row["totalCalorie"] for row in response.data}
+        self.assertEqual(totals[self.day.isoformat()], 300)
+        self.assertEqual(totals[(self.day + timedelta(days=1)).isoformat()], 800)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        for metric in metrics.REGISTRY:
+            metric.clear()
+        self.user = User.objects.create_user("metrics")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def exposed(self) -> list[str]:
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_middleware_records_route_status_and_queries(self):
+        executed = []
+
+        def count(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        # connection.queries はリクエストの開始で空にされるので、自前で数える
+        with connection.execute_wrapper(count):
+            self.client.get("/api/meals/today/")
+        self.client.get("/api/meals/today/")
+        self.client.get("/no-such-page/")
+
+        lines = self.exposed()
+        labels = '{route="/api/meals/today/",method="GET",status="200"}'
+        self.assertIn(f"http_request_duration_seconds_count{labels} 2", lines)
+        self.assertIn(
+            'http_request_duration_seconds_count{route="<unmatched>",method="GET",status="404"} 1',
+            lines,
+        )
+        labels = '{route="/api/meals/today/",method="GET"}'
+        self.assertIn(f"http_request_db_queries_count{labels} 2", lines)
+        self.assertIn(f"http_request_db_queries_sum{labels} {float(2 * len(executed))}", lines)
+
+    def test_exposition_format(self):
+        histogram = metrics.Histogram("demo_seconds", "Demo.", labels=("name",), buckets=(0.1, 1))
+        histogram.observe(0.05, 'a"b\nc')
+        histogram.observe(0.5, 'a"b\nc')
+        counter = metrics.Counter("demo_total", "Demo count.", labels=("kind",))
+        counter.inc("x")
+        counter.inc("x", amount=2)
+
+        label = 'name="a\\"b\\nc"'  # " と改行はエスケープされる
+        self.assertEqual(
+            list(histogram.expose()),
+            [
+                "# HELP demo_seconds Demo.",
+                "# TYPE demo_seconds histogram",
+                f'demo_seconds_bucket{{{label},le="0.1"}} 1',
+                f'demo_seconds_bucket{{{label},le="1"}} 2',
+                f'demo_seconds_bucket{{{label},le="+Inf"}} 2',
+                f"demo_seconds_sum{{{label}}} 0.55",
+                f"demo_seconds_count{{{label}}} 2",
+            ],
+        )
+        self.assertEqual(
+            list(counter.expose()),
+            [
+                "# HELP demo_total Demo count.",
+                "# TYPE demo_total counter",
+                'demo_total{kind="x"} 3',
+            ],
+        )
+
+    def test_every_metric_has_help_and_type(self):
+        lines = self.exposed()
+        for metric in metrics.REGISTRY:
+            self.assertIn(f"# HELP {metric.name} {metric.help}", lines)
+            self.assertTrue(any(line.startswith(f"# TYPE {metric.name} ") for line in lines))
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE http_request_duration_seconds histogram", response.content)
+
+    @override_settings(PRODUCTION=True, METRICS_TOKEN="")
+    def test_hidden_in_production_without_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(PRODUCTION=True, METRICS_TOKEN="s3cret")
+    def test_token_works_in_production(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        response = self.client.get("/api/meals/today/")
+        timing = response["Server-Timing"]
+        self.assertTrue(timing.startswith("db;dur="), timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r"total;dur=\d+\.\d$")
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_no_server_timing_header_when_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get("/api/meals/today/"))
+
+
+class MealImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("importer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.eaten_at = timezone.now().replace(microsecond=0).isoformat()
+
+    def post(self, filename, content):
+        return self.client.post(
+            "/api/meals/import/",
+            {"file": SimpleUploadedFile(filename, content.encode())},
+            format="multipart",
+        )
+
+    def test_csv_reports_bad_rows_with_line_numbers(self):
+        at = self.eaten_at
+        content = (
+            "name,eatenAt,calorie,tag\n"  # 1行目はヘッダー
+            f"朝ごはん,{at},400,自炊\n"
+            f",{at},400,自炊\n"
+            f"昼ごはん,昨日,500,外食\n"
+            f"間食,{at},-1,間食\n"
+            f"夕ごはん,{at},700,自炊\n"
+            f"大盛り,{at},99999999999,外食\n"
+        )
+        response = self.post("meals.csv", content)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["imported"], 2)
+        self.assertEqual(response.data["errorCount"], 4)
+        self.assertEqual(
+            [(error["line"], sorted(error["errors"])) for error in response.data["errors"]],
+            [(3, ["name"]), (4, ["eatenAt"]), (5, ["calorie"]), (7, ["calorie"])],
+        )
+        self.assertEqual(
+            response.data["errors"][3]["errors"]["calorie"],
+            ["Ensure this value is less than or equal to 2147483647."],
+        )
+        self.assertEqual(
+            sorted(Meal.objects.filter(user=self.user).values_list("name", flat=True)),
+            ["夕ごはん", "朝ごはん"],
+        )
+        self.assertEqual(
+            list(
+                DailyCalorieTotal.objects.filter(user=self.user).values_list(
+                    "total_calorie", "meal_count"
+                )
+            ),
+            [(1100, 2)],
+        )
+
+    def test_calorie_must_be_an_integer_like_the_api(self):
+        at = self.eaten_at
+        calories = [12.5, True, False, "12.5", "abc", None, 300, "450", 1.0]
+        lines = [
+            json.dumps({"name": f"品目 {i}", "eatenAt": at, "calorie": calorie, "tag": "自炊"})
+            for i, calorie in enumerate(calories)
+        ]
+        response = self.post("meals.ndjson", "\n".join(lines) + "\n")
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [1, 2, 3, 4, 5, 6])
+        for error in response.data["errors"]:
+            self.assertEqual(list(error["errors"]), ["calorie"])
+        self.assertEqual(
+            response.data["errors"][0]["errors"]["calorie"], ["A valid integer is required."]
+        )
+        self.assertEqual(
+            sorted(Meal.objects.filter(user=self.user).values_list("calorie", flat=True)),
+            [1, 300, 450],
+        )
+
+        # MealSerializer（API）でも同じ値が弾かれる
+        for calorie in calories[:6]:
+            body = {"name": "x", "eatenAt": at, "calorie": calorie, "tag": "自炊"}
+            with self.subTest(calorie=calorie):
+                self.assertFalse(MealSerializer(data=body).is_valid())
+
+    def test_name_and_tag_limits_match_the_serializer(self):
+        at = self.eaten_at
+        lines = [
+            json.dumps({"name": "あ" * 101, "eatenAt": at, "calorie": 1, "tag": "自炊"}),
+            json.dumps({"name": "  ", "eatenAt": at, "calorie": 1, "tag": "t" * 31}),
+            json.dumps({"eatenAt": at, "calorie": 1}),
+            json.dumps({"name": "  おにぎり ", "eatenAt": at, "calorie": 1, "tag": "間食"}),
+        ]
+        response = self.post("meals.ndjson", "\n".join(lines) + "\n")
+
+        errors = {error["line"]: error["errors"] for error in response.data["errors"]}
+        self.assertEqual(
+            errors[1], {"name": ["Ensure this field has no more than 100 characters."]}
+        )
+        self.assertEqual(sorted(errors[2]), ["name", "tag"])
+        self.assertEqual(
+            errors[3], {"name": ["This field is required."], "tag": ["This field is required."]}
+        )
+        self.assertEqual(
+            list(Meal.objects.filter(user=self.user).values_list("name", flat=True)), ["おにぎり"]
+        )
+
+    def test_ndjson_skips_broken_lines_and_keeps_going(self):
+        at = self.eaten_at
+        lines = [
+            json.dumps({"name": "そば", "eatenAt": at, "calorie": 350, "tag": "和食"}),
+            "{not json",
+            "",
+            json.dumps(["not", "an", "object"]),
+            json.dumps({"name": "うどん", "eaten_at": at, "calorie": "420", "tag": "和食"}),
+        ]
+        response = self.post("meals.ndjson", "\n".join(lines) + "\n")
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["imported"], 2)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [2, 4])
+        self.assertEqual(
+            sorted(Meal.objects.filter(user=self.user).values_list("calorie", flat=True)),
+            [350, 420],
+        )
+
+    def test_all_rows_bad_imports_nothing(self):
+        response = self.post("meals.csv", "name,eatenAt,calorie,tag\n,,,\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["imported"], 0)
+        self.assertEqual(response.data["errors"][0]["line"], 2)
+
+    def test_max_errors_rolls_back_everything(self):
+        content = (
+            "name,eatenAt,calorie,tag\n"
+            f"朝ごはん,{self.eaten_at},400,自炊\n"
+            ",,,\n"
+            ",,,\n"
+        )
+        result = import_meals(
+            io.BytesIO(content.encode()), "csv", self.user, chunk_size=1, max_errors=1
+        )
+        self.assertTrue(result.aborted)
+        self.assertEqual(result.imported, 0)
+        self.assertFalse(Meal.objects.filter(user=self.user).exists())
+        self.assertFalse(DailyCalorieTotal.objects.filter(user=self.user).exists())
+
+    def test_command_reports_progress_every_n_rows(self):
+        content = "name,eatenAt,calorie,tag\n" + "".join(
+            f"食事 {i},{self.eaten_at},300,自炊\n" for i in range(4)
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            out = io.StringIO()
+            call_command(
+                "import_meals", f.name, user="importer", chunk_size=1, progress_every=2, stdout=out
+            )
+
+        lines = out.getvalue().splitlines()
+        progress = [line.split(",")[0] for line in lines if "rows read" in line]
+        # 最後のチャンクのあとの呼び出しで同じ行数をもう一度出さない
+        self.assertEqual(progress, ["2 rows read", "4 rows read"])
+        self.assertEqual(Meal.objects.filter(user=self.user).count(), 4)
+
+
+class MealPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("pager")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        base = timezone.now().replace(microsecond=0)
+        # 同じ時刻の食事を混ぜる（(eaten_at, id) で順番が決まること）
+        times = [base - timedelta(hours=h) for h in (0, 1, 1, 1, 1, 2, 3)]
+        for i, eaten_at in enumerate(times):
+            Meal.objects.create(
+                user=self.user, name=f"食事 {i}", eaten_at=eaten_at, calorie=100, tag="自炊"
+            )
+        self.expected = list(
+            Meal.objects.filter(user=self.user)
+            .order_by("-eaten_at", "-id")
+            .values_list("id", flat=True)
+        )
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_next_links_walk_every_meal_once_in_order(self):
+        data = self.page("/api/meals/?page_size=2")
+        self.assertIsNone(data["previous"])
+        seen = [meal["id"] for meal in data["results"]]
+        while data["next"]:
+            data = self.page(data["next"])
+            self.assertLessEqual(len(data["results"]), 2)
+            seen += [meal["id"] for meal in data["results"]]
+
+        self.assertEqual(seen, self.expected)
+
+    def test_meals_added_while_paging_do_not_shift_pages(self):
+        first = self.page("/api/meals/?page_size=3")
+        Meal.objects.create(
+            user=self.user, name="追加", eaten_at=timezone.now(), calorie=100, tag="自炊"
+        )
+        second = self.page(first["next"])
+        self.assertEqual([meal["id"] for meal in second["results"]], self.expected[3:6])
+
+    def test_previous_link_returns_the_page_before(self):
+        first = self.page("/api/meals/?page_size=2")
+        second = self.page(first["next"])
+        third = self.page(second["next"])
+
+        back = self.page(third["previous"])
+        self.assertEqual(back["results"], second["results"])
+        self.assertEqual(back["next"], second["next"])
+
+        back = self.page(back["previous"])
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_tampered_cursor_is_not_found(self):
+        def encode(raw: bytes) -> str:
+            return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+        for cursor in [
+            "not-a-cursor!",
+            encode(b"\xff\xfe"),
+            encode(b"[1, 2]"),
+            encode(b'{"t": "yesterday", "i": 1}'),
+            encode(b'{"t": "2026-01-01T00:00:00+09:00", "i": "abc"}'),
+            encode(b'{"i": 1}'),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/meals/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_list_and_create_share_one_route(self):
+        self.assertEqual(reverse("meal-create"), "/api/meals/")
+        self.assertEqual(resolve("/api/meals/").url_name, "meal-create")
+        with self.assertRaises(NoReverseMatch):
+            reverse("meal-list-create")
+
+
+@override_settings(JOB_RETRY_BASE_DELAY=10, JOB_RETRY_MAX_DELAY=25)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        handlers = mock.patch.dict(jobs.HANDLERS, {"test.flaky": self.flaky})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        # 失敗のたびにトレースバックがログに出るので、テスト中は黙らせる
+        logger = mock.patch.object(jobs, "logger")
+        logger.start()
+        self.addCleanup(logger.stop)
+
+    def flaky(self, job):
+        self.calls.append(job.attempts)
+        if job.payload.get("permanent"):
+            raise jobs.PermanentJobError("bad input")
+        if len(self.calls) <= job.payload.get("failures", 0):
+            raise RuntimeError("temporary")
+        return {"ok": True}
+
+    def run_again(self, job):
+        # バックオフの待ちを飛ばして次の実行に進める
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertTrue(jobs.run_next("test-worker"))
+        job.refresh_from_db()
+        return job
+
+    def test_backoff_grows_and_is_capped(self):
+        for attempts, delay in [(1, 10), (2, 20), (3, 25), (10, 25)]:
+            seconds = jobs.backoff(attempts).total_seconds()
+            self.assertGreaterEqual(seconds, delay * 0.8)
+            self.assertLessEqual(seconds, delay * 1.2)
+
+    def test_failure_is_retried_after_backoff(self):
+        job = jobs.enqueue("test.flaky", {"failures": 1}, max_attempts=3)
+        before = timezone.now()
+        self.assertTrue(jobs.run_next("test-worker"))
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.error, "RuntimeError: temporary")
+        self.assertEqual(job.locked_by, "")
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=8))
+        # まだ実行時刻ではないので取り出されない
+        self.assertFalse(jobs.run_next("test-worker"))
+
+        job = self.run_again(job)
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.result, {"ok": True})
+        self.assertEqual(job.error, "")
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_failed_after_max_attempts(self):
+        job = jobs.enqueue("test.flaky", {"failures": 99}, max_attempts=3)
+        jobs.run_next("test-worker")
+        job = self.run_again(job)
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        job = self.run_again(job)
+
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIsNotNone(job.finished_at)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertFalse(jobs.run_next("test-worker"))
+
+    def test_permanent_error_fails_at_once(self):
+        job = jobs.enqueue("test.flaky", {"permanent": True}, max_attempts=3)
+        jobs.run_next("test-worker")
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 1)
+
+    def test_stale_job_is_requeued_or_failed(self):
+        old = timezone.now() - timedelta(hours=1)
+        retry = Job.objects.create(
+            kind="test.flaky", status=Job.Status.RUNNING, attempts=1, max_attempts=3,
+            locked_by="dead", locked_at=old,
+        )
+        exhausted = Job.objects.create(
+            kind="test.flaky", status=Job.Status.RUNNING, attempts=3, max_attempts=3,
+            locked_by="dead", locked_at=old,
+        )
+        self.assertEqual(jobs.requeue_stale(timeout=60), 1)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((retry.status, retry.locked_by), (Job.Status.QUEUED, ""))
+        self.assertEqual(exhausted.status, Job.Status.FAILED)
+
+
+class MealImageJobTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.meal = Meal.objects.create(
+            name="ハンバーグ", eaten_at=timezone.now(), calorie=800, tag="洋食"
+        )
+        self.path = default_storage.save("jobs/uploads/test.png", ContentFile(png_bytes()))
+
+    def run_job(self, max_attempts, fails=False):
+        job = jobs.enqueue(
+            "meal.image", {"meal_id": self.meal.pk, "path": self.path}, max_attempts=max_attempts
+        )
+        if fails:
+            with self.assertLogs("api.jobs", "INFO"):
+                jobs.run_next("test-worker")
+        else:
+            jobs.run_next("test-worker")
+        job.refresh_from_db()
+        return job
+
+    def test_success_deletes_the_uploaded_file(self):
+        job = self.run_job(max_attempts=3)
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertFalse(default_storage.exists(self.path))
+
+    def test_transient_failure_keeps_the_file_for_the_retry(self):
+        with mock.patch("api.tasks.save_images", side_effect=DatabaseError("down")):
+            job = self.run_job(max_attempts=3, fails=True)
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertTrue(default_storage.exists(self.path))
+
+    def test_final_transient_failure_deletes_the_file(self):
+        with mock.patch("api.tasks.save_images", side_effect=DatabaseError("down")):
+            job = self.run_job(max_attempts=1, fails=True)
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertFalse(default_storage.exists(self.path))
+
+    def test_missing_meal_deletes_the_file(self):
+        self.meal.delete()
+        job = self.run_job(max_attempts=3, fails=True)
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertFalse(default_storage.exists(self.path))
+
+
+class JobClaimConcurrencyTests(TransactionTestCase):
+    def test_locked_job_is_skipped(self):
+        now = timezone.now()
+        first = Job.objects.create(kind="test.flaky", run_after=now - timedelta(seconds=2))
+        second = Job.objects.create(kind="test.flaky", run_after=now - timedelta(seconds=1))
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_first():
+            # 別の接続で1件目をロックしたままにする（実行中の別ワーカーの代わり）
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(pk=first.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_first)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = jobs.claim("worker-b")
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(claimed.pk, second.pk)
+        self.assertEqual(claimed.status, Job.Status.RUNNING)
+        self.assertEqual(jobs.claim("worker-c").pk, first.pk)
+        self.assertIsNone(jobs.claim("worker-d"))
+
+
+class AuthCacheTests(TestCase):
+    def setUp(self):
+        self.cache = get_auth_cache()
+        self.cache.clear()
+        self.user = User.objects.create_user("auth-cache")
+        self.token = AccessToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def get(self):
+        return self.client.get("/api/meals/today/")
+
+    def test_second_request_is_served_from_the_cache(self):
+        with query_budget(10) as miss:
+            self.assertEqual(self.get().status_code, 200)
+        with query_budget(10) as hit:
+            self.assertEqual(self.get().status_code, 200)
+
+        # ヒットしたら api_user の SELECT（profile も JOIN している）がなくなる
+        self.assertEqual(len(hit), len(miss) - 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["token_hits"], stats["token_misses"]), (1, 1))
+
+    def test_cached_user_is_a_copy_per_request(self):
+        self.get()
+        first, _ = self.cache.get_user(str(self.token))
+        second, _ = self.cache.get_user(str(self.token))
+        self.assertEqual(first.pk, self.user.pk)
+        self.assertIsNot(first, second)
+
+    def test_user_change_clears_the_cache(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(len(self.cache.tokens), 1)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(len(self.cache.tokens), 0)
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_user_delete_clears_the_cache(self):
+        self.get()
+        self.user.delete()
+        self.assertEqual(self.get().status_code, 401)
+
+    def test_token_that_expires_after_caching_is_rejected(self):
+        self.assertEqual(self.get().status_code, 200)
+        later = datetime.fromtimestamp(self.token["exp"] + 1, tz=dt_timezone.utc)
+        with (
+            mock.patch("api.auth_cache.time") as cache_time,
+            mock.patch("rest_framework_simplejwt.tokens.aware_utcnow", return_value=later),
+        ):
+            cache_time.time.return_value = later.timestamp()
+            self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.cache.stats()["token_hits"], 0)
+
+    def test_concurrent_refreshes_run_once(self):
+        cache = AuthCache(max_entries=10, ttl=60, refresh_reuse=10, refresh_wait=5)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def do_refresh():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"access": "new-access", "refresh": "new-refresh"}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(cache.refresh("r", do_refresh)))
+        leader.start()
+        self.assertTrue(started.wait(5))
+        followers = [
+            threading.Thread(target=lambda: results.append(cache.refresh("r", do_refresh)))
+            for _ in range(4)
+        ]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"access": "new-access", "refresh": "new-refresh"}] * 5)
+        stats = cache.stats()
+        self.assertEqual((stats["refreshes"], stats["refresh_coalesced"]), (1, 4))
+
+    def test_goal_change_is_seen_on_a_cache_hit(self):
+        self.client.get("/api/profile/goal/")
+        # 別のプロセスでの変更（シグナルでキャッシュが消えない）にあたる
+        Profile.objects.filter(user=self.user).update(daily_calorie_goal=1650)
+        with query_budget(1):
+            response = self.client.get("/api/profile/goal/")
+        self.assertEqual(response.data, {"daily_calorie_goal": 1650})
+        self.assertEqual(self.cache.stats()["token_hits"], 1)
+
+    def test_shared_instance_is_built_once(self):
+        calls = []
+        barrier = threading.Barrier(8)
+
+        @shared_instance
+        def get_thing():
+            """テスト用"""
+            calls.append(1)
+            return object()
+
+        results = []
+
+        def worker():
+            barrier.wait(5)
+            results.append(get_thing())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertEqual(get_thing.__doc__, "テスト用")
+        self.assertIs(get_auth_cache(), get_auth_cache())
+
+    def test_failed_refresh_is_shared_but_not_cached(self):
+        cache = AuthCache(max_entries=10, ttl=60, refresh_reuse=10, refresh_wait=5)
+
+        def fail():
+            raise TokenError("Token is blacklisted")
+
+        with self.assertRaises(TokenError):
+            cache.refresh("r", fail)
+        self.assertEqual(cache.refresh("r", lambda: {"access": "a"}), {"access": "a"})
+        self.assertEqual(cache.stats()["refreshes"], 2)
+
+
+class MealBulkIdTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("bulk-ids")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # True == 1 なので、id=1 の食事があると true が id として通ってしまっていた
+        self.meal = Meal.objects.create(
+            pk=1, user=self.user, name="朝ごはん", eaten_at=timezone.now(), calorie=400, tag="自炊"
+        )
+
+    def test_patch_rejects_non_integer_ids(self):
+        body = [{"id": True, "calorie": 1}, {"id": "1", "calorie": 2}, {"calorie": 3}]
+        response = self.client.patch("/api/meals/bulk/", body, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [0, 1, 2])
+        self.assertEqual(response.data["errors"][0]["errors"], {"id": ["id must be an integer"]})
+        self.meal.refresh_from_db()
+        self.assertEqual(self.meal.calorie, 400)
+
+    def test_delete_rejects_bool_ids(self):
+        response = self.client.delete("/api/meals/bulk/", {"ids": [True]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Meal.objects.filter(pk=1).exists())
+
+    def test_patch_with_integer_ids(self):
+        response = self.client.patch("/api/meals/bulk/", [{"id": 1, "calorie": 500}], format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.meal.refresh_from_db()
+        self.assertEqual(self.meal.calorie, 500)
+
+    @override_settings(UPLOAD_TEMP_DIR=tempfile.gettempdir())
+    def test_delete_meal_with_pending_upload(self):
+        # 途中の分割アップロードが ImageUpload.meal で参照していても消せる
+        upload = uploads.start(self.meal, self.user, "a.png", 10, "0" * 64)
+        path = uploads.temp_path(upload)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete("/api/meals/bulk/", {"ids": [1]}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {"deleted": 1})
+        self.assertFalse(Meal.objects.filter(pk=1).exists())
+        self.assertFalse(ImageUpload.objects.filter(pk=upload.pk).exists())
+        self.assertFalse(path.exists())
+
+
+class UploadChunkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(
+            MEDIA_ROOT=cls.media_root, UPLOAD_TEMP_DIR=f"{cls.media_root}/uploads"
+        )
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user("chunks")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.meal = Meal.objects.create(
+            user=self.user, name="親子丼", eaten_at=timezone.now(), calorie=700, tag="和食"
+        )
+        self.data = png_bytes()
+        response = self.client.post(
+            f"/api/meals/{self.meal.pk}/image/uploads/",
+            {
+                "filename": "a.png",
+                "size": len(self.data),
+                "sha256": hashlib.sha256(self.data).hexdigest(),
+            },
+            format="json",
+        )
+        self.upload_id = response.data["id"]
+        self.url = f"/api/uploads/{self.upload_id}/"
+
+    def put(self, chunk: bytes, offset: int, **headers):
+        return self.client.put(
+            self.url,
+            chunk,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset), **headers},
+        )
+
+    def offset(self) -> int:
+        return self.client.get(self.url).data["offset"]
+
+    def chunk_files(self):
+        return list(Path(self.media_root, "uploads").glob("*.chunk"))
+
+    def test_offset_mismatch(self):
+        half = len(self.data) // 2
+        self.assertEqual(self.put(self.data[:half], 0).status_code, 200)
+
+        # 同じチャンクをもう一度送った
+        response = self.put(self.data[:half], 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data, {"error": "offset mismatch", "offset": half})
+        self.assertEqual(self.offset(), half)
+
+    def test_offset_moved_while_reading(self):
+        # 本文を読んでいる（ロックを持っていない）間に別のリクエストが同じ位置を書いた
+        half = len(self.data) // 2
+        receive = uploads.receive
+
+        def receive_then_race(upload, *args):
+            chunk = receive(upload, *args)
+            ImageUpload.objects.filter(pk=upload.pk).update(offset=half)
+            return chunk
+
+        with mock.patch.object(uploads, "receive", receive_then_race):
+            response = self.put(self.data[:half], 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["offset"], half)
+        self.assertEqual(self.chunk_files(), [])
+
+    def test_chunk_checksum_mismatch(self):
+        half = len(self.data) // 2
+        response = self.put(self.data[:half], 0, **{"X-Chunk-SHA256": "0" * 64})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "chunk checksum mismatch", "offset": 0})
+        self.assertEqual(self.offset(), 0)
+        self.assertEqual(self.chunk_files(), [])
+
+        chunk = self.data[:half]
+        response = self.put(chunk, 0, **{"X-Chunk-SHA256": hashlib.sha256(chunk).hexdigest()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["offset"], half)
+
+    def test_resume_after_partial_chunk(self):
+        half = len(self.data) // 2
+        self.assertEqual(self.put(self.data[:half], 0).status_code, 200)
+
+        # 2つ目のチャンクの途中で接続が切れた（Content-Length より短い本文）
+        upload = ImageUpload.objects.get(pk=self.upload_id)
+        rest = len(self.data) - half
+        with self.assertRaisesMessage(uploads.UploadError, "incomplete chunk"):
+            uploads.receive(upload, io.BytesIO(self.data[half:-10]), half, rest)
+        self.assertEqual(self.chunk_files(), [])
+        self.assertEqual(uploads.temp_path(upload).stat().st_size, half)
+
+        # GET で offset を確かめて、そこから送り直す
+        offset = self.offset()
+        self.assertEqual(offset, half)
+        response = self.put(self.data[offset:], offset)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"offset": len(self.data), "size": len(self.data)})
+
+        response = self.client.post(f"{self.url}finalize/")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.meal.refresh_from_db()
+        self.assertTrue(self.meal.image)
+        self.assertEqual(self.chunk_files(), [])
+
+    def test_meal_delete_removes_temp_file(self):
+        path = uploads.temp_path(ImageUpload.objects.get(pk=self.upload_id))
+        self.assertTrue(path.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.meal.delete()
+
+        self.assertFalse(ImageUpload.objects.filter(pk=self.upload_id).exists())
+        self.assertFalse(path.exists())
+
+    def test_user_delete_removes_temp_file(self):
+        path = uploads.temp_path(ImageUpload.objects.get(pk=self.upload_id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertFalse(path.exists())
+
+    def test_rolled_back_delete_keeps_temp_file(self):
+        path = uploads.temp_path(ImageUpload.objects.get(pk=self.upload_id))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self.meal.delete()
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertTrue(path.exists())
+
+
+class ProvisioningTests(TestCase):
+    def records(self, *rows):
+        return enumerate(rows, start=1)
+
+    def test_creates_users_and_profiles(self):
+        result = provisioning.provision_users(
+            self.records(
+                {"username": "seat-a", "email": "a@example.com", "daily_calorie_goal": 1800},
+                {"username": "seat-b"},
+            )
+        )
+        self.assertEqual(
+            result.as_dict(), {"created": 2, "errorCount": 0, "errors": [], "aborted": False}
+        )
+        user = User.objects.select_related("profile").get(username="seat-a")
+        self.assertEqual(user.profile.daily_calorie_goal, 1800)
+        self.assertFalse(user.has_usable_password())
+
+    def test_skips_existing_and_duplicate_usernames(self):
+        User.objects.create_user("seat-a")
+        result = provisioning.provision_users(
+            self.records({"username": "seat-a"}, {"username": "seat-b"}, {"username": "seat-b"})
+        )
+        self.assertEqual(result.imported, 1)
+        # 入力内の重複は読んだ時点で、既存ユーザー名は書き込み時に報告される
+        self.assertEqual(sorted(error["line"] for error in result.errors), [1, 3])
+
+    def test_username_created_between_check_and_insert(self):
+        # 既存チェックのあと、bulk_create の前に別のリクエストが seat-b を作った
+        existing = provisioning._existing
+        calls = []
+
+        def racing_existing(names):
+            found = existing(names)
+            if not calls:
+                User.objects.create_user("seat-b")
+            calls.append(names)
+            return found
+
+        with mock.patch.object(provisioning, "_existing", racing_existing):
+            result = provisioning.provision_users(
+                self.records({"username": "seat-a"}, {"username": "seat-b"}, {"username": "seat-c"})
+            )
+
+        self.assertEqual(result.imported, 2)
+        self.assertEqual(
+            result.errors,
+            [{"line": 2, "errors": {"username": ["A user with that username already exists."]}}],
+        )
+        self.assertEqual(
+            sorted(Profile.objects.values_list("user__username", flat=True)),
+            ["seat-a", "seat-b", "seat-c"],
+        )
+
+    def test_password_is_hashed(self):
+        provisioning.provision_users(self.records({"username": "seat-a", "password": "pw-1234"}))
+        self.assertTrue(User.objects.get(username="seat-a").check_password("pw-1234"))
+
+
+class MediaServingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(
+            MEDIA_ROOT=cls.media_root, MEDIA_CACHE_MAX_AGE=600, MEDIA_ACCEL_REDIRECT=""
+        )
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.digest = hashlib.sha256(b"hashed").hexdigest()
+        self.hashed = f"meals/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.png"
+        for name, content in (
+            (self.hashed, b"hashed"),
+            ("meals/plain.png", b"plain"),
+            ("jobs/uploads/spooled.png", b"private"),
+        ):
+            path = Path(self.media_root, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+
+    def get(self, path, **headers):
+        response = self.client.get(path, headers=headers)
+        self.addCleanup(response.close)  # FileResponse のファイルを閉じる
+        return response
+
+    def test_private_prefix_is_checked_after_normalizing(self):
+        for path in (
+            "/media/jobs/uploads/spooled.png",
+            "/media/./jobs/uploads/spooled.png",
+            "/media/meals/../jobs/uploads/spooled.png",
+            "/media/meals/./../jobs/uploads/spooled.png",
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    def test_paths_outside_media_root(self):
+        for path in ("/media/../manage.py", "/media/meals/..", "/media/meals/"):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+    def test_hashed_name_is_immutable(self):
+        response = self.get(f"/media/{self.hashed}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), b"hashed")
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["ETag"], f'"{self.digest}"')
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+        response = self.get(f"/media/{self.hashed}", **{"If-None-Match": f'"{self.digest}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.getvalue(), b"")
+        self.assertEqual(response["ETag"], f'"{self.digest}"')
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_normalized_hashed_name(self):
+        response = self.get(f"/media/meals/../{self.hashed}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+
+    def test_plain_name_uses_mtime_etag(self):
+        response = self.get("/media/meals/plain.png")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), b"plain")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertEqual(response["Cache-Control"], "public, max-age=600")
+
+        etag = response["ETag"]
+        response = self.get("/media/meals/plain.png", **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        response = self.get("/media/meals/plain.png", **{"If-None-Match": 'W/"other"'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="nginx", MEDIA_ACCEL_PREFIX="/protected-media/")
+    def test_accel_redirect_uses_normalized_path(self):
+        response = self.get(f"/media/./{self.hashed}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.hashed}")
+        self.assertEqual(response.getvalue(), b"")
+
+
+class SummaryBucketTests(TestCase):
+    """summary の週・月バケットは Asia/Tokyo の日付で切り、範囲外の日は数えない"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("buckets")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tz = timezone.get_current_timezone()
+        for day, at, calorie, tag in [
+            (date(2025, 3, 2), time(23, 59), 100, "自炊"),  # 日曜の終わり
+            (date(2025, 3, 3), time(0, 0), 200, "外食"),  # 月曜 0:00（UTC ではまだ日曜）
+            (date(2025, 3, 3), time(12, 0), 50, "外食"),
+            (date(2025, 3, 31), time(23, 30), 400, "間食"),
+            (date(2025, 4, 1), time(0, 10), 800, "自炊"),
+        ]:
+            Meal.objects.create(
+                user=self.user, name="食事", calorie=calorie, tag=tag,
+                eaten_at=datetime.combine(day, at, tzinfo=tz),
+            )
+
+    def summary(self, start, end, bucket):
+        response = self.client.get(
+            "/api/meals/summary/", {"from": start, "to": end, "bucket": bucket}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_bucket_start(self):
+        sunday = date(2025, 3, 2)
+        self.assertEqual(summaries.bucket_start(sunday, "day"), sunday)
+        self.assertEqual(summaries.bucket_start(sunday, "week"), date(2025, 2, 24))
+        self.assertEqual(summaries.bucket_start(date(2025, 3, 3), "week"), date(2025, 3, 3))
+        self.assertEqual(summaries.bucket_start(sunday, "month"), date(2025, 3, 1))
+
+    def test_week_buckets_start_on_monday_in_local_time(self):
+        data = self.summary("2025-02-26", "2025-03-09", "week")
+        self.assertEqual(
+            [(row["date"], row["totalCalorie"], row["mealCount"]) for row in data["items"]],
+            [("2025-02-24", 100, 1), ("2025-03-03", 250, 2)],
+        )
+        self.assertEqual(
+            [row["tags"] for row in data["items"]],
+            [
+                [{"tag": "自炊", "totalCalorie": 100, "mealCount": 1}],
+                [{"tag": "外食", "totalCalorie": 250, "mealCount": 2}],
+            ],
+        )
+        self.assertEqual((data["totalCalorie"], data["mealCount"]), (350, 3))
+
+    def test_month_buckets_split_at_local_midnight(self):
+        data = self.summary("2025-03-15", "2025-04-10", "month")
+        # 3月のバケットは 3/1 始まりだが、from より前の 3/2・3/3 は入らない
+        self.assertEqual(
+            [(row["date"], row["totalCalorie"], row["mealCount"]) for row in data["items"]],
+            [("2025-03-01", 400, 1), ("2025-04-01", 800, 1)],
+        )
+        self.assertEqual(data["items"][1]["tags"][0]["tag"], "自炊")
+
+    def test_range_edges_are_inclusive_local_days(self):
+        data = self.summary("2025-03-03", "2025-03-31", "week")
+        totals = {row["date"]: row["totalCalorie"] for row in data["items"]}
+        self.assertEqual(totals["2025-03-03"], 250)
+        self.assertEqual(totals["2025-03-31"], 400)
+        self.assertEqual(data["totalCalorie"], 650)
+
+    def test_empty_buckets_are_zero_filled(self):
+        data = self.summary("2025-03-01", "2025-03-05", "day")
+        self.assertEqual(
+            [(row["date"], row["totalCalorie"], row["tags"]) for row in data["items"]],
+            [
+                ("2025-03-01", 0, []),
+                ("2025-03-02", 100, [{"tag": "自炊", "totalCalorie": 100, "mealCount": 1}]),
+                ("2025-03-03", 250, [{"tag": "外食", "totalCalorie": 250, "mealCount": 2}]),
+                ("2025-03-04", 0, []),
+                ("2025-03-05", 0, []),
+            ],
+        )
+
+    def test_unknown_bucket_is_rejected(self):
+        response = self.client.get("/api/meals/summary/", {"bucket": "year"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AiParseCacheTests(TestCase):
+    """AI 解析キャッシュのキー（正規化・モデル・プロンプト版）と eatenAt の保存・復元"""
+
+    def setUp(self):
+        self.cache = MealParseCache(max_entries=8, ttl=60)
+        get_meal_parse_cache().clear()
+        self.addCleanup(get_meal_parse_cache().clear)
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  ＲＡＭＥＮ\u3000 大盛り\n"), "ramen 大盛り")
+        self.assertEqual(normalize_text("ｶﾚｰ"), "カレー")
+
+    def test_key_ignores_spacing_width_and_case(self):
+        key = MealParseCache.make_key("Ramen 大盛り", "m", "1")
+        self.assertEqual(MealParseCache.make_key(" ＲＡＭＥＮ　大盛り ", "m", "1"), key)
+        self.assertNotEqual(MealParseCache.make_key("Ramen 大盛り", "other", "1"), key)
+        self.assertNotEqual(MealParseCache.make_key("Ramen 大盛り", "m", "2"), key)
+        self.assertNotEqual(MealParseCache.make_key("Ramen大盛り", "m", "1"), key)
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get("ラーメン", "m", "1"))
+        self.cache.set("ラーメン", "m", "1", {"name": "ラーメン", "calorie": 700})
+
+        self.assertEqual(self.cache.get(" ラーメン ", "m", "1")["calorie"], 700)
+        self.assertIsNone(self.cache.get("ラーメン", "m", "2"))
+        self.assertIsNone(self.cache.get("ラーメン", "other", "1"))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["local_hits"], stats["misses"]), (1, 3))
+        self.assertEqual(stats["hit_rate"], 0.25)
+
+    def test_eaten_at_is_restored_relative_to_now(self):
+        parsed_at = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=parsed_at):
+            self.cache.set(
+                "朝ごはん", "m", "1",
+                {"name": "トースト", "eatenAt": "2026-01-01T20:30:00+09:00"},
+            )
+
+        # 30分前に食べた、という解析結果は翌日ヒットしても「今の30分前」になる
+        later = parsed_at + timedelta(days=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            data = self.cache.get("朝ごはん", "m", "1")
+        self.assertEqual(data["name"], "トースト")
+        self.assertEqual(
+            datetime.fromisoformat(data["eatenAt"]), later - timedelta(minutes=30)
+        )
+
+    def test_missing_or_bad_eaten_at_becomes_now(self):
+        now = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            self.cache.set("a", "m", "1", {"name": "a"})
+            self.cache.set("b", "m", "1", {"name": "b", "eatenAt": "yesterday"})
+            for text in ("a", "b"):
+                self.assertEqual(
+                    datetime.fromisoformat(self.cache.get(text, "m", "1")["eatenAt"]), now
+                )
+
+    def test_restored_result_is_a_copy(self):
+        self.cache.set("a", "m", "1", {"name": "a"})
+        self.cache.get("a", "m", "1")["name"] = "changed"
+        self.assertEqual(self.cache.get("a", "m", "1")["name"], "a")
+
+    def test_local_entries_expire_and_evict(self):
+        cache = TTLLRUCache(max_entries=2, ttl=10)
+        with mock.patch("time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2)
+            cache.get("a")  # a を新しくしておくと、あふれたとき b が消える
+            cache.set("c", 3)
+            self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        with mock.patch("time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("a"))
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "ai": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "ai"},
+        }
+    )
+    def test_shared_tier_is_seen_by_other_processes(self):
+        writer = MealParseCache(max_entries=8, ttl=60, shared_alias="ai")
+        reader = MealParseCache(max_entries=8, ttl=60, shared_alias="ai")
+        writer.set("うどん", "m", "1", {"name": "うどん", "calorie": 400})
+
+        self.assertEqual(reader.get("うどん", "m", "1")["calorie"], 400)
+        self.assertEqual(reader.get("うどん", "m", "1")["calorie"], 400)
+        stats = reader.stats()
+        self.assertEqual((stats["shared_hits"], stats["local_hits"]), (1, 1))
+
+    def test_view_calls_openai_once_per_normalized_text(self):
+        fake = SimpleNamespace(
+            output_text=json.dumps({"name": "ラーメン", "calorie": 700, "tag": "外食"}),
+            usage=None,
+        )
+        client = APIClient()
+        with mock.patch("api.ai.create_response", return_value=fake) as create:
+            first = client.post("/api/ai/parse-meal", {"text": "ラーメン"}, format="json")
+            second = client.post("/api/ai/parse-meal", {"text": " ﾗｰﾒﾝ "}, format="json")
+
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual((first["X-AI-Cache"], second["X-AI-Cache"]), ("miss", "hit"))
+        self.assertEqual(second.data["calorie"], 700)
+
+
+class MealExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("exporter")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tz = timezone.get_current_timezone()
+        day = date(2025, 5, 1)
+        self.first = Meal.objects.create(
+            user=self.user, name='カレー, "大盛り"', calorie=900, tag="外食",
+            eaten_at=datetime.combine(day, time(0, 0), tzinfo=tz),
+        )
+        self.second = Meal.objects.create(
+            user=self.user, name="サラダ\nとスープ", calorie=250, tag="自炊",
+            eaten_at=datetime.combine(day, time(23, 59), tzinfo=tz),
+        )
+        self.next_day = Meal.objects.create(
+            user=self.user, name="トースト", calorie=300, tag="自炊",
+            eaten_at=datetime.combine(day + timedelta(days=1), time(0, 0), tzinfo=tz),
+        )
+        Meal.objects.create(
+            user=User.objects.create_user("someone-else"), name="他人", calorie=1, tag="外食",
+            eaten_at=datetime.combine(day, time(12, 0), tzinfo=tz),
+        )
+
+    def export(self, **params):
+        response = self.client.get("/api/meals/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def ndjson_ids(self, **params):
+        _, body = self.export(format="ndjson", **params)
+        return [json.loads(line)["id"] for line in body.splitlines()]
+
+    def test_csv(self):
+        response, body = self.export(format="csv")
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertRegex(
+            response["Content-Disposition"], r'^attachment; filename="meals-\d{8}\.csv"$'
+        )
+
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(
+            rows[0], ["id", "name", "eatenAt", "calorie", "tag", "created_at", "image"]
+        )
+        self.assertEqual(
+            [int(row[0]) for row in rows[1:]], [self.first.pk, self.second.pk, self.next_day.pk]
+        )
+        # 区切り文字・引用符・改行を含む名前も csv として読み戻せる
+        self.assertEqual(
+            [row[1:5] for row in rows[1:]],
+            [
+                ['カレー, "大盛り"', "2025-05-01T00:00:00+09:00", "900", "外食"],
+                ["サラダ\nとスープ", "2025-05-01T23:59:00+09:00", "250", "自炊"],
+                ["トースト", "2025-05-02T00:00:00+09:00", "300", "自炊"],
+            ],
+        )
+        self.assertTrue(all(row[6] == "" for row in rows[1:]))
+
+    def test_ndjson(self):
+        response, body = self.export(format="ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        self.assertTrue(body.endswith("\n"))
+        self.assertIn("トースト", body)  # ensure_ascii=False
+
+        lines = body.splitlines()
+        self.assertEqual(len(lines), 3)
+        first = json.loads(lines[0])
+        self.assertEqual(
+            first,
+            {
+                "id": self.first.pk,
+                "name": 'カレー, "大盛り"',
+                "eatenAt": "2025-05-01T00:00:00+09:00",
+                "calorie": 900,
+                "tag": "外食",
+                "created_at": timezone.localtime(self.first.created_at).isoformat(),
+                "image": "",
+            },
+        )
+
+    def test_date_filter_uses_local_days(self):
+        day = [self.first.pk, self.second.pk]
+        self.assertEqual(self.ndjson_ids(**{"from": "2025-05-01", "to": "2025-05-01"}), day)
+        self.assertEqual(self.ndjson_ids(**{"from": "2025-05-02"}), [self.next_day.pk])
+        self.assertEqual(self.ndjson_ids(to="2025-04-30"), [])
+
+    def test_tag_filter(self):
+        self.assertEqual(self.ndjson_ids(tag="自炊"), [self.second.pk, self.next_day.pk])
+        self.assertEqual(
+            self.ndjson_ids(tag="自炊", **{"from": "2025-05-02"}), [self.next_day.pk]
+        )
+        self.assertEqual(self.ndjson_ids(tag="和食"), [])
+
+    def test_bad_parameters(self):
+        for params in ({"format": "xml"}, {"from": "2025/05/01"}, {"to": "tomorrow"}):
+            with self.subTest(params=params):
+                response = self.client.get("/api/meals/export/", params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_lines_are_buffered_without_splitting(self):
+        chunks = list(exports._buffered((f"{i}\n" for i in range(10)), size=6))
+        self.assertEqual(chunks, ["0\n1\n2\n", "3\n4\n5\n", "6\n7\n8\n", "9\n"])
+
+
+def photo_bytes(size=(80, 40), fmt="JPEG", orientation=None) -> bytes:
+    """左半分が赤・右半分が青の写真。orientation を渡すと EXIF（向き・機種名）をつける"""
+    img = Image.new("RGB", size, (0, 0, 255))
+    img.paste((255, 0, 0), (0, 0, size[0] // 2, size[1]))
+    options = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        exif[0x010F] = "PhoneMaker"
+        options["exif"] = exif
+    buf = io.BytesIO()
+    img.save(buf, fmt, **options)
+    return buf.getvalue()
+
+
+class ImageProcessingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls._media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user("photos")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def open(self, content):
+        content.seek(0)
+        return Image.open(io.BytesIO(content.read()))
+
+    def meal(self):
+        return Meal.objects.create(
+            user=self.user, name="オムライス", eaten_at=timezone.now(), calorie=800, tag="洋食"
+        )
+
+    def test_exif_is_applied_then_stripped(self):
+        files = images.process_image(io.BytesIO(photo_bytes(orientation=6)))
+
+        original = self.open(files["original"])
+        self.assertEqual(original.format, "JPEG")
+        self.assertEqual(original.size, (40, 80))  # 90度回して縦長になる
+        self.assertEqual(len(original.getexif()), 0)
+        self.assertNotIn("exif", original.info)
+        # 左（赤）が上にくる
+        red, green, blue = original.convert("RGB").getpixel((20, 5))
+        self.assertGreater(red, 200)
+        self.assertLess(blue, 50)
+
+        for name in ("medium", "thumb"):
+            variant = self.open(files[name])
+            self.assertEqual((variant.format, variant.size), ("WEBP", (40, 80)))
+            self.assertNotIn("exif", variant.info)
+
+    def test_variant_sizes(self):
+        files = images.process_image(io.BytesIO(photo_bytes(size=(2000, 1000), fmt="PNG")))
+        sizes = {name: self.open(content).size for name, content in files.items()}
+        self.assertEqual(
+            sizes, {"original": (2000, 1000), "medium": (1280, 640), "thumb": (320, 160)}
+        )
+        self.assertTrue(files["original"].name.endswith(".png"))
+        self.assertTrue(files["thumb"].name.endswith(".webp"))
+
+    def test_original_is_capped_and_alpha_kept(self):
+        img = Image.new("RGBA", (images.ORIGINAL_MAX_EDGE * 2, 16), (0, 0, 0, 0))
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        files = images.process_image(buf)
+        original = self.open(files["original"])
+        self.assertEqual(original.size, (images.ORIGINAL_MAX_EDGE, 8))
+        self.assertEqual(self.open(files["thumb"]).mode, "RGBA")
+
+    def test_same_photo_gives_same_bytes(self):
+        first = images.process_image(io.BytesIO(photo_bytes(orientation=3)))
+        second = images.process_image(io.BytesIO(photo_bytes(orientation=3)))
+        for name in ("original", "medium", "thumb"):
+            self.assertEqual(first[name].read(), second[name].read())
+
+    def test_not_an_image(self):
+        with self.assertRaises(images.InvalidImageError):
+            images.process_image(io.BytesIO(b"not an image"))
+        response = self.client.post(
+            f"/api/meals/{self.meal().pk}/image/",
+            {"image": SimpleUploadedFile("a.png", b"not an image", "image/png")},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_fills_variant_fields_and_urls(self):
+        meal = self.meal()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/meals/{meal.pk}/image/",
+                {"image": SimpleUploadedFile("a.jpg", photo_bytes(orientation=6), "image/jpeg")},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        meal.refresh_from_db()
+
+        self.assertTrue(meal.image.name.endswith(".jpg"))
+        self.assertTrue(meal.image_medium.name.endswith(".webp"))
+        self.assertTrue(meal.image_thumb.name.endswith(".webp"))
+        with meal.image.open("rb") as f:
+            self.assertEqual(len(Image.open(f).getexif()), 0)
+
+        urls = images.image_urls(meal)
+        self.assertEqual(
+            urls,
+            {
+                "thumb": meal.image_thumb.url,
+                "medium": meal.image_medium.url,
+                "original": meal.image.url,
+            },
+        )
+        self.assertEqual(len(set(urls.values())), 3)
+
+    def test_urls_fall_back_to_original_without_variants(self):
+        meal = self.meal()
+        self.assertIsNone(images.image_urls(meal))
+        meal.image = "meals/legacy.jpg"
+        urls = images.image_urls(meal)
+        self.assertEqual(set(urls.values()), {meal.image.url})
+
+    def test_generate_image_variants_command(self):
+        legacy = self.meal()
+        legacy.image.save("legacy.jpg", ContentFile(photo_bytes(orientation=6)))
+        broken = self.meal()
+        broken.image.save("broken.jpg", ContentFile(b"not an image"))
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command("generate_image_variants", stdout=out, stderr=err)
+        self.assertIn("Processed 1 images (1 failed).", out.getvalue())
+        self.assertIn(f"meal {broken.pk}:", err.getvalue())
+
+        legacy.refresh_from_db()
+        self.assertTrue(legacy.image_thumb.name.endswith(".webp"))
+        with legacy.image.open("rb") as f:
+            img = Image.open(f)
+            self.assertEqual((img.size, len(img.getexif())), ((40, 80), 0))
+
+        # 縮小版があるものは --all なしでは作り直さない
+        out = io.StringIO()
+        call_command("generate_image_variants", stdout=out, stderr=io.StringIO())
+        self.assertIn("Processed 0 images (1 failed).", out.getvalue())
+        out = io.StringIO()
+        call_command("generate_image_variants", "--all", stdout=out, stderr=io.StringIO())
+        self.assertIn("Processed 1 images (1 failed).", out.getvalue())
+
+
+class StubAsyncResponses:
+    """AsyncOpenAI().responses の代わり。同時に何本走っているかを数える"""
+
+    def __init__(self, output_text="", delay=0.0, error=None):
+        self.output_text = output_text
+        self.delay = delay
+        self.error = error
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            return SimpleNamespace(output_text=self.output_text, usage=None)
+        finally:
+            self.active -= 1
+
+
+class AiParseAsyncTests(TestCase):
+    """POST /api/ai/parse-meal-async と api/ai_async.py"""
+
+    URL = "/api/ai/parse-meal-async"
+
+    def setUp(self):
+        get_meal_parse_cache().clear()
+        self.addCleanup(get_meal_parse_cache().clear)
+        # クライアントとセマフォはイベントループごとに作られる。テストごとに作り直させる
+        clients = mock.patch.object(ai_async, "_clients", weakref.WeakKeyDictionary())
+        clients.start()
+        self.addCleanup(clients.stop)
+
+    def stub(self, **kwargs):
+        responses = StubAsyncResponses(**kwargs)
+        patcher = mock.patch.object(
+            ai_async, "_build_client", return_value=SimpleNamespace(responses=responses)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return responses
+
+    async def post(self, body):
+        data = body if isinstance(body, bytes) else json.dumps(body)
+        return await self.async_client.post(self.URL, data, content_type="application/json")
+
+    async def test_miss_then_hit(self):
+        meal = {"name": "うどん", "calorie": 400, "tag": "和食", "eatenAt": None}
+        responses = self.stub(output_text=json.dumps(meal, ensure_ascii=False))
+
+        first = await self.post({"text": "うどん"})
+        second = await self.post({"text": "\u3000うどん "})
+
+        self.assertEqual((first.status_code, first["X-AI-Cache"]), (200, "miss"))
+        self.assertEqual(json.loads(first.content)["calorie"], 400)
+        self.assertEqual((second.status_code, second["X-AI-Cache"]), (200, "hit"))
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(responses.calls[0]["input"], ai.meal_parse_input("うどん"))
+
+    def test_cache_is_shared_with_the_sync_view(self):
+        responses = self.stub(output_text=json.dumps({"name": "そば", "calorie": 350}))
+        client = APIClient()
+
+        # 非同期版で入れた結果は同期版でヒットし、その逆も同じ
+        response = async_to_sync(self.post)({"text": "そば"})
+        self.assertEqual(response["X-AI-Cache"], "miss")
+        with mock.patch("api.ai.create_response") as create:
+            response = client.post("/api/ai/parse-meal", {"text": "そば"}, format="json")
+        self.assertEqual((response["X-AI-Cache"], response.data["calorie"]), ("hit", 350))
+        create.assert_not_called()
+
+        fake = SimpleNamespace(output_text=json.dumps({"name": "牛丼", "calorie": 650}), usage=None)
+        with mock.patch("api.ai.create_response", return_value=fake):
+            client.post("/api/ai/parse-meal", {"text": "牛丼"}, format="json")
+        response = async_to_sync(self.post)({"text": "牛丼"})
+        self.assertEqual(response["X-AI-Cache"], "hit")
+        self.assertEqual(len(responses.calls), 1)
+
+    async def test_bad_requests(self):
+        responses = self.stub()
+        for body in (b"{not json", {"text": "  "}, {}, ["ラーメン"]):
+            with self.subTest(body=body):
+                response = await self.post(body)
+                self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(self.URL)
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(responses.calls, [])
+
+    async def test_error_mapping(self):
+        responses = self.stub()
+        cases = [
+            (RuntimeError("upstream down"), "", 500, "upstream down"),
+            (None, "sorry, no JSON", 502, "AI returned no JSON object"),
+            (None, "{broken", 502, "Failed to parse JSON from AI output"),
+        ]
+        for error, output_text, code, message in cases:
+            with self.subTest(code=code, message=message):
+                responses.error, responses.output_text = error, output_text
+                with self.assertLogs("api", level="ERROR") if code == 500 else nullcontext():
+                    response = await self.post({"text": f"error {message}"})
+                self.assertEqual(response.status_code, code)
+                self.assertEqual(json.loads(response.content)["error"], message)
+        # 失敗した結果はキャッシュに入らない
+        self.assertEqual(get_meal_parse_cache().stats()["local_entries"], 0)
+
+    async def test_concurrency_is_bounded(self):
+        responses = self.stub(output_text="{}", delay=0.02)
+        with self.settings(AI_PARSE_MAX_CONCURRENCY=2, AI_PARSE_QUEUE_TIMEOUT=5):
+            results = await asyncio.gather(
+                *(ai_async.create_response(model="m", input=str(i)) for i in range(6))
+            )
+        self.assertEqual(len(results), 6)
+        self.assertEqual(responses.max_active, 2)
+
+    async def test_busy_when_no_slot_frees_up(self):
+        self.stub(output_text=json.dumps({"name": "カレー"}), delay=0.2)
+        with self.settings(AI_PARSE_MAX_CONCURRENCY=1, AI_PARSE_QUEUE_TIMEOUT=0.01):
+            slow = asyncio.ensure_future(self.post({"text": "カレー"}))
+            await asyncio.sleep(0.05)
+            response = await self.post({"text": "ハヤシライス"})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(json.loads(response.content), {"error": "AI is busy, please retry"})
+            self.assertEqual((await slow).status_code, 200)
+
+    async def test_cancellation_releases_the_slot(self):
+        responses = self.stub(output_text="{}", delay=10)
+        with self.settings(AI_PARSE_MAX_CONCURRENCY=1, AI_PARSE_QUEUE_TIMEOUT=0.5):
+            task = asyncio.ensure_future(ai_async.create_response(model="m", input="a"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(responses.active, 0)
+
+            responses.delay = 0
+            await ai_async.create_response(model="m", input="b")
+        self.assertEqual(len(responses.calls), 2)
+
+    async def test_against_the_fake_openai_server(self):
+        handler = type("Handler", (fake_openai.Handler,), {})
+        server = fake_openai.serve("127.0.0.1", 0, latency=0, handler=handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        env = {
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1",
+            "OPENAI_API_KEY": "dummy",
+        }
+        with mock.patch.dict(os.environ, env):
+            try:
+                response = await self.post({"text": "親子丼"})
+            finally:
+                await ai_async.get_async_openai_client().close()
+
+        self.assertEqual((response.status_code, response["X-AI-Cache"]), (200, "miss"))
+        self.assertEqual(json.loads(response.content)["name"], "親子丼")
+        self.assertGreaterEqual(fake_openai.Handler.requests, 1)
+
+
+def ai_reply(data) -> SimpleNamespace:
+    """ai.create_response の戻り値の代わり"""
+    text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return SimpleNamespace(output_text=text, usage=None)
+
+
+class AiParseMealsTests(TestCase):
+    """POST /api/ai/parse-meals と、parse-meal?async=1 のジョブ（ai.parse_meal）"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("batch")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        get_meal_parse_cache().clear()
+        self.addCleanup(get_meal_parse_cache().clear)
+        self.eaten_at = timezone.localtime().replace(microsecond=0).isoformat()
+
+    def item(self, name, calorie=500, tag="自炊"):
+        return {
+            "name": name, "calorie": calorie, "tag": tag,
+            "eatenAt": self.eaten_at, "confidence": 0.8,
+        }
+
+    def parse(self, reply, **data):
+        create = mock.patch("api.ai.create_response", return_value=reply)
+        with create as mocked:
+            response = self.client.post("/api/ai/parse-meals", data, format="json")
+        return response, mocked
+
+    def test_one_model_call_for_all_items(self):
+        items = [self.item("トースト", 300), self.item("牛丼", 700, "外食")]
+        response, create = self.parse(ai_reply({"items": items}), text="朝: トースト, 昼: 牛丼")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"items": items})
+        create.assert_called_once()
+        kwargs = create.call_args.kwargs
+        self.assertEqual(kwargs["text"]["format"]["name"], "meals_parse")
+        self.assertEqual(kwargs["input"][-1], {"role": "user", "content": "朝: トースト, 昼: 牛丼"})
+        self.assertFalse(Meal.objects.exists())
+
+    def test_items_are_capped(self):
+        items = [self.item(f"品目 {i}") for i in range(ai.MAX_BATCH_ITEMS + 5)]
+        response, _ = self.parse(ai_reply({"items": items}), text="たくさん")
+        self.assertEqual(len(response.data["items"]), ai.MAX_BATCH_ITEMS)
+
+    def test_save_creates_meals_in_one_insert(self):
+        items = [self.item("トースト", 300), self.item("牛丼", 700, "外食")]
+        with CaptureQueriesContext(connection) as queries:
+            response, _ = self.parse(ai_reply({"items": items}), text="朝と昼", save=True)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        meals = Meal.objects.filter(user=self.user).order_by("id")
+        self.assertEqual([(m.name, m.calorie) for m in meals], [("トースト", 300), ("牛丼", 700)])
+        self.assertEqual([m["id"] for m in response.data["meals"]], [m.pk for m in meals])
+        inserts = [q for q in queries if q["sql"].startswith('INSERT INTO "api_meal"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            {k: v for k, v in fresh_daily_totals().items() if k[0] == self.user.pk},
+            {
+                (self.user.pk, d.date): (d.total_calorie, d.meal_count)
+                for d in DailyCalorieTotal.objects.filter(user=self.user)
+            },
+        )
+
+    def test_save_rejects_the_whole_batch(self):
+        items = [self.item("トースト"), self.item("", calorie=-1)]
+        response, _ = self.parse(ai_reply({"items": items}), text="朝と昼", save="true")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["items"], items)
+        self.assertEqual(response.data["errors"][0], {})
+        self.assertEqual(set(response.data["errors"][1]), {"name", "calorie"})
+        self.assertFalse(Meal.objects.exists())
+
+    def test_errors(self):
+        response = self.client.post("/api/ai/parse-meals", {"text": " "}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        for reply, code in [
+            (ai_reply("no json here"), 502),
+            (ai_reply({"meals": []}), 502),
+            (ai_reply('{"items": "トースト"}'), 502),
+        ]:
+            with self.subTest(reply=reply.output_text):
+                response, _ = self.parse(reply, text="朝ごはん")
+                self.assertEqual(response.status_code, code)
+                self.assertIn("error", response.data)
+
+        with mock.patch("api.ai.create_response", side_effect=RuntimeError("timeout")):
+            with self.assertLogs("api", level="ERROR"):
+                response = self.client.post("/api/ai/parse-meals", {"text": "朝"}, format="json")
+        self.assertEqual((response.status_code, response.data), (500, {"error": "timeout"}))
+
+    def test_against_the_fake_openai_server(self):
+        handler = type("Handler", (fake_openai.Handler,), {})
+        server = fake_openai.serve("127.0.0.1", 0, latency=0, handler=handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        env = {
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_port}/v1",
+            "OPENAI_API_KEY": "dummy",
+        }
+        with mock.patch.dict(os.environ, env), mock.patch.object(ai, "_client", None):
+            try:
+                response = self.client.post(
+                    "/api/ai/parse-meals",
+                    {"text": "トースト、牛丼、サラダ", "save": True},
+                    format="json",
+                )
+            finally:
+                ai.get_openai_client().close()
+
+        self.assertEqual(response.status_code, 201, response.data)
+        names = [meal["name"] for meal in response.data["meals"]]
+        self.assertEqual(names, ["トースト", "牛丼", "サラダ"])
+
+    def test_async_parse_runs_as_a_job(self):
+        response = self.client.post("/api/ai/parse-meal?async=1", {"text": "カツ丼"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["kind"], "ai.parse_meal")
+        self.assertEqual(response.data["status"], "queued")
+        location = response["Location"]
+
+        reply = ai_reply({"name": "カツ丼", "calorie": 900, "tag": "外食"})
+        with mock.patch("api.ai.create_response", return_value=reply) as create:
+            self.assertTrue(jobs.run_next("test-worker"))
+        create.assert_called_once()
+
+        job = self.client.get(location).data
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["result"]["calorie"], 900)
+        # ワーカーの結果はキャッシュに入り、次の同期リクエストは OpenAI を呼ばない
+        response = self.client.post("/api/ai/parse-meal", {"text": "カツ丼"}, format="json")
+        self.assertEqual((response["X-AI-Cache"], response.data["calorie"]), ("hit", 900))
+
+    def test_job_uses_results_cached_while_it_waited(self):
+        job = jobs.enqueue("ai.parse_meal", {"text": "親子丼"}, user=self.user)
+        get_meal_parse_cache().set(
+            "親子丼", AI_MODEL, MEAL_PROMPT_VERSION, {"name": "親子丼", "calorie": 650}
+        )
+        with mock.patch("api.ai.create_response") as create:
+            jobs.run_next("test-worker")
+        create.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result["calorie"]), (Job.Status.SUCCEEDED, 650))
+
+    def test_job_retries_broken_ai_output(self):
+        job = jobs.enqueue("ai.parse_meal", {"text": "謎の料理"}, max_attempts=2)
+        with mock.patch("api.ai.create_response", return_value=ai_reply("not json")):
+            with self.assertLogs("api.jobs", level="INFO"):
+                jobs.run_next("test-worker")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertTrue(job.error.startswith("AiOutputError"))
+
+
+def fresh_daily_totals():
+    """Meal から数え直した {(user_id, 日付): (合計カロリー, 件数)}"""
+    rows = (
+        Meal.objects.order_by()
+        .annotate(day=TruncDate("eaten_at", tzinfo=timezone.get_current_timezone()))
+        .values("user_id", "day")
+        .annotate(total=Sum("calorie"), count=Count("id"))
+    )
+    return {(row["user_id"], row["day"]): (row["total"], row["count"]) for row in rows}
+
+
+class RollupConsistencyTests(TestCase):
+    """どの書き込み経路のあとでも DailyCalorieTotal が Meal の集計と一致すること"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("rollup")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        today = timezone.localdate()
+        self.today_noon = timezone.make_aware(datetime.combine(today, time(12)))
+        self.yesterday_noon = self.today_noon - timedelta(days=1)
+
+    def assertTotalsMatch(self):
+        stored = {}
+        for row in DailyCalorieTotal.objects.all():
+            if row.meal_count:
+                stored[(row.user_id, row.date)] = (row.total_calorie, row.meal_count)
+            else:
+                self.assertEqual(row.total_calorie, 0, row)
+        self.assertEqual(stored, fresh_daily_totals())
+
+    def create(self, calorie=500, eaten_at=None):
+        response = self.client.post(
+            "/api/meals/",
+            {
+                "name": "カレー",
+                "eatenAt": (eaten_at or self.today_noon).isoformat(),
+                "calorie": calorie,
+                "tag": "自炊",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def test_create(self):
+        self.create(500)
+        self.create(300)
+        self.assertTotalsMatch()
+        total = DailyCalorieTotal.objects.get(user=self.user, date=self.today_noon.date())
+        self.assertEqual(total.total_calorie, 800)
+
+    def test_patch_moves_meal_to_another_day(self):
+        pk = self.create(500)
+        response = self.client.patch(
+            f"/api/meals/{pk}/", {"eatenAt": self.yesterday_noon.isoformat()}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTotalsMatch()
+        self.assertEqual(
+            DailyCalorieTotal.objects.get(
+                user=self.user, date=self.yesterday_noon.date()
+            ).total_calorie,
+            500,
+        )
+
+    def test_calorie_edit(self):
+        pk = self.create(500)
+        response = self.client.patch(f"/api/meals/{pk}/", {"calorie": 650}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTotalsMatch()
+
+    def test_delete(self):
+        keep = self.create(500)
+        pk = self.create(300)
+        self.assertEqual(self.client.delete(f"/api/meals/{pk}/").status_code, 204)
+        self.assertTotalsMatch()
+        self.assertEqual(self.client.delete(f"/api/meals/{keep}/").status_code, 204)
+        self.assertTotalsMatch()
+
+    def test_failed_rollup_rolls_back_the_update(self):
+        pk = self.create(500)
+        with mock.patch("api.rollups.apply_deltas", side_effect=DatabaseError("boom")):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(f"/api/meals/{pk}/", {"calorie": 900}, format="json")
+        self.assertEqual(Meal.objects.get(pk=pk).calorie, 500)
+        self.assertTotalsMatch()
+
+    def test_bulk_create_update_delete(self):
+        items = [
+            {
+                "name": f"品目 {i}",
+                "eatenAt": (self.today_noon - timedelta(days=i % 3)).isoformat(),
+                "calorie": 100 + i,
+                "tag": "自炊",
+            }
+            for i in range(9)
+        ]
+        response = self.client.post("/api/meals/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTotalsMatch()
+
+        ids = [meal["id"] for meal in response.data]
+        changes = [
+            {"id": ids[0], "calorie": 999},
+            {"id": ids[1], "eatenAt": (self.today_noon - timedelta(days=5)).isoformat()},
+            {"id": ids[2], "calorie": 1, "eatenAt": self.yesterday_noon.isoformat()},
+        ]
+        response = self.client.patch("/api/meals/bulk/", changes, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTotalsMatch()
+
+        response = self.client.delete("/api/meals/bulk/", {"ids": ids[:5]}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTotalsMatch()
+
+    def test_rebuild_command(self):
+        for i in range(4):
+            self.create(100 * (i + 1), self.today_noon - timedelta(days=i))
+        # ずらしておいて作り直す
+        DailyCalorieTotal.objects.update(total_calorie=0, meal_count=7)
+        DailyCalorieTotal.objects.create(
+            user=self.user, date=date(2000, 1, 1), total_calorie=5, meal_count=1
+        )
+
+        call_command("rebuild_daily_totals", stdout=io.StringIO())
+        self.assertTotalsMatch()
+
+
+class SeedMealsCommandTests(TestCase):
+    def test_seeds_users_meals_and_daily_totals(self):
+        call_command(
+            "seed_meals", users=3, days=4, meals_per_day=2, prefix="seed", stdout=io.StringIO()
+        )
+
+        users = User.objects.filter(username__startswith="seed-")
+        self.assertEqual(users.count(), 3)
+        self.assertTrue(users.get(username="seed-00000").check_password("loadtest-password"))
+        self.assertEqual(Meal.objects.filter(user__in=users).count(), 3 * 4 * 2)
+        totals = DailyCalorieTotal.objects.filter(user__in=users)
+        self.assertEqual(totals.count(), 3 * 4)
+        self.assertEqual(
+            sum(t.total_calorie for t in totals),
+            sum(Meal.objects.filter(user__in=users).values_list("calorie", flat=True)),
+        )
+
+    def test_refuses_to_seed_twice_without_clear(self):
+        call_command("seed_meals", users=1, days=1, prefix="seed", stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command("seed_meals", users=1, days=1, prefix="seed", stdout=io.StringIO())
+
+        call_command("seed_meals", users=2, days=1, prefix="seed", clear=True, stdout=io.StringIO())
+        self.assertEqual(User.objects.filter(username__startswith="seed-").count(), 2)
+
+
+class MealListDataTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="rows")
+        seed_meals(user, 5)
+        # 画像あり（縮小版あり / 元画像だけ）の行も混ぜる。URL を作るだけなのでファイルは置かない
+        Meal.objects.filter(pk__in=Meal.objects.order_by("id").values("id")[:2]).update(
+            image="meals/ab/cd/abcd.jpg"
+        )
+        Meal.objects.filter(pk=Meal.objects.order_by("id").first().pk).update(
+            image_medium="meals/medium/ab/cd/abcd.webp", image_thumb="meals/thumb/ab/cd/abcd.webp"
+        )
+        self.meals = Meal.objects.order_by("eaten_at")
+
+    def test_matches_meal_serializer(self):
+        request = APIRequestFactory().get("/api/meals/", HTTP_HOST="example.com")
+        for context_request in (Request(request), None):
+            with self.subTest(request=context_request is not None):
+                expected = MealSerializer(
+                    self.meals, many=True, context={"request": context_request}
+                ).data
+                self.assertEqual(
+                    meal_list_data(meal_rows(self.meals), context_request),
+                    json.loads(json.dumps(expected)),
+                )
+
+    def test_fast_renderer_matches_json_renderer(self):
+        data = {
+            "meals": MealSerializer(self.meals, many=True).data,
+            "job": uuid.uuid4(),
+            "at": timezone.now(),
+            "day": timezone.localdate(),
+            "amount": Decimal("1.50"),
+            1: "数値のキー",
+            "separator": "a\u2028b\u2029c",
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+
+class StartupImportTests(TestCase):
+    def test_openai_sdk_is_not_imported_at_startup(self):
+        # 全ビューを読み込んでも openai SDK は読まない（AI を初めて呼ぶときに読む。api/ai.py）
+        src = Path(__file__).resolve().parent.parent
+        code = (
+            "import os, sys\n"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')\n"
+            f"sys.path.insert(0, {str(src)!r})\n"
+            "import django\n"
+            "django.setup()\n"
+            "from django.urls import get_resolver\n"
+            "get_resolver().url_patterns\n"
+            "print(sorted(m for m in ('openai', 'httpx') if m in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_openai_client_is_created_once(self):
+        with mock.patch.object(ai, "_client", None), mock.patch("openai.OpenAI") as client_class:
+            self.assertIs(ai.get_openai_client(), ai.get_openai_client())
+        client_class.assert_called_once()
+
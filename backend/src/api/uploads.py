@@ -0,0 +1,179 @@
+"""
+再開できる分割アップロード（画像用）。
+
+    POST   /api/meals/<id>/image/uploads/   {"filename", "size", "sha256"}  → セッション作成
+    PUT    /api/uploads/<uuid>/             本文 = チャンク、Upload-Offset ヘッダー = 書き込み位置
+    GET    /api/uploads/<uuid>/             受信済みバイト数（offset）の確認。再開時はここから続ける
+    POST   /api/uploads/<uuid>/finalize/    SHA-256 を確かめて Meal.image に付ける
+    DELETE /api/uploads/<uuid>/             中止
+
+チャンクはパーサーを通さず、リクエスト本文を READ_SIZE ずつ一時ファイルに書く。
+1アップロードあたりのメモリは READ_SIZE 分だけ。
+本文はまずチャンク用の一時ファイルに受けてから（receive）、行ロックを取って offset を確かめて
+本体の .part に足す（commit）。遅いクライアントの間は行ロックを握らない。
+Meal やユーザーを消して ImageUpload が CASCADE で消えたときも、.part はコミット後に消す。
+"""
+
+import hashlib
+import re
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ImageUpload
+
+READ_SIZE = 64 * 1024
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = 400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+    def as_dict(self):
+        return {"error": str(self), **self.extra}
+
+
+def temp_path(upload: ImageUpload) -> Path:
+    return Path(settings.UPLOAD_TEMP_DIR) / f"{upload.pk}.part"
+
+
+def start(meal, user, filename: str, size, sha256: str) -> ImageUpload:
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("size must be an integer") from None
+    if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+        raise UploadError(f"size must be between 1 and {settings.UPLOAD_MAX_SIZE}", status=413)
+    sha256 = str(sha256 or "").lower()
+    if not _SHA256_RE.match(sha256):
+        raise UploadError("sha256 must be a hex SHA-256 digest")
+
+    upload = ImageUpload.objects.create(
+        user=user if user is not None and user.is_authenticated else None,
+        meal=meal,
+        filename=str(filename or "")[:255],
+        size=size,
+        sha256=sha256,
+    )
+    path = temp_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return upload
+
+
+def receive(upload: ImageUpload, stream, offset, length, chunk_sha256: str | None = None) -> Path:
+    """
+    stream から length バイトを読んでチャンク用の一時ファイルに書き、そのパスを返す。
+    遅いクライアントを待つ間ロックを握らないよう、upload はロックせずに取ったものでよい
+    （offset はここでは早めに弾くためだけに見る。確定は commit() がロックの中でやり直す）。
+    エラーのときは一時ファイルを消してから UploadError を投げる。
+    """
+    try:
+        offset = int(offset)
+        length = int(length)
+    except (TypeError, ValueError):
+        raise UploadError("Upload-Offset and Content-Length are required", status=400) from None
+    if offset != upload.offset:
+        # 前回のチャンクが届いていなかった / 二重に送った。正しい位置を返して送り直してもらう
+        raise UploadError("offset mismatch", status=409, offset=upload.offset)
+    if not 0 < length <= settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(
+            f"chunk must be between 1 and {settings.UPLOAD_MAX_CHUNK_SIZE} bytes", status=413
+        )
+    if offset + length > upload.size:
+        raise UploadError("chunk exceeds the declared size", offset=upload.offset)
+
+    path = temp_path(upload).with_suffix(f".{uuid.uuid4().hex}.chunk")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(path, "wb") as f:
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                digest.update(data)
+                written += len(data)
+
+        if written != length:
+            raise UploadError("incomplete chunk", offset=upload.offset)
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+            raise UploadError("chunk checksum mismatch", offset=upload.offset)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def commit(upload: ImageUpload, offset, chunk: Path) -> int:
+    """
+    receive() が書いたチャンクを offset の位置に足して、新しい offset を返す。
+    upload は select_for_update() で取ったものを渡すこと（同じセッションへの同時書き込みを防ぐ）。
+    チャンクの一時ファイルは消さないので、呼び出し側で消すこと。
+    """
+    offset = int(offset)
+    if offset != upload.offset:
+        # 読んでいる間に別のリクエストが同じ位置を書いた
+        raise UploadError("offset mismatch", status=409, offset=upload.offset)
+
+    length = 0
+    with open(temp_path(upload), "r+b") as f, open(chunk, "rb") as src:
+        # 前回途中で切れたチャンクの残りがあれば捨てる
+        f.seek(offset)
+        f.truncate()
+        while data := src.read(READ_SIZE):
+            f.write(data)
+            length += len(data)
+
+    upload.offset = offset + length
+    upload.save(update_fields=["offset", "updated_at"])
+    return upload.offset
+
+
+def verify(upload: ImageUpload) -> Path:
+    """全部届いていて SHA-256 が合っていれば一時ファイルのパスを返す"""
+    if upload.offset != upload.size:
+        raise UploadError("upload is incomplete", status=409, offset=upload.offset)
+
+    path = temp_path(upload)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while data := f.read(READ_SIZE):
+            digest.update(data)
+    if digest.hexdigest() != upload.sha256:
+        raise UploadError("checksum mismatch")
+    return path
+
+
+def discard(upload: ImageUpload) -> None:
+    temp_path(upload).unlink(missing_ok=True)
+    upload.delete()
+
+
+def purge_expired(hours: int | None = None) -> int:
+    """hours 時間更新のないアップロードを一時ファイルごと消す"""
+    hours = settings.UPLOAD_EXPIRE_HOURS if hours is None else hours
+    expired = ImageUpload.objects.filter(updated_at__lt=timezone.now() - timedelta(hours=hours))
+    count = 0
+    for upload in expired.iterator():
+        discard(upload)
+        count += 1
+    return count
+
+
+@receiver(post_delete, sender=ImageUpload)
+def delete_temp_file_on_delete(sender, instance, **kwargs):
+    # ロールバックされたら行は残るので、ファイルはコミットしてから消す
+    path = temp_path(instance)
+    transaction.on_commit(lambda: path.unlink(missing_ok=True))
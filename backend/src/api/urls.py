@@ -1,25 +1,74 @@
 from django.urls import path
 from .views import (
-    MealCreateView,
+    MealListCreateView,
+    MealBulkView,
     MealTodayListView,
     MealByDateListView,
     MealWeeklySummaryView,
+    MealSummaryView,
+    MealExportView,
+    MealImportView,
     MealDetailView,
     MealImageUploadView,
     MealAiParseView,   # 👈 新增
+    MealsAiParseView,
+    AiParseCacheStatsView,
+    AuthStatsView,
+    UserBulkProvisionView,
+    HealthView,
+    meal_ai_parse_async,
     CalorieGoalView,
+    JobDetailView,
+    MealImageUploadStartView,
+    ImageUploadView,
+    ImageUploadFinalizeView,
+    DashboardView,
 )
 
 urlpatterns = [
     # 既存 Meal API
-    path("meals/", MealCreateView.as_view(), name="meal-create"),
+    # 一覧（GET）も同じ URL。名前は一覧を足す前からの "meal-create" のまま
+    path("meals/", MealListCreateView.as_view(), name="meal-create"),
+    path("meals/bulk/", MealBulkView.as_view(), name="meal-bulk"),
     path("meals/today/", MealTodayListView.as_view(), name="meal-today-list"),
     path("meals/by-date/", MealByDateListView.as_view(), name="meal-by-date"),
     path("meals/weekly-summary/", MealWeeklySummaryView.as_view(), name="meal-weekly-summary"),
+    path("meals/summary/", MealSummaryView.as_view(), name="meal-summary"),
+    path("meals/export/", MealExportView.as_view(), name="meal-export"),
+    path("meals/import/", MealImportView.as_view(), name="meal-import"),
     path("meals/<int:pk>/", MealDetailView.as_view(), name="meal-detail"),
     path("meals/<int:meal_id>/image/", MealImageUploadView.as_view(), name="meal-image"),
+    # 分割（再開できる）アップロード
+    path(
+        "meals/<int:meal_id>/image/uploads/",
+        MealImageUploadStartView.as_view(),
+        name="meal-image-upload-start",
+    ),
+    path("uploads/<uuid:pk>/", ImageUploadView.as_view(), name="image-upload"),
+    path(
+        "uploads/<uuid:pk>/finalize/",
+        ImageUploadFinalizeView.as_view(),
+        name="image-upload-finalize",
+    ),
 
     # ✅ AI 解析（新增）
     path("ai/parse-meal", MealAiParseView.as_view(), name="ai-parse-meal"),
+    path("ai/parse-meals", MealsAiParseView.as_view(), name="ai-parse-meals"),
+    path("ai/parse-meal-async", meal_ai_parse_async, name="ai-parse-meal-async"),
+    path(
+        "ai/parse-meal/cache-stats",
+        AiParseCacheStatsView.as_view(),
+        name="ai-parse-meal-cache-stats",
+    ),
+    # バックグラウンドジョブの状態（async=1 で受け付けたアップロード・AI 解析）
+    path("jobs/<uuid:pk>/", JobDetailView.as_view(), name="job-detail"),
+    # ダッシュボード（今日の食事 + 直近7日 + 目標をまとめて）
+    path("dashboard/", DashboardView.as_view(), name="dashboard"),
+    # JWT 認証のキャッシュ・認証時間
+    path("auth/stats", AuthStatsView.as_view(), name="auth-stats"),
+    # ヘルスチェック
+    path("health/", HealthView.as_view(), name="health"),
+    # ユーザーの一括作成（管理者のみ）
+    path("users/bulk/", UserBulkProvisionView.as_view(), name="user-bulk-provision"),
     # ✅ Profile API
     path("profile/goal/", CalorieGoalView.as_view(), name="profile-goal"),]
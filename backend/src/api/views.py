@@ -1,29 +1,114 @@
 # すでにある import に続けて
 from rest_framework import generics, permissions
 from django.utils import timezone
-from .models import Meal
-from .serializers import MealSerializer, CalorieGoalSerializer
+from .models import DailyCalorieTotal, ImageUpload, Job, Meal, Profile
+from .serializers import (
+    CalorieGoalSerializer,
+    ImageUploadSerializer,
+    JobSerializer,
+    MealSerializer,
+    meal_list_data,
+    meal_rows,
+)
+from .dates import local_day_bounds, local_day_start
+from .summaries import BUCKETS, calorie_series, tag_breakdown
+from .ai_cache import get_meal_parse_cache
+from .auth_cache import get_auth_cache
+from .pagination import MealKeysetPagination
+from .images import InvalidImageError, save_images
+from . import (
+    ai,
+    ai_async,
+    dashboard,
+    exports,
+    imports,
+    jobs,
+    media,
+    provisioning,
+    revisions,
+    rollups,
+    uploads,
+)
 from datetime import datetime, timedelta
 from django.utils import timezone as dj_timezone
-from django.db.models import Sum
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework import status, parsers
 
 import os
+import csv
 import json
-from json import JSONDecoder
-from openai import OpenAI
-import traceback
-import re
+import logging
+import uuid
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.negotiation import DefaultContentNegotiation
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+logger = logging.getLogger(__name__)
+
+
+class IgnoreFormatNegotiation(DefaultContentNegotiation):
+    """?format= を DRF のレンダラー切り替えに使わせない（インポート等の形式指定に使うため）"""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def meals_for(request):
+    """
+    ログイン中ならそのユーザーの食事だけ、未ログイン（いまの開発モード）なら全件。
+    ログイン中は (user, eaten_at)、未ログインは (eaten_at) のインデックスが効く。
+    一覧系は必ずここを通す。
+    """
+    qs = Meal.objects.all()
+    if request.user.is_authenticated:
+        qs = qs.filter(user=request.user)
+    return qs
+
+
+class MealRowsListMixin:
+    """
+    GET の一覧を MealSerializer ではなく meal_list_data()
+    （.values() の dict から直接組み立てる）で返す。
+    出力は MealSerializer(many=True) と同じ。書き込みは今まで通り serializer_class を使う
+    """
+
+    def list(self, request, *args, **kwargs):
+        rows = meal_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(meal_list_data(page, request))
+        return Response(meal_list_data(rows, request))
 
-class MealCreateView(generics.CreateAPIView):
-    queryset = Meal.objects.all()
+
+class MealListCreateView(MealRowsListMixin, generics.ListCreateAPIView):
+    """
+    GET: 食事履歴（新しい順、カーソルページネーション。?cursor= / ?page_size=）
+    POST: 食事の登録
+    """
     serializer_class = MealSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = MealKeysetPagination
+
+    def get_queryset(self):
+        return meals_for(self.request)
+
+    def perform_create(self, serializer):
+        user = self.request.user
+        # INSERT と日次集計・版数の更新を1トランザクションにする
+        with transaction.atomic():
+            serializer.save(user=user if user.is_authenticated else None)
 
 
-class MealTodayListView(generics.ListAPIView):
+class MealTodayListView(MealRowsListMixin, generics.ListAPIView):
     """
     今日の食事を一覧取得するAPI
     GET /api/meals/today/
@@ -33,14 +118,25 @@ class MealTodayListView(generics.ListAPIView):
 
     def get_queryset(self):
         today = timezone.localdate()  # 今日の日付
-        return Meal.objects.filter(eaten_at__date=today).order_by("eaten_at")
+        start, end = local_day_bounds(today)
+        return meals_for(self.request).filter(
+            eaten_at__gte=start, eaten_at__lt=end
+        ).order_by("eaten_at")
+
+    @revisions.conditional_get
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 
 # 日付指定で、その日の食事一覧を返す
-class MealByDateListView(generics.ListAPIView):
+class MealByDateListView(MealRowsListMixin, generics.ListAPIView):
     serializer_class = MealSerializer
     permission_classes = [permissions.AllowAny]
 
+    @revisions.conditional_get
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         date_str = self.request.query_params.get("date")
         if date_str:
@@ -51,8 +147,9 @@ class MealByDateListView(generics.ListAPIView):
         else:
             target_date = dj_timezone.localdate()
 
-        return Meal.objects.filter(
-            eaten_at__date=target_date
+        start, end = local_day_bounds(target_date)
+        return meals_for(self.request).filter(
+            eaten_at__gte=start, eaten_at__lt=end
         ).order_by("eaten_at")
 
 
@@ -63,46 +160,354 @@ class MealDetailView(generics.RetrieveUpdateDestroyAPIView):
     PATCH  /api/meals/<id>/        : 部分更新（おすすめ）
     DELETE /api/meals/<id>/        : 削除
     """
-    queryset = Meal.objects.all()
     serializer_class = MealSerializer
     permission_classes = [permissions.AllowAny]  # いまは開発用
 
     # もしURLが pk じゃなく meal_id 等ならこれを使う：
     # lookup_url_kwarg = "meal_id"
+
+    def get_queryset(self):
+        qs = Meal.objects.all()
+        if self.request.method in ("PUT", "PATCH", "DELETE"):
+            # 日次集計はシグナルで「読み込み時の値 -> 新しい値」の差分を足すので、
+            # 同じ食事を同時に更新すると古い日から二重に引かれる。更新・削除は行ロックして順番にする
+            qs = qs.select_for_update()
+        return qs
+
+    def update(self, request, *args, **kwargs):
+        # Meal の UPDATE と日次集計・版数の更新をまとめてコミット（途中で失敗したら全部戻す）
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().destroy(request, *args, **kwargs)
+
+
+def daily_totals_for(request):
+    """meals_for() の DailyCalorieTotal 版"""
+    qs = DailyCalorieTotal.objects.all()
+    if request.user.is_authenticated:
+        qs = qs.filter(user=request.user)
+    return qs
+
+
+def item_errors(errors):
+    """ListSerializer のエラー（リスト or {index: ...}）を [{index, errors}] にそろえる"""
+    if isinstance(errors, dict):
+        pairs = sorted(errors.items())
+    else:
+        pairs = enumerate(errors)
+    return [{"index": index, "errors": detail} for index, detail in pairs if detail]
+
+
+class MealBulkView(APIView):
+    """
+    食事の一括作成 / 更新 / 削除（インポートやオフライン同期用）
+    POST   /api/meals/bulk/  [{name, eatenAt, calorie, tag}, ...]
+    PATCH  /api/meals/bulk/  [{id, ...変更するフィールド}, ...]
+    DELETE /api/meals/bulk/  {"ids": [1, 2, ...]}
+
+    1リクエスト = 1トランザクション。1件でもエラーがあれば何も書き込まず、
+    400 で {"errors": [{"index": 何件目か, "errors": {...}}]} を返す。
+    """
+    permission_classes = [permissions.AllowAny]
+
+    MAX_ITEMS = 10_000
+
+    def _check_list(self, data):
+        if not isinstance(data, list):
+            return Response(
+                {"error": "request body must be a list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not data:
+            return Response({"error": "list is empty"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(data) > self.MAX_ITEMS:
+            return Response(
+                {"error": f"at most {self.MAX_ITEMS} items per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return None
+
+    @staticmethod
+    def _is_id(value) -> bool:
+        # bool は int のサブクラスで True == 1 になるので、id としては受け付けない
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    def post(self, request, *args, **kwargs):
+        error = self._check_list(request.data)
+        if error:
+            return error
+
+        serializer = MealSerializer(data=request.data, many=True, context={"request": request})
+        if not serializer.is_valid():
+            return Response(
+                {"errors": item_errors(serializer.errors)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = request.user if request.user.is_authenticated else None
+        serializer.save(user=user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def patch(self, request, *args, **kwargs):
+        data = request.data
+        error = self._check_list(data)
+        if error:
+            return error
+
+        ids = [item.get("id") if isinstance(item, dict) else None for item in data]
+        errors = [
+            {"index": index, "errors": {"id": ["id must be an integer"]}}
+            for index, pk in enumerate(ids)
+            if not self._is_id(pk)
+        ]
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            found = meals_for(request).select_for_update().in_bulk(ids)
+
+            seen = set()
+            for index, pk in enumerate(ids):
+                if pk not in found:
+                    errors.append({"index": index, "errors": {"id": ["meal not found"]}})
+                elif pk in seen:
+                    errors.append({"index": index, "errors": {"id": ["duplicate id"]}})
+                seen.add(pk)
+            if errors:
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = MealSerializer(
+                [found[pk] for pk in ids],
+                data=data,
+                many=True,
+                partial=True,
+                context={"request": request},
+            )
+            if not serializer.is_valid():
+                return Response(
+                    {"errors": item_errors(serializer.errors)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            serializer.save()
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else request.data
+        error = self._check_list(ids)
+        if error:
+            return error
+
+        errors = [
+            {"index": index, "errors": {"id": ["id must be an integer"]}}
+            for index, pk in enumerate(ids)
+            if not self._is_id(pk)
+        ]
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            qs = meals_for(request).filter(id__in=ids)
+            meals = list(
+                qs.select_for_update().only(
+                    "id", "user_id", "eaten_at", "calorie", *media.IMAGE_FIELDS
+                )
+            )
+            found = {meal.pk for meal in meals}
+            errors = [
+                {"index": index, "errors": {"id": ["meal not found"]}}
+                for index, pk in enumerate(ids)
+                if pk not in found
+            ]
+            if errors:
+                return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            # _raw_delete() は CASCADE を辿らないので、途中の分割アップロードは先に ORM で消す
+            # （一時ファイルは api/uploads.py の post_delete がコミット後に消す）
+            ImageUpload.objects.filter(meal_id__in=found).delete()
+            # QuerySet.delete() は1件ずつ post_delete を送るので、
+            # DELETE ... WHERE id IN (...) 1本で消して日次集計と画像の参照数はまとめて反映する
+            deleted = qs.order_by()._raw_delete(qs.db)
+            rollups.apply_meals(meals, sign=-1)
+            media.release(name for meal in meals for name in meal.image_names())
+            revisions.bump(meal.user_id for meal in meals)
+
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+
+
+class MealImportView(APIView):
+    """
+    食事履歴のインポート（他アプリからの移行用）
+    POST /api/meals/import/  multipart: file=<CSV or NDJSON>, format=csv|ndjson
+    （format を省略したらファイルの拡張子から判定）
+
+    不正な行はスキップして {"imported", "errorCount", "errors": [{line, errors}]} を返す。
+    大きなファイルは `manage.py import_meals` の方が速い（進捗も出る）。
+    """
+    permission_classes = [permissions.AllowAny]
+    parser_classes = [parsers.MultiPartParser]
+    content_negotiation_class = IgnoreFormatNegotiation
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if not upload:
+            return Response({"error": "file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = (
+            request.query_params.get("format")
+            or request.data.get("format")
+            or imports.guess_format(upload.name)
+        )
+        if fmt not in imports.FORMATS:
+            return Response(
+                {"error": "format must be csv or ndjson"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = request.user if request.user.is_authenticated else None
+        try:
+            # 大きいアップロードは Django が一時ファイルに書くので、ここでもメモリは増えない
+            result = imports.import_meals(upload.file, fmt, user)
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response(
+                {"error": f"could not read file: {e}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        code = status.HTTP_201_CREATED if result.imported else status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=code)
+
+
 class MealWeeklySummaryView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @revisions.conditional_get
     def get(self, request, *args, **kwargs):
         today = dj_timezone.localdate()
         start = today - timedelta(days=6)  # 6日前〜今日 = 7日分
 
-        qs = (
-            Meal.objects
-            .filter(eaten_at__date__range=(start, today))
-            .values("eaten_at__date")
-            .annotate(total_calorie=Sum("calorie"))
+        data = [
+            {"date": row["date"], "totalCalorie": row["totalCalorie"]}
+            for row in calorie_series(daily_totals_for(request), start, today)
+        ]
+        return Response(data)
+
+
+class MealSummaryView(APIView):
+    """
+    期間指定のカロリーサマリ
+    GET /api/meals/summary/?from=2025-01-01&to=2025-12-31&bucket=day|week|month
+    from / to を省略すると直近7日分、bucket を省略すると day。
+    週・月バケットの date はバケットの開始日（週は月曜）で、集計対象は from〜to の範囲内だけ。
+    """
+    permission_classes = [permissions.AllowAny]
+
+    MAX_DAYS = 366 * 5
+
+    @revisions.conditional_get
+    def get(self, request, *args, **kwargs):
+        today = dj_timezone.localdate()
+        try:
+            end = _parse_date_param(request.query_params.get("to"), today)
+            start = _parse_date_param(
+                request.query_params.get("from"), end - timedelta(days=6)
+            )
+        except ValueError:
+            return Response(
+                {"error": "from / to must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if start > end:
+            return Response(
+                {"error": "from must be on or before to"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if (end - start).days + 1 > self.MAX_DAYS:
+            return Response(
+                {"error": f"range must be at most {self.MAX_DAYS} days"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        bucket = request.query_params.get("bucket") or "day"
+        if bucket not in BUCKETS:
+            return Response(
+                {"error": "bucket must be one of: day, week, month"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        items = calorie_series(daily_totals_for(request), start, end, bucket)
+        tags = tag_breakdown(meals_for(request), start, end, bucket)
+        for row in items:
+            row["tags"] = tags.get(row["date"], [])
+
+        return Response(
+            {
+                "from": start.isoformat(),
+                "to": end.isoformat(),
+                "bucket": bucket,
+                "totalCalorie": sum(row["totalCalorie"] for row in items),
+                "mealCount": sum(row["mealCount"] for row in items),
+                "items": items,
+            }
         )
 
-        # {日付: 合計kcal} な dict に変換
-        total_map = {
-            row["eaten_at__date"]: row["total_calorie"] for row in qs
-        }
 
-        # 6日前〜今日まで、穴埋めしながら配列にする
-        data = []
-        for i in range(7):
-            d = start + timedelta(days=i)
-            data.append(
-                {
-                    "date": d.isoformat(),                  # "2025-11-27"
-                    "totalCalorie": total_map.get(d, 0),    # その日の合計
-                }
+def _parse_date_param(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+class MealExportView(APIView):
+    """
+    食事履歴のエクスポート（ストリーミング）
+    GET /api/meals/export/?format=csv|ndjson&from=2025-01-01&to=2025-12-31&tag=外食
+    from / to / tag は省略可（省略すると全期間・全タグ）
+    """
+    permission_classes = [permissions.AllowAny]
+    content_negotiation_class = IgnoreFormatNegotiation
+
+    CHUNK_SIZE = 2000
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get("format") or "csv"
+        if fmt not in exports.CONTENT_TYPES:
+            return Response(
+                {"error": "format must be csv or ndjson"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        return Response(data)
+        try:
+            start = _parse_date_param(request.query_params.get("from"), None)
+            end = _parse_date_param(request.query_params.get("to"), None)
+        except ValueError:
+            return Response(
+                {"error": "from / to must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        qs = meals_for(request)
+        if start:
+            qs = qs.filter(eaten_at__gte=local_day_start(start))
+        if end:
+            qs = qs.filter(eaten_at__lt=local_day_start(end + timedelta(days=1)))
+        tag = request.query_params.get("tag")
+        if tag:
+            qs = qs.filter(tag=tag)
+
+        response = StreamingHttpResponse(
+            exports.stream(qs, fmt, chunk_size=self.CHUNK_SIZE),
+            content_type=exports.CONTENT_TYPES[fmt],
+        )
+        filename = f"meals-{dj_timezone.localdate():%Y%m%d}.{fmt}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
 
-from rest_framework import status, parsers
 from django.shortcuts import get_object_or_404
 
 
@@ -115,16 +520,60 @@ class CalorieGoalView(APIView):
         return Response(serializer.data)
 
     def patch(self, request):
-        print("PATCH data:", request.data)  # 追加
+        logger.debug("PATCH profile goal: %s", request.data)
         profile = request.user.profile
         serializer = CalorieGoalSerializer(profile, data=request.data, partial=True)
         if not serializer.is_valid():
-            print("serializer errors:", serializer.errors)  # 追加
+            logger.info("invalid profile goal: %s", serializer.errors)
             return Response(serializer.errors, status=400)
         serializer.save()
         return Response(serializer.data, status=200)
 
 
+class DashboardView(APIView):
+    """
+    ダッシュボード用に、今日の食事・直近7日のカロリー・1日の目標カロリーをまとめて返す
+    GET /api/dashboard/
+    キーに食事の版数と目標を入れてユーザーごとにキャッシュする（api/dashboard.py）
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        cache = dashboard.get_cache()
+        # 版数は payload を作る前に読む（payload がキーより古くならないように）
+        key = dashboard.key_for(request)
+        data = cache.get(key)
+        if data is None:
+            data = self.build(request)
+            cache.set(key, data, settings.DASHBOARD_CACHE_TTL)
+        return Response(data)
+
+    def build(self, request):
+        today = dj_timezone.localdate()
+        start, end = local_day_bounds(today)
+        meals = meals_for(request).filter(
+            eaten_at__gte=start, eaten_at__lt=end
+        ).order_by("eaten_at")
+        meals_data = meal_list_data(meal_rows(meals), request)
+        weekly = calorie_series(daily_totals_for(request), today - timedelta(days=6), today)
+
+        goal = None
+        if request.user.is_authenticated:
+            goal = (
+                Profile.objects.filter(user=request.user)
+                .values_list("daily_calorie_goal", flat=True)
+                .first()
+            )
+
+        return {
+            "date": today.isoformat(),
+            "today": meals_data,
+            "todayTotalCalorie": sum(meal["calorie"] for meal in meals_data),
+            "weeklySummary": weekly,
+            "dailyCalorieGoal": goal,
+        }
+
+
 class MealImageUploadView(APIView):
     parser_classes = [parsers.MultiPartParser, parsers.FormParser]
 
@@ -135,36 +584,173 @@ class MealImageUploadView(APIView):
         if not image:
             return Response({"detail": "image is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        meal.image = image
-        meal.save()
+        # async=1 なら元ファイルだけ置いて、縮小版づくりはワーカーに任せる
+        if wants_async(request):
+            ext = os.path.splitext(image.name or "")[1].lower()[:10]
+            path = default_storage.save(f"jobs/uploads/{uuid.uuid4().hex}{ext}", image)
+            job = jobs.enqueue("meal.image", {"meal_id": meal.pk, "path": path}, user=request.user)
+            return job_accepted(job, request)
+
+        try:
+            save_images(meal, image)
+        except InvalidImageError:
+            return Response({"detail": "invalid image"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(MealSerializer(meal, context={"request": request}).data, status=status.HTTP_200_OK)
 
+
+class MealImageUploadStartView(APIView):
+    """
+    分割アップロードの開始
+    POST /api/meals/<id>/image/uploads/  {"filename": "a.jpg", "size": 6291456, "sha256": "..."}
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, meal_id: int):
+        meal = get_object_or_404(meals_for(request), pk=meal_id)
+        try:
+            upload = uploads.start(
+                meal,
+                request.user,
+                request.data.get("filename"),
+                request.data.get("size"),
+                request.data.get("sha256"),
+            )
+        except uploads.UploadError as e:
+            return Response(e.as_dict(), status=e.status)
+
+        url = request.build_absolute_uri(reverse("image-upload", args=[upload.pk]))
+        data = ImageUploadSerializer(upload).data
+        data["chunkSize"] = settings.UPLOAD_MAX_CHUNK_SIZE
+        return Response(data, status=status.HTTP_201_CREATED, headers={"Location": url})
+
+
+def image_uploads_for(request):
+    """JobDetailView と同じく、ログイン中は自分のものと未ログインで作ったものだけ"""
+    qs = ImageUpload.objects.all()
+    if request.user.is_authenticated:
+        return qs.filter(Q(user=request.user) | Q(user__isnull=True))
+    return qs.filter(user__isnull=True)
+
+
+class ImageUploadView(APIView):
+    """
+    分割アップロードのチャンク送信・状態確認・中止
+    PUT /api/uploads/<uuid>/  (Upload-Offset: 0, 本文 = チャンクのバイト列, 任意で X-Chunk-SHA256)
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        upload = get_object_or_404(image_uploads_for(request), pk=pk)
+        return Response(ImageUploadSerializer(upload).data)
+
+    def put(self, request, pk):
+        # request.data には触らない（パーサーが本文を丸ごと読み込んでしまう）
+        # 本文を読む間はロックを取らず、読み終わってから offset の確認と更新だけロックの中でやる
+        upload = get_object_or_404(image_uploads_for(request), pk=pk)
+        try:
+            chunk = uploads.receive(
+                upload,
+                request.stream,
+                request.headers.get("Upload-Offset"),
+                request.headers.get("Content-Length"),
+                request.headers.get("X-Chunk-SHA256"),
+            )
+        except uploads.UploadError as e:
+            return Response(e.as_dict(), status=e.status)
+        try:
+            with transaction.atomic():
+                upload = get_object_or_404(image_uploads_for(request).select_for_update(), pk=pk)
+                offset = uploads.commit(upload, request.headers.get("Upload-Offset"), chunk)
+        except uploads.UploadError as e:
+            return Response(e.as_dict(), status=e.status)
+        finally:
+            chunk.unlink(missing_ok=True)
+        return Response({"offset": offset, "size": upload.size})
+
+    def delete(self, request, pk):
+        upload = get_object_or_404(image_uploads_for(request), pk=pk)
+        uploads.discard(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ImageUploadFinalizeView(APIView):
+    """
+    分割アップロードの完了。SHA-256 を確かめて Meal.image に付ける（async=1 ならジョブに回す）
+    POST /api/uploads/<uuid>/finalize/
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, pk):
+        with transaction.atomic():
+            upload = get_object_or_404(
+                image_uploads_for(request).select_for_update().select_related("meal"), pk=pk
+            )
+            try:
+                path = uploads.verify(upload)
+            except uploads.UploadError as e:
+                return Response(e.as_dict(), status=e.status)
+
+            meal = upload.meal
+            if wants_async(request):
+                ext = os.path.splitext(upload.filename)[1].lower()[:10]
+                with open(path, "rb") as f:
+                    stored = default_storage.save(f"jobs/uploads/{uuid.uuid4().hex}{ext}", File(f))
+                job = jobs.enqueue(
+                    "meal.image", {"meal_id": meal.pk, "path": stored}, user=request.user
+                )
+                uploads.discard(upload)
+                return job_accepted(job, request)
+
+            try:
+                with open(path, "rb") as f:
+                    save_images(meal, f)
+            except InvalidImageError:
+                uploads.discard(upload)
+                return Response({"detail": "invalid image"}, status=status.HTTP_400_BAD_REQUEST)
+            uploads.discard(upload)
+
+        return Response(
+            MealSerializer(meal, context={"request": request}).data, status=status.HTTP_200_OK
+        )
+
+
+def wants_async(request) -> bool:
+    """?async=1（またはボディの async）が付いていればジョブキューに回す"""
+    value = request.query_params.get("async", request.data.get("async", ""))
+    return str(value).lower() in ("1", "true")
+
+
+def job_accepted(job, request):
+    """202 Accepted + ジョブの状態（Location に状態確認の URL）"""
+    url = request.build_absolute_uri(reverse("job-detail", args=[job.pk]))
+    return Response(
+        JobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": url},
+    )
+
+
+class JobDetailView(generics.RetrieveAPIView):
+    """
+    ジョブの状態確認（ポーリング用）
+    GET /api/jobs/<uuid>/
+    """
+    serializer_class = JobSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        # ログイン中は自分のジョブだけ。未ログインで作ったジョブは ID を知っていれば見られる
+        qs = Job.objects.all()
+        if self.request.user.is_authenticated:
+            return qs.filter(Q(user=self.request.user) | Q(user__isnull=True))
+        return qs.filter(user__isnull=True)
+
 # ===============================
 # AI：文字解析食事（最短版）
 # POST /api/ai/parse-meal
 # ===============================
 
-_openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-MEAL_SCHEMA = {
-    "name": "meal_parse",
-    "schema": {
-        "type": "object",
-        "additionalProperties": False,
-        "properties": {
-            "name": {"type": "string"},
-            "calorie": {"type": "integer", "minimum": 0, "maximum": 5000},
-            "tag": {"type": "string"},
-            "eatenAt": {"type": "string", "description": "ISO 8601 datetime"},
-            "confidence": {"type": "number", "minimum": 0, "maximum": 1},
-        },
-        "required": ["name", "calorie", "tag", "eatenAt", "confidence"],
-    },
-    "strict": True,
-}
-
-
 class MealAiParseView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -173,66 +759,224 @@ class MealAiParseView(APIView):
         if not text:
             return Response({"error": "text is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
+        model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
 
-            resp = _openai_client.responses.create(
-                model=model,
-                input=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "Return ONLY one JSON object. Do not include any other text. "
-                            "Schema: {"
-                            "\"name\": string, "
-                            "\"calorie\": integer, "
-                            "\"tag\": string, "
-                            "\"eatenAt\": string ISO8601, "
-                            "\"confidence\": number 0-1"
-                            "}. "
-                            "tag should be one of: 外食, 自炊, 和食, 洋食, 間食. "
-                            "If unclear, make a reasonable estimate."
-                        ),
-                    },
-                    {"role": "user", "content": text},
-                ],
-                store=False,
+        # ✅ 同じフレーズは OpenAI を呼ばずにキャッシュから返す
+        cached = get_meal_parse_cache().get(text, model, ai.MEAL_PROMPT_VERSION)
+        if cached is not None:
+            response = Response(cached, status=status.HTTP_200_OK)
+            response["X-AI-Cache"] = "hit"
+            return response
+
+        # async=1 なら OpenAI はワーカーで呼び、ここではジョブを返すだけ
+        if wants_async(request):
+            job = jobs.enqueue("ai.parse_meal", {"text": text}, user=request.user)
+            return job_accepted(job, request)
+
+        try:
+            data = ai.fetch_meal_parse(text, model)
+        except ai.AiOutputError as e:
+            return Response(e.as_dict(), status=status.HTTP_502_BAD_GATEWAY)
+        except Exception as e:
+            logger.exception("AI parse failed")
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-            raw = (resp.output_text or "").strip()
+        response = Response(data, status=status.HTTP_200_OK)
+        response["X-AI-Cache"] = "miss"
+        return response
 
-            # ✅ 強健：括号配对で最初の完全な JSON オブジェクトを抽出
-            decoder = JSONDecoder()
 
-            # 1) 先に ``` コード块 wrapper を削除
-            if raw.startswith("```"):
-                raw = re.sub(r"^```[a-zA-Z]*\n", "", raw)
-                raw = re.sub(r"\n```$", "", raw).strip()
+# ===============================
+# AI：文字解析食事（非同期版）
+# POST /api/ai/parse-meal-async
+# ASGI（core/asgi.py + uvicorn 等）で動かすと、OpenAI の応答待ちの間も
+# ワーカースレッドを占有しない。レスポンスは同期版と同じ。
+# ===============================
 
-            # 2) 最初の '{' を見つけ、そこから decode
-            start = raw.find("{")
-            if start == -1:
-                return Response(
-                    {"error": "AI returned no JSON object", "raw": raw[:300]},
-                    status=status.HTTP_502_BAD_GATEWAY,
-                )
+@csrf_exempt
+@require_POST
+async def meal_ai_parse_async(request):
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+
+    text = (body.get("text") or "").strip() if isinstance(body, dict) else ""
+    if not text:
+        return JsonResponse({"error": "text is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
+    json_params = {"ensure_ascii": False}
+
+    cache = get_meal_parse_cache()
+    cached = await sync_to_async(cache.get, thread_sensitive=False)(
+        text, model, ai.MEAL_PROMPT_VERSION
+    )
+    if cached is not None:
+        response = JsonResponse(cached, json_dumps_params=json_params)
+        response["X-AI-Cache"] = "hit"
+        return response
+
+    # クライアントが切断すると Django がこのタスクをキャンセルする。
+    # CancelledError は捕まえずに流し、OpenAI へのリクエストもそこで打ち切る。
+    try:
+        resp = await ai_async.create_response(
+            model=model,
+            input=ai.meal_parse_input(text),
+            store=False,
+        )
+    except ai_async.AiBusyError:
+        return JsonResponse(
+            {"error": "AI is busy, please retry"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    except Exception as e:
+        logger.exception("AI parse (async) failed")
+        return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        data = ai.extract_json_object(resp.output_text)
+    except ai.AiOutputError as e:
+        return JsonResponse(
+            e.as_dict(), status=status.HTTP_502_BAD_GATEWAY, json_dumps_params=json_params
+        )
 
-            try:
-                obj, idx = decoder.raw_decode(raw[start:])
-                data = obj
-            except Exception:
-                # 3) なお失敗：raw の最初 300 字を返して定位する
-                return Response(
-                    {"error": "Failed to parse JSON from AI output", "raw": raw[:300]},
-                    status=status.HTTP_502_BAD_GATEWAY,
-                )
+    if isinstance(data, dict):
+        await sync_to_async(cache.set, thread_sensitive=False)(
+            text, model, ai.MEAL_PROMPT_VERSION, data
+        )
+
+    response = JsonResponse(data, safe=False, json_dumps_params=json_params)
+    response["X-AI-Cache"] = "miss"
+    return response
+
+
+class MealsAiParseView(APIView):
+    """
+    1日分などの複数の食事を1回の AI 呼び出しで解析する
+    POST /api/ai/parse-meals  {"text": "朝: トースト, 昼: 牛丼", "save": true}
+    save=true なら解析結果を MealSerializer で検証して一括保存する
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        text = (request.data.get("text") or "").strip()
+        if not text:
+            return Response({"error": "text is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response(data, status=status.HTTP_200_OK)
+        model = os.environ.get("OPENAI_MODEL", "gpt-4.1-mini")
 
+        try:
+            resp = ai.create_response(
+                model=model,
+                input=ai.meals_parse_input(text),
+                text={"format": {"type": "json_schema", **ai.MEALS_SCHEMA}},
+                store=False,
+            )
         except Exception as e:
-            # ✅ ここで本当の原因がターミナルに出る
-            traceback.print_exc()
+            logger.exception("AI parse (meals) failed")
             return Response(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+        try:
+            data = ai.extract_json_object(resp.output_text)
+        except ai.AiOutputError as e:
+            return Response(e.as_dict(), status=status.HTTP_502_BAD_GATEWAY)
+
+        items = data.get("items") if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            return Response(
+                {"error": "AI returned no items", "raw": str(data)[:300]},
+                status=status.HTTP_502_BAD_GATEWAY,
+            )
+        items = items[:ai.MAX_BATCH_ITEMS]
+
+        save = str(request.data.get("save", "")).lower() in ("1", "true")
+        if not save:
+            return Response({"items": items}, status=status.HTTP_200_OK)
+
+        serializer = MealSerializer(data=items, many=True, context={"request": request})
+        if not serializer.is_valid():
+            return Response(
+                {"items": items, "errors": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # MealListSerializer が1回の bulk_create で保存する
+        user = request.user if request.user.is_authenticated else None
+        serializer.save(user=user)
+        return Response(
+            {"items": items, "meals": serializer.data},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class HealthView(APIView):
+    """
+    ヘルスチェック（ロードバランサー・compose の healthcheck 用）
+    GET /api/health/  DB に SELECT 1 が通れば 200、通らなければ 503
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except DatabaseError:
+            return Response({"status": "unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({"status": "ok"})
+
+
+class UserBulkProvisionView(APIView):
+    """
+    ユーザーの一括作成（管理者のみ）
+    POST /api/users/bulk/  {"users": [{"username", "email", "password", "daily_calorie_goal"}, ...]}
+
+    User と Profile を bulk_create でまとめて作る（api/provisioning.py）。
+    不正な行・既存のユーザー名はスキップして
+    {"created", "errorCount", "errors": [{line, errors}], "aborted"} を返す
+    （結果はインポートと同じ形。aborted はいつも false）。
+    line は users 配列の 1 始まりの位置。ファイルからなら `manage.py provision_users` を使う。
+    password は省略できる（省略した人はパスワードログイン不可で作る）。
+    password つきの行は1件ずつハッシュ化するので、大人数ならパスワードなしで作ること。
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        users = request.data.get("users") if isinstance(request.data, dict) else None
+        if not isinstance(users, list) or not users:
+            return Response(
+                {"error": "users must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        result = provisioning.provision_users(enumerate(users, start=1))
+        code = status.HTTP_201_CREATED if result.imported else status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=code)
+
+
+class AuthStatsView(APIView):
+    """
+    JWT 認証のキャッシュヒット数・リフレッシュ数・認証時間
+    GET /api/auth/stats
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_auth_cache().stats())
+
+
+class AiParseCacheStatsView(APIView):
+    """
+    AI 解析キャッシュのヒット / ミス数
+    GET /api/ai/parse-meal/cache-stats
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_meal_parse_cache().stats())
@@ -3,6 +3,11 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with an ASGI server so that async views (e.g. /api/ai/parse-meal-async)
+don't hold a worker thread while waiting on OpenAI:
+
+    uvicorn core.asgi:application --app-dir src --host 0.0.0.0 --port 8000
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
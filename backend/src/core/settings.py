@@ -10,7 +10,10 @@ load_dotenv(BASE_DIR / ".env")
 SECRET_KEY = os.getenv("SECRET_KEY","")
 JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
 
-DEBUG = True
+# 実行環境（DJANGO_ENV=production で本番向けの既定値になる。個別の環境変数で上書きできる）
+PRODUCTION = os.environ.get("DJANGO_ENV", "development") == "production"
+
+DEBUG = os.environ.get("DEBUG", "False" if PRODUCTION else "True").lower() in ("1", "true", "yes")
 
 
 TIME_ZONE = "Asia/Tokyo"
@@ -33,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 計測（api/metrics.py）。全体の時間を測るので先頭に置く
+    "api.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # 追加
@@ -51,13 +56,122 @@ STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# メディア配信（api/serving.py）
+# SERVE_MEDIA=False なら Django では配信しない（nginx などが MEDIA_ROOT を直接配る場合）
+SERVE_MEDIA = os.environ.get("SERVE_MEDIA", "True").lower() in ("1", "true", "yes")
+# "nginx" なら X-Accel-Redirect、"sendfile" なら X-Sendfile で本体の送信をフロントのサーバーに任せる
+MEDIA_ACCEL_REDIRECT = os.environ.get("MEDIA_ACCEL_REDIRECT", "")
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
+# ハッシュ名でない（中身が変わりうる）ファイルのキャッシュ秒数。ハッシュ名のものは1年 + immutable
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", 60 * 60))
+
+# 計測（api/metrics.py, GET /metrics）
+# METRICS_TOKEN を設定すると /metrics に Authorization: Bearer <token> が必要になる。
+# 本番で METRICS_TOKEN が空なら /metrics は 404（公開しない）
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# レスポンスに Server-Timing（DB・シリアライザ・OpenAI などの内訳）を付ける
+METRICS_SERVER_TIMING = (
+    os.environ.get("METRICS_SERVER_TIMING", str(DEBUG)).lower() in ("1", "true", "yes")
+)
+
+# ログ（print ではなく logging.getLogger(__name__) を使う）
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api": {
+            "handlers": ["console"],
+            "level": os.environ.get("LOG_LEVEL", "DEBUG" if DEBUG else "INFO"),
+        },
+    },
+}
+
 # REST Framework 設定
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    )
+        "api.authentication.CachedJWTAuthentication",
+    ),
+    # orjson が入っていれば orjson で書く（なければ標準の JSONRenderer と同じ。api/renderers.py）
+    "DEFAULT_RENDERER_CLASSES": (
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+}
+
+# JWT 認証のプロセス内キャッシュ（api/auth_cache.py）
+# 検証済みアクセストークン → ユーザーを TTL 秒だけ覚えておく
+AUTH_TOKEN_CACHE_TTL = float(os.environ.get("AUTH_TOKEN_CACHE_TTL", 60))
+AUTH_TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_TOKEN_CACHE_MAX_ENTRIES", 4096))
+# 同じリフレッシュトークンの結果を使い回す秒数と、実行中のリフレッシュを待つ最大秒数
+AUTH_REFRESH_REUSE_SECONDS = float(os.environ.get("AUTH_REFRESH_REUSE_SECONDS", 10))
+AUTH_REFRESH_WAIT_TIMEOUT = float(os.environ.get("AUTH_REFRESH_WAIT_TIMEOUT", 10))
+
+# キャッシュ（CACHE_BACKEND=locmem|file|db）
+# locmem はプロセスごとなので、複数ワーカーで動かすなら file か db にする
+# （db は最初に `python manage.py createcachetable` が必要）
+_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", BASE_DIR / "tmp" / "cache"),
+    },
+    "db": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", "django_cache"),
+    },
+}
+CACHES = {
+    "default": _CACHE_BACKENDS[os.environ.get("CACHE_BACKEND", "locmem")],
 }
 
+# ダッシュボード（GET /api/dashboard/, api/dashboard.py）のキャッシュ。
+# キーに食事の版数と目標が入る（変わったら別のキーになる）ので TTL は長めでよい
+DASHBOARD_CACHE_ALIAS = os.environ.get("DASHBOARD_CACHE_ALIAS", "default")
+DASHBOARD_CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", 60 * 60))
+
+# AI 食事解析の結果キャッシュ（api/ai_cache.py）
+# AI_PARSE_CACHE_ALIAS に CACHES のエイリアス（例: "default"）を入れるとプロセス間でも共有する
+AI_PARSE_CACHE_TTL = int(os.environ.get("AI_PARSE_CACHE_TTL", 60 * 60 * 24))
+AI_PARSE_CACHE_MAX_ENTRIES = int(os.environ.get("AI_PARSE_CACHE_MAX_ENTRIES", 1024))
+AI_PARSE_CACHE_ALIAS = os.environ.get("AI_PARSE_CACHE_ALIAS") or None
+
+# OpenAI クライアント（非同期版 /api/ai/parse-meal-async で使用、api/ai_async.py）
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 30))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", 5))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 2))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", 100))
+# 1ワーカーあたり同時に OpenAI へ投げる数と、枠が空くまで待つ秒数
+AI_PARSE_MAX_CONCURRENCY = int(os.environ.get("AI_PARSE_MAX_CONCURRENCY", 32))
+AI_PARSE_QUEUE_TIMEOUT = float(os.environ.get("AI_PARSE_QUEUE_TIMEOUT", 10))
+
+# バックグラウンドジョブ（api/jobs.py, manage.py run_worker）
+# 失敗したら BASE * 2^(n-1) 秒（最大 MAX 秒）待って再実行、MAX_ATTEMPTS 回で諦める
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_BASE_DELAY = float(os.environ.get("JOB_RETRY_BASE_DELAY", 5))
+JOB_RETRY_MAX_DELAY = float(os.environ.get("JOB_RETRY_MAX_DELAY", 600))
+# この秒数以上 running のままのジョブは、ワーカーが落ちたとみなして待機中に戻す
+JOB_STALE_TIMEOUT = float(os.environ.get("JOB_STALE_TIMEOUT", 600))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 1))
+
+# 画像アップロード
+# 一括アップロード（multipart）は 1 MB を超えたらメモリではなく一時ファイルに書く
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+FILE_UPLOAD_HANDLERS = [
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+# 分割アップロード（api/uploads.py）の一時ファイル置き場と上限
+UPLOAD_TEMP_DIR = Path(os.environ.get("UPLOAD_TEMP_DIR", BASE_DIR / "tmp" / "uploads"))
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 20 * 1024 * 1024))
+UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_SIZE", 4 * 1024 * 1024))
+# この時間更新のないアップロードは cleanup_uploads で消す
+UPLOAD_EXPIRE_HOURS = int(os.environ.get("UPLOAD_EXPIRE_HOURS", 24))
+
 # SimpleJWT 設定
 SIMPLE_JWT = {
     "SIGNING_KEY": JWT_SECRET_KEY,
@@ -97,6 +211,27 @@ CSRF_TRUSTED_ORIGINS = [
 ]
 
 # DB 設定（PostgreSQL）
+# DB_POOL=True なら psycopg 3 のコネクションプール（プロセスごと、Django 5.1+ の OPTIONS["pool"]）。
+# プールは CONN_MAX_AGE と併用できないので、プールなしのときだけ接続を使い回す（CONN_MAX_AGE 秒）
+DB_POOL = os.environ.get("DB_POOL", str(PRODUCTION)).lower() in ("1", "true", "yes")
+# 1クエリの上限（ミリ秒、0 なら無制限）。サーバー側で打ち切るので重いクエリがワーカーを握り続けない
+DB_STATEMENT_TIMEOUT = int(os.environ.get("DB_STATEMENT_TIMEOUT", 30_000 if PRODUCTION else 0))
+
+_DB_OPTIONS = {}
+if DB_STATEMENT_TIMEOUT:
+    _DB_OPTIONS["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+if DB_POOL:
+    _DB_OPTIONS["pool"] = {
+        # max_size はスレッド数以上にする（gunicorn.conf.py の threads）
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+        # 空きがないときに待つ秒数
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        # 使わない接続を閉じるまでの秒数と、接続を作り直すまでの秒数
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 600)),
+        "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 3600)),
+    }
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
@@ -105,5 +240,12 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": os.environ.get("POSTGRES_HOST"),
         "PORT": os.environ.get("POSTGRES_PORT"),
+        "CONN_MAX_AGE": (
+            0 if DB_POOL else int(os.environ.get("CONN_MAX_AGE", 60 if PRODUCTION else 0))
+        ),
+        # 使い回す接続（プールなら貸し出す前）が生きているか確かめる。
+        # DB の再起動・フェイルオーバー後の切れた接続でエラーにしない
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": _DB_OPTIONS,
     }
 }